@@ -11,13 +11,25 @@ Dependencies:
 pip install pytesseract pillow opencv-python sqlalchemy rapidfuzz
 """
 
+import json
 import re
 import cv2
-import pytesseract
 import numpy as np
 from sqlalchemy import create_engine, text
 from rapidfuzz import fuzz
 
+from image_io import decode_image_max
+from ocr_backends import make_backend
+from ocr_layout import crop_line, find_id_line_boxes
+from ocr_preprocess import (
+    DEFAULT_MAX_SIDE, DEFAULT_TARGET_DPI, iter_variants, normalize_resolution, otsu
+)
+from result_cache import content_key
+
+
+# bump whenever preprocessing / ROI logic changes, so cached OCR results are not reused
+OCR_PIPELINE_VERSION = "v2"
+
 
 
 # =========================
@@ -34,6 +46,18 @@ class IndianIDFormats:
         "hallticket": re.compile(r"\b[0-9]{10}\b")
     }
 
+    # characters Tesseract may emit when reading just the ID-number line
+    _DIGITS = "0123456789"
+    _ALNUM = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    WHITELISTS = {
+        "aadhaar": _DIGITS,
+        "aadhar": _DIGITS,
+        "pan": _ALNUM,
+        "passport": _ALNUM,
+        "voter": _ALNUM,
+        "hallticket": _DIGITS,
+    }
+
     @staticmethod
     def normalize(value: str, id_type: str) -> str:
         value = value.upper().replace(" ", "")
@@ -44,21 +68,83 @@ class IndianIDFormats:
 # 2. OCR ENGINE
 # =========================
 class OCREngine:
-    def __init__(self, tesseract_path=None):
-        if tesseract_path:
-            pytesseract.pytesseract.tesseract_cmd = tesseract_path
+    def __init__(self, tesseract_path=None, backend="pytesseract", cache=None,
+                 target_dpi=DEFAULT_TARGET_DPI, max_side=DEFAULT_MAX_SIDE):
+        """
+        backend: "pytesseract" (process per call) or "tesserocr" (persistent
+        C-API handles), or an already-built backend object. Build the engine
+        once and share it, so persistent backends stay warm.
+        cache: optional result_cache.ResultCache; results of the *_from_bytes
+        calls are keyed on the image content + cache_tag.
+        target_dpi / max_side: resolution normalisation (ocr_preprocess);
+        None disables either.
+        """
+        if isinstance(backend, str):
+            backend = make_backend(backend, tesseract_path=tesseract_path)
+        self.backend = backend
+        self.cache = cache
+        self.target_dpi = target_dpi
+        self.max_side = max_side
+        backend_name = getattr(backend, "name", type(backend).__name__)
+        self.cache_tag = (f"ocr:{backend_name}:{OCR_PIPELINE_VERSION}"
+                          f":dpi{target_dpi}:max{max_side}")
+
+    def decode(self, data: bytes):
+        """Grayscale decode, capped at max_side (big JPEGs decode at reduced scale)."""
+        return decode_image_max(data, self.max_side, grayscale=True)
+
+    def prepare(self, img):
+        """(grayscale image at the target resolution, normalisation info)."""
+        gray = _to_gray(img)
+        return normalize_resolution(gray, self.target_dpi, self.max_side)
 
     def extract_text(self, image_path: str) -> str:
-        img = cv2.imread(image_path)
-        if img is None:
+        try:
+            with open(image_path, "rb") as f:
+                data = f.read()
+        except OSError:
             raise ValueError("Invalid image path")
+        return self.extract_text_from_image(self.decode(data))
+
+    def extract_text_from_bytes(self, data: bytes) -> str:
+        if self.cache is None:
+            return self.extract_text_from_image(self.decode(data))
+        return self.cache.get_or_compute(
+            content_key(self.cache_tag, data),
+            lambda: self.extract_text_from_image(self.decode(data)),
+            encode=str.encode,
+            decode=bytes.decode,
+        )
+
+    def extract_text_from_image(self, img) -> str:
+        gray, _ = self.prepare(img)
+        return self.backend.recognize(otsu(gray), psm=6)
+
+    def iter_card_texts(self, img):
+        """
+        Whole-card OCR through the preprocessing cascade (ocr_preprocess):
+        yields (stage, text), cheapest stage first. Lazy, so the caller can
+        stop as soon as the text contains what it is looking for.
+        """
+        gray = _to_gray(img)
+        orientation = getattr(self.backend, "orientation", None)
+        for stage, binary in iter_variants(gray, orientation):
+            yield stage, self.backend.recognize(binary, psm=6)
+
+    def iter_id_line_texts(self, img, id_type: str, max_lines=6):
+        """
+        Region-of-interest OCR: yields the text of each candidate ID-number line,
+        best candidate first, read as a single line (--psm 7) with the type's
+        character whitelist. Lazy, so the caller can stop at the first match.
+        """
+        gray = _to_gray(img)
+        whitelist = IndianIDFormats.WHITELISTS.get(id_type)
+        for box in find_id_line_boxes(gray, id_type, max_lines):
+            yield self.backend.recognize(crop_line(gray, box), psm=7, whitelist=whitelist)
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.threshold(
-            gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-        )[1]
 
-        return pytesseract.image_to_string(gray, config="--psm 6")
+def _to_gray(img):
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
 
 # =========================
@@ -118,34 +204,105 @@ class IDExtractor:
 # 5. VERIFICATION ENGINE
 # =========================
 class IDVerifier:
-    def __init__(self, db: UserDatabase, ocr: OCREngine):
+    def __init__(self, db: UserDatabase, ocr: OCREngine, roi_first=True):
+        """roi_first: OCR only the likely ID-number lines, full card only on a miss."""
         self.db = db
         self.ocr = ocr
         self.extractor = IDExtractor()
+        self.roi_first = roi_first
 
     def verify(self, image_path: str, user_id: int) -> dict:
+        try:
+            with open(image_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            raise ValueError("Invalid image path")
+        return self.verify_bytes(data, user_id)
+
+    def verify_bytes(self, data: bytes, user_id: int) -> dict:
+        expected_type, expected_value = self._expected(user_id)
+
+        cache = getattr(self.ocr, "cache", None)
+        if cache is None:
+            read = self.read_id(self.ocr.decode(data), expected_type)
+        else:
+            # only the OCR read is cached; the DB comparison always runs fresh
+            tag = f"idread:{expected_type}:{int(self.roi_first)}:{self.ocr.cache_tag}"
+            read = cache.get_or_compute(
+                content_key(tag, data),
+                lambda: self.read_id(self.ocr.decode(data), expected_type),
+                encode=lambda r: json.dumps(r).encode(),
+                decode=json.loads,
+            )
+        return self._compare(read, expected_type, expected_value)
+
+    def verify_image(self, img, user_id: int) -> dict:
+        expected_type, expected_value = self._expected(user_id)
+        return self._compare(self.read_id(img, expected_type), expected_type, expected_value)
+
+    def _expected(self, user_id: int):
         # Step 1: Load DB truth
         db_record = self.db.get_user_id_record(user_id)
         expected_type = db_record["id_type"].lower() #error
         expected_value = IndianIDFormats.normalize(
             db_record["id_value"], expected_type
         )
+        return expected_type, expected_value
 
-        # Step 2: OCR
-        ocr_text = self.ocr.extract_text(image_path)
+    def read_id(self, img, expected_type: str) -> dict:
+        """
+        OCR the card and pull out ONLY the expected ID type.
+        ocr_stage is where the ID was found ("roi" or a cascade stage, None if
+        nowhere); ocr_stages lists every stage that was run, in order;
+        ocr_resize is the resolution normalisation applied first.
+        """
+        img, resize = self.ocr.prepare(img)
+
+        # Step 2 + 3: OCR and extract ONLY expected ID type
+        read = {
+            "extracted_id": None,
+            "ocr_name": None,
+            "ocr_mode": "full",
+            "ocr_stage": None,
+            "ocr_stages": [],
+            "ocr_resize": resize,
+        }
 
-        # Step 3: Extract ONLY expected ID type
-        extracted_id = self.extractor.extract_expected_id(
-            ocr_text, expected_type
-        )
-        #name 
-        ocr_name = self.extractor.extract_name(ocr_text)
+        # Step 2a: cheap path, just the candidate number lines
+        if self.roi_first and expected_type in IndianIDFormats.WHITELISTS:
+            read["ocr_stages"].append("roi")
+            for line_text in self.ocr.iter_id_line_texts(img, expected_type):
+                extracted_id = self.extractor.extract_expected_id(
+                    line_text, expected_type
+                )
+                if extracted_id is not None:
+                    read.update(extracted_id=extracted_id, ocr_mode="roi", ocr_stage="roi")
+                    return read
+
+        # Step 2b: whole card, escalating preprocessing until the pattern matches
+        for stage, ocr_text in self.ocr.iter_card_texts(img):
+            read["ocr_stages"].append(stage)
+            extracted_id = self.extractor.extract_expected_id(
+                ocr_text, expected_type
+            )
+            #name 
+            read["ocr_name"] = read["ocr_name"] or self.extractor.extract_name(ocr_text)
+            if extracted_id is not None:
+                read.update(extracted_id=extracted_id, ocr_stage=stage)
+                break
+
+        return read
+
+    def _compare(self, read: dict, expected_type: str, expected_value: str) -> dict:
+        extracted_id = read["extracted_id"]
 
         if extracted_id is None:
             return {
                 "status": "FAIL",
                 "reason": "Expected ID not found in image",
-                "expected_id_type": expected_type
+                "expected_id_type": expected_type,
+                "ocr_stages": read["ocr_stages"],
+                "ocr_resize": read["ocr_resize"],
             }
 
         extracted_id = IndianIDFormats.normalize(
@@ -161,7 +318,11 @@ class IDVerifier:
             "expected_id_type": expected_type,
             "db_value": expected_value,
             "ocr_value": extracted_id,
-            "ocr_name": ocr_name,
+            "ocr_name": read["ocr_name"],
+            "ocr_mode": read["ocr_mode"],
+            "ocr_stage": read["ocr_stage"],
+            "ocr_stages": read["ocr_stages"],
+            "ocr_resize": read["ocr_resize"],
             "match": match
         }
 
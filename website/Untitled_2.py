@@ -15,6 +15,10 @@ import pytesseract
 import numpy as np
 from sqlalchemy import create_engine, text
 from insightface.app import FaceAnalysis
+from insightface.utils import face_align
+
+from image_io import decode_image, decode_image_max, fit_within
+from result_cache import decode_array, embedding_key, encode_array
 
 
 # =========================
@@ -43,7 +47,12 @@ class OCREngine:
         img = cv2.imread(image_path)
         if img is None:
             raise ValueError("Invalid image path")
+        return self.extract_text_from_image(img)
+
+    def extract_text_from_bytes(self, data: bytes) -> str:
+        return self.extract_text_from_image(decode_image(data))
 
+    def extract_text_from_image(self, img) -> str:
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         gray = cv2.threshold(
             gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
@@ -56,26 +65,100 @@ class OCREngine:
 # 3. FACE ENGINE (INSIGHTFACE)
 # =========================
 class InsightFaceEngine:
-    def __init__(self):
+    def __init__(self, model_name="buffalo_l", det_size=(640, 640), quality_gate=None, cache=None,
+                 max_side="auto"):
+        self.model_name = model_name
+        self.det_size = det_size
+        # images are decoded / downscaled to this longest side before detection.
+        # The detector works at det_size anyway; 2x keeps enough pixels for the
+        # aligned 112x112 ArcFace crop. None = full resolution.
+        self.max_side = 2 * max(det_size) if max_side == "auto" else max_side
+        # optional frame_quality.FrameQualityGate, applied to live captures only
+        self.quality_gate = quality_gate
+        # stored reference embeddings are only valid for the model that made them
+        self.model_tag = f"insightface:{model_name}:det{det_size[0]}x{det_size[1]}"
+        # optional result_cache.ResultCache for *_from_bytes embeddings
+        self.cache = cache
+        self.cache_tag = f"{self.model_tag}:max{self.max_side}"
+
         self.app = FaceAnalysis(
-            name="buffalo_l",
+            name=model_name,
             providers=["CPUExecutionProvider"]
         )
-        self.app.prepare(ctx_id=0, det_size=(640, 640))
+        self.app.prepare(ctx_id=0, det_size=det_size)
+
+        # only detection + ArcFace are needed for verification
+        self.detector = self.app.det_model
+        self.recognizer = self.app.models["recognition"]
+
+    def detect_and_align(self, img, check_quality=False):
+        """
+        Detect exactly one face and return its aligned ArcFace input crop.
+        check_quality: run the quality gate around detection, so unusable
+        frames are rejected (FrameQualityError) before ArcFace ever runs.
+        """
+        crop, _ = self.detect_and_assess(img, check_quality)
+        return crop
+
+    def detect_and_assess(self, img, check_quality=True):
+        """Detector-only pass: (aligned crop, quality metrics incl. quality_score)."""
+        img = fit_within(img, self.max_side)
+        metrics = {}
+        gate = self.quality_gate if check_quality else None
+        if gate is not None:
+            metrics.update(gate.precheck(img))
+
+        bboxes, kpss = self.detector.detect(img, max_num=0, metric="default")
+
+        if gate is not None:
+            metrics.update(gate.check_faces(img, bboxes, kpss))
+            metrics["quality_score"] = gate.score(metrics)
+        elif bboxes.shape[0] != 1:
+            raise ValueError("Image must contain exactly ONE face")
+
+        crop = face_align.norm_crop(
+            img, landmark=kpss[0], image_size=self.recognizer.input_size[0]
+        )
+        return crop, metrics
+
+    def assess_frame_from_bytes(self, data: bytes) -> dict:
+        """Quality metrics for one frame without running ArcFace (streaming mode)."""
+        _, metrics = self.detect_and_assess(self.decode(data), check_quality=True)
+        return metrics
+
+    def embed_aligned(self, crops):
+        """ArcFace embeddings for a list of aligned crops, in one batched run."""
+        return self.recognizer.get_feat(list(crops))
+
+    def decode(self, data: bytes):
+        """BGR decode capped at max_side (big JPEGs decode at reduced scale)."""
+        return decode_image_max(data, self.max_side)
 
     def extract_embedding(self, image_path: str):
-        img = cv2.imread(image_path)
-        if img is None:
+        try:
+            with open(image_path, "rb") as f:
+                data = f.read()
+        except OSError:
             raise ValueError("Invalid image path")
+        return self.extract_embedding_from_image(self.decode(data))
 
-        faces = self.app.get(img)
+    def extract_embedding_from_bytes(self, data: bytes, check_quality=False):
+        def compute():
+            return self.extract_embedding_from_image(self.decode(data), check_quality)
 
-        if len(faces) != 1:
-            raise ValueError("Image must contain exactly ONE face")
+        if self.cache is None:
+            return compute()
+        return self.cache.get_or_compute(
+            embedding_key(self.cache_tag, data, check_quality), compute,
+            encode=encode_array, decode=decode_array,
+        )
 
-        return faces[0].embedding
+    def extract_embedding_from_image(self, img, check_quality=False):
+        crop = self.detect_and_align(img, check_quality)
+        return self.embed_aligned([crop])[0]
 
-    def compare(self, emb1, emb2, threshold=0.4):
+    @staticmethod
+    def compare(emb1, emb2, threshold=0.4):
         emb1 = emb1 / np.linalg.norm(emb1)
         emb2 = emb2 / np.linalg.norm(emb2)
 
@@ -138,10 +221,15 @@ class IDExtractor:
 # 6. VERIFICATION PIPELINE
 # =========================
 class StudentVerifier:
-    def __init__(self, db: UserDatabase):
+    def __init__(self, db: UserDatabase, face_engine=None):
+        """
+        face_engine: anything with extract_embedding / compare, e.g. a
+        face_server.FaceEngineClient to share one model across processes.
+        Defaults to a private in-process InsightFaceEngine.
+        """
         self.db = db
         self.ocr = OCREngine()
-        self.face = InsightFaceEngine()
+        self.face = face_engine or InsightFaceEngine()
         self.extractor = IDExtractor()
 
     def verify(self, id_image_path: str, live_image_path: str, user_id: int):
@@ -1,18 +1,32 @@
 from pydoc import html
 
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Response, send_file, stream_with_context
 from pathlib import Path
-import sqlite3
 import os
 import base64
 import numpy as np
-from datetime import datetime, timezone
+from datetime import datetime
 from flask import make_response
 import io
+import time
 
 from Testroute import preprocess_webcam_image
-from Untitled_1 import OCREngine, UserDatabase, IDVerifier
+from Untitled_1 import OCREngine, IDVerifier
 from Untitled_2 import StudentVerifier, InsightFaceEngine
+from face_store import ReferenceEmbeddingStore
+from face_batcher import BatchingFaceEngine
+from face_index import FaceIndex
+from face_server import FaceEngineClient
+from image_io import AsyncImageWriter, write_file
+from frame_quality import FrameQualityError, FrameQualityGate
+from face_stream import FaceStreamRegistry
+from result_cache import ResultCache
+from datastore import AttemptLog, ConnectionPool, ReportStore, UserStore, VerificationStore
+from verification_stats import VerificationStats
+import result_export
+from hallticket import BulkTicketJobs, HallTicketCache
+from ticket_qr import GateVerifier
 
 BASE = Path(__file__).parent
 UPLOAD_DIR = BASE / "uploads"
@@ -20,7 +34,58 @@ OCR_DIR = UPLOAD_DIR / "ocr"
 FACE_REF_DIR = UPLOAD_DIR / "facever"
 FACE_ATTEMPT_DIR = UPLOAD_DIR / "face_attempts"
 VERIFY_DB = BASE / "verify.db"
-USERS_DB_URL = f"sqlite:///{BASE / 'users.db'}"
+USERS_DB = BASE / "users.db"
+
+# pooled connections per database file, shared by every request thread
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+# verify.db writes arriving within this window share one transaction
+VERIFY_WRITE_DELAY_MS = float(os.environ.get("VERIFY_WRITE_DELAY_MS", 2))
+
+# concurrent face attempts are grouped into one ArcFace batch
+FACE_BATCH_MAX_SIZE = int(os.environ.get("FACE_BATCH_MAX_SIZE", 16))
+FACE_BATCH_MAX_WAIT_MS = float(os.environ.get("FACE_BATCH_MAX_WAIT_MS", 5))
+
+# streaming capture: stop at the first frame this good, or after the window
+FACE_STREAM_WINDOW_S = 1.5
+FACE_STREAM_GOOD_SCORE = 45.0
+FACE_STREAM_MAX_FRAMES = 20
+
+# "pytesseract" (process per call) or "tesserocr" (persistent Tesseract handles)
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "pytesseract")
+
+# resolution normalisation: ID photos are scaled so card text sits at OCR_TARGET_DPI,
+# nothing reaches Tesseract / the face detector bigger than the *_MAX_SIDE caps
+OCR_TARGET_DPI = int(os.environ.get("OCR_TARGET_DPI", 300))
+OCR_MAX_SIDE = int(os.environ.get("OCR_MAX_SIDE", 2400))
+FACE_MAX_SIDE = int(os.environ.get("FACE_MAX_SIDE", 1280))
+
+# set to the face_server.py socket to share one model across all web workers
+FACE_SERVER_SOCKET = os.environ.get("FACE_SERVER_SOCKET")
+
+# OCR text / ID reads / embeddings keyed by image content, shared by all workers on the box
+RESULT_CACHE_DB = Path(os.environ.get("RESULT_CACHE_DB", BASE / "cache.db"))
+RESULT_CACHE_MAX_MB = int(os.environ.get("RESULT_CACHE_MAX_MB", 256))
+
+# rendered hall-ticket PDFs, keyed by candidate row + photo digests + template version
+HALLTICKET_CACHE_DIR = Path(os.environ.get("HALLTICKET_CACHE_DIR", BASE / "cache" / "halltickets"))
+# /api/halltickets runs scripts/bulk_halltickets.py children: render processes per child,
+# children per web worker at once (more requests get a 503), tickets per merged PDF
+HALLTICKET_BULK_WORKERS = int(os.environ.get("HALLTICKET_BULK_WORKERS", os.cpu_count() or 1))
+HALLTICKET_BULK_JOBS = int(os.environ.get("HALLTICKET_BULK_JOBS", 1))
+HALLTICKET_MERGE_MAX = 1000
+# hall tickets carry a QR signed with this key, valid for this exam slot only, and
+# the gate checks it instead of running OCR. There is no default: without a key no
+# QR is printed or accepted and the ID check is always OCR
+HALLTICKET_QR_KEY = os.environ.get("HALLTICKET_QR_KEY") or None
+EXAM_SLOT = os.environ.get("EXAM_SLOT", "20250215-0930")
+
+# /report page size
+REPORT_PAGE_SIZE = 50
+# live counters are rebuilt from the database this often (other workers / batch runs)
+STATS_RESYNC_S = float(os.environ.get("STATS_RESYNC_S", 60))
+
+# a new registration whose face scores above this against anyone enrolled is flagged
+DUPLICATE_FACE_THRESHOLD = 0.4
 
 for d in (UPLOAD_DIR, OCR_DIR, FACE_REF_DIR, FACE_ATTEMPT_DIR):
     d.mkdir(parents=True, exist_ok=True)
@@ -28,45 +93,83 @@ for d in (UPLOAD_DIR, OCR_DIR, FACE_REF_DIR, FACE_ATTEMPT_DIR):
 app = Flask(__name__)
 app.secret_key = "dev-secret"
 
-# shared InsightFace engine (loaded once at startup) 
-face_engine = InsightFaceEngine()
+# one data-access layer for users.db / verify.db
+verifications = VerificationStore(VERIFY_DB, pool_size=DB_POOL_SIZE,
+                                  max_delay_ms=VERIFY_WRITE_DELAY_MS)
+# every attempt is also appended to verify.db attempts (audit trail / history)
+attempts = AttemptLog(verifications)
+# verify.db is attached to every users.db connection so /report is one join
+users_pool = ConnectionPool(USERS_DB, size=DB_POOL_SIZE, attach={"v": VERIFY_DB})
+users = UserStore(users_pool)
+report_store = ReportStore(users_pool)
+report_store.ensure_indexes()
+# PASS / FAIL / PENDING counters for the dashboard, updated on every status change
+stats = VerificationStats(users_pool, resync_s=STATS_RESYNC_S)
+
+# repeated uploads of the same bytes skip OCR / ArcFace entirely
+result_cache = ResultCache(RESULT_CACHE_DB, max_disk_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# shared InsightFace engine: the out-of-process server if configured (it keeps
+# its own cache), otherwise loaded once at startup behind the micro-batcher
+if FACE_SERVER_SOCKET:
+    face_engine = FaceEngineClient(FACE_SERVER_SOCKET)
+else:
+    face_engine = BatchingFaceEngine(
+        InsightFaceEngine(quality_gate=FrameQualityGate(), max_side=FACE_MAX_SIDE),
+        max_batch_size=FACE_BATCH_MAX_SIZE,
+        max_wait_ms=FACE_BATCH_MAX_WAIT_MS,
+        cache=result_cache,
+    )
 
-# DB rulezz
+# shared OCR engine, so persistent backends keep their Tesseract handles warm
+ocr_engine = OCREngine(backend=OCR_BACKEND, cache=result_cache,
+                       target_dpi=OCR_TARGET_DPI, max_side=OCR_MAX_SIDE)
+id_verifier = IDVerifier(users, ocr_engine)
+# ID check: signed hall-ticket QR first (primary-key lookup), OCR only without one
+gate_verifier = GateVerifier(HALLTICKET_QR_KEY, users, id_verifier, slot=EXAM_SLOT)
+ticket_gate = GateVerifier(HALLTICKET_QR_KEY, users, slot=EXAM_SLOT)      # QR only (/api/gate_scan)
+
+# repeat hall-ticket downloads are a file read, not a PDF render
+hallticket_cache = HallTicketCache(HALLTICKET_CACHE_DIR, HALLTICKET_QR_KEY, EXAM_SLOT)
+# whole-centre renders run in a fresh child process, never a fork of this threaded one
+hallticket_jobs = BulkTicketJobs(
+    HALLTICKET_CACHE_DIR / "jobs",
+    cli_args=["--workers", HALLTICKET_BULK_WORKERS, "--cache-dir", HALLTICKET_CACHE_DIR,
+              "--exam-slot", EXAM_SLOT, "--users-db", USERS_DB, "--verify-db", VERIFY_DB],
+    max_jobs=HALLTICKET_BULK_JOBS,
+)
+
+# audit copies of uploads are written off the request path
+audit_writer = AsyncImageWriter()
 
-def verify_connect():
-    conn = sqlite3.connect(VERIFY_DB)
-    conn.row_factory = sqlite3.Row
-    return conn
+# in-progress streaming captures, kept in the cache DB so the next frame may go to any worker
+face_streams = FaceStreamRegistry(RESULT_CACHE_DB)
+
+# reference embeddings are computed at register/upload time and reused per attempt
+ref_store = ReferenceEmbeddingStore(users_pool, face_engine)
+
+# 1:N index over every enrolled reference face (duplicate-registration check)
+face_index = FaceIndex.from_db(USERS_DB, model_tag=face_engine.model_tag)
+
+# DB rulezz
 
 def get_verification(cid):
-    with verify_connect() as conn:
-        cur = conn.execute("SELECT * FROM verifications WHERE candidate_id = ?", (cid,))
-        row = cur.fetchone()
-        return dict(row) if row else None
+    return verifications.get(cid)
 
 def upsert_verification(cid, status=None, ocr_value=None, db_value=None,
                         ocr_path=None, face_score=None,
                         face_path=None, face_attempt_path=None):
-    now = datetime.now(timezone.utc).isoformat()
-    with verify_connect() as conn:
-        cur = conn.execute("SELECT 1 FROM verifications WHERE candidate_id = ?", (cid,))
-        if cur.fetchone():
-            conn.execute("""
-                UPDATE verifications
-                SET status=?, ocr_value=?, db_value=?, ocr_path=?,
-                    face_score=?, face_path=?, face_attempt_path=?, last_update=?
-                WHERE candidate_id=?
-            """, (status, ocr_value, db_value, ocr_path,
-                  face_score, face_path, face_attempt_path, now, cid))
-        else:
-            conn.execute("""
-                INSERT INTO verifications
-                    (candidate_id, status, ocr_value, db_value, ocr_path,
-                     face_score, face_path, face_attempt_path, last_update)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (cid, status, ocr_value, db_value, ocr_path,
-                  face_score, face_path, face_attempt_path, now))
-        conn.commit()
+    # wait for the group commit, so the page we redirect to shows the new row
+    verifications.upsert(cid, status=status, ocr_value=ocr_value, db_value=db_value,
+                         ocr_path=ocr_path, face_score=face_score, face_path=face_path,
+                         face_attempt_path=face_attempt_path).result()
+    if stats.knows(cid):
+        stats.record(cid, status)
+    else:
+        # registered by another worker since the last resync (or not a candidate at all)
+        user = get_user_record(cid)
+        if user:
+            stats.record(cid, status, id_type=user["id_type"])
 
 def _merge_status(ocr_status, face_status):
     """Both must be PASS for overall PASS."""
@@ -76,13 +179,24 @@ def _merge_status(ocr_status, face_status):
         return "PENDING"
     return "FAIL"
 
+def _ms_since(t0):
+    return round((time.perf_counter() - t0) * 1000, 1)
+
 def get_user_record(uid):
-    db = UserDatabase(USERS_DB_URL)
     try:
-        return db.get_user_id_record(uid)
+        return users.get_user_id_record(uid)
     except Exception:
         return None
 
+def _flag_duplicate_faces(cid, emb):
+    """Warn if this reference face already belongs to another candidate, then index it."""
+    # faces enrolled through other workers or the bulk tool since the last search
+    face_index.sync()
+    for other_cid, score in face_index.search(emb, k=3, threshold=DUPLICATE_FACE_THRESHOLD,
+                                              exclude=cid):
+        flash(f"Possible duplicate: this face already matches candidate {other_cid} at {score:.2f}")
+    face_index.add(cid, emb)
+
 #APIRoutes 
 
 @app.route("/")
@@ -118,23 +232,15 @@ def candidate(cid):
 
 # OCR 
 
-@app.route("/api/ocr", methods=["POST"])
-def api_ocr():
-    cid = int(request.form.get("candidate_id"))
-    file = request.files.get("ocr_file")
-    if not file:
-        flash("No file uploaded for OCR")
-        return redirect(url_for("candidate", cid=cid))
-
-    filename = f"{cid}_ocr_{int(datetime.utcnow().timestamp())}.jpg"
-    path = OCR_DIR / filename
-    file.save(path)
+def _verify_id_image(cid: int, img_bytes: bytes) -> dict:
+    """ID check on one uploaded image (hall-ticket QR, else OCR); persists and returns the result."""
+    t0 = time.perf_counter()
+    path = OCR_DIR / f"{cid}_ocr_{int(datetime.utcnow().timestamp())}.jpg"
+    audit_writer.write(path, img_bytes)
 
+    result = {}
     try:
-        user_db = UserDatabase(USERS_DB_URL)
-        ocr_engine = OCREngine()
-        verifier = IDVerifier(user_db, ocr_engine)
-        result = verifier.verify(str(path), cid)
+        result = gate_verifier.verify_bytes(img_bytes, cid)
         ocr_status = result.get("status")
         ocr_value  = result.get("ocr_value")
         db_value   = result.get("db_value")
@@ -142,14 +248,20 @@ def api_ocr():
         ocr_status = "ERROR"
         ocr_value  = None
         db_value   = None
-        flash(f"OCR/verifier error: {e}")
+        result = {"error": str(e)}
+    verify_ms = _ms_since(t0)
 
     # Preserve existing face result when recalculating combined status
+    t1 = time.perf_counter()
     existing = get_verification(cid) or {}
-    face_status = existing.get("face_status")          # separate sub-status column if you add it
     combined = _merge_status(ocr_status, existing.get("face_score") and
                              ("PASS" if existing.get("face_score", 0) >= 0.4 else "FAIL"))
 
+    # method / ocr_stage / ocr_stages feed /api/attempts/ocr_stages (QR share, cascade order)
+    attempts.log(cid, "ocr", status=ocr_status, combined_status=combined,
+                 ocr_value=ocr_value, db_value=db_value, image_path=path,
+                 detail={k: result[k] for k in ("method", "ocr_stage", "ocr_stages", "reason", "error")
+                         if result.get(k)})
     upsert_verification(
         cid,
         status=combined,
@@ -160,51 +272,115 @@ def api_ocr():
         face_path=existing.get("face_path"),
         face_attempt_path=existing.get("face_attempt_path"),
     )
-    flash(f"OCR completed — status: {ocr_status}")
-    return redirect(url_for("candidate", cid=cid))
+    return {
+        "candidate_id": cid,
+        "status": ocr_status,
+        "combined_status": combined,
+        "ocr_value": ocr_value,
+        "db_value": db_value,
+        "method": result.get("method"),
+        "ocr_stage": result.get("ocr_stage"),
+        "reason": result.get("reason"),
+        "error": result.get("error"),
+        "timings": {"qr_ms": result.get("qr_ms"), "verify_ms": verify_ms,
+                    "record_ms": _ms_since(t1), "total_ms": _ms_since(t0)},
+    }
 
-    # Preserve existing face result when recalculating combined status
-    existing = get_verification(cid) or {}
-    face_status = existing.get("face_status")          # separate sub-status column if you add it
-    combined = _merge_status(ocr_status, existing.get("face_score") and
-                             ("PASS" if existing.get("face_score", 0) >= 0.4 else "FAIL"))
+@app.route("/api/ocr", methods=["POST"])
+def api_ocr():
+    cid = int(request.form.get("candidate_id"))
+    file = request.files.get("ocr_file")
+    if not file:
+        flash("No file uploaded for OCR")
+        return redirect(url_for("candidate", cid=cid))
 
-    upsert_verification(
-        cid,
-        status=combined,
-        ocr_value=ocr_value,
-        db_value=db_value,
-        ocr_path=str(path),
-        face_score=existing.get("face_score"),
-        face_path=existing.get("face_path"),
-        face_attempt_path=existing.get("face_attempt_path"),
-    )
-    flash(f"OCR completed — status: {ocr_status}")
+    result = _verify_id_image(cid, file.read())
+    if result["status"] == "ERROR":
+        flash(f"OCR/verifier error: {result['error']}")
+    else:
+        flash(f"OCR completed — status: {result['status']}")
     return redirect(url_for("candidate", cid=cid))
 
+@app.route("/api/gate_scan", methods=["POST"])
+def api_gate_scan():
+    """
+    Gate lookup from a photo of the hall ticket alone: the signed QR names the
+    candidate, so no candidate id needs typing and no OCR runs. Read-only;
+    the verdict is recorded by /api/ocr and the face check. Unauthenticated,
+    so it answers with the candidate id and verdict only, never ID numbers
+    or names.
+    """
+    if not HALLTICKET_QR_KEY:
+        return jsonify({"error": "Hall-ticket QR codes are not enabled (HALLTICKET_QR_KEY)"}), 503
+    file = request.files.get("image")
+    if not file:
+        return jsonify({"error": "No image uploaded"}), 400
+    cid = request.form.get("candidate_id", type=int)
+    result = ticket_gate.verify_bytes(file.read(), cid)
+    return jsonify(candidate_id=result.get("ticket_cid"), status=result.get("status"),
+                   reason=result.get("reason"))
+
 #  facever  
 
-def _run_face_verification(cid: int, live_image_path: str):
+def _run_face_verification(cid: int, live_image: bytes, check_quality=True, timings=None):
     """
     Compares uploads/facever/<cid>.jpg (pre-placed reference photo) against the
-    live image. No DB read required — file naming convention is the source of truth.
-    Deliberately does NOT re-run OCR.
+    live image bytes, decoded in memory. The file naming convention is the source of truth; the reference
+    embedding is read from user_faces and only recomputed if the photo or model changed.
+    Deliberately does NOT re-run OCR. Stage times go into `timings` (ms) if given.
     """
+    timings = {} if timings is None else timings
     ref_path = FACE_REF_DIR / f"{cid}.jpg"
     if not ref_path.exists():
         return "FAIL", None, f"Reference photo not found at {ref_path}. Place <id>.jpg in uploads/facever/."
 
     try:
-        ref_emb  = face_engine.extract_embedding(str(ref_path))
-        live_emb = face_engine.extract_embedding(live_image_path)
+        t0 = time.perf_counter()
+        ref_emb  = ref_store.get_or_compute(cid, ref_path)
+        timings["reference_ms"] = _ms_since(t0)
+        t0 = time.perf_counter()
+        live_emb = face_engine.extract_embedding_from_bytes(live_image, check_quality=check_quality)
+        timings["embed_ms"] = _ms_since(t0)
+        t0 = time.perf_counter()
         result   = face_engine.compare(ref_emb, live_emb)  # threshold=0.4 default
+        timings["compare_ms"] = _ms_since(t0)
         face_status = "PASS" if result["match"] else "FAIL"
         return face_status, float(result["similarity"]), None
+    except FrameQualityError as e:
+        # unusable capture: ask for a retake, don't record it as a face mismatch
+        return "RETAKE", None, f"Retake needed: {e}"
     except Exception as e:
         return "FAIL", None, str(e)
 
 
 
+def _verify_face_image(cid: int, img_bytes: bytes) -> dict:
+    """Face check of one live image against the reference photo; persists and returns the result."""
+    t0 = time.perf_counter()
+    attempt_path = FACE_ATTEMPT_DIR / f"{cid}_attempt_{int(datetime.utcnow().timestamp())}.jpg"
+    # audit copy goes to disk in the background; inference works on the buffer
+    audit_writer.write(attempt_path, img_bytes)
+
+    timings = {}
+    face_status, similarity, error = _run_face_verification(cid, img_bytes, timings=timings)
+
+    t1 = time.perf_counter()
+    if face_status == "RETAKE":
+        # rejected by the quality gate: nothing was compared, so leave the record alone
+        attempts.log(cid, "face", status="RETAKE", image_path=attempt_path, detail={"error": error})
+        combined = None
+    else:
+        combined = _record_face_result(cid, face_status, similarity, attempt_path, error)
+    timings.update(record_ms=_ms_since(t1), total_ms=_ms_since(t0))
+    return {
+        "candidate_id": cid,
+        "status": face_status,
+        "combined_status": combined,
+        "similarity": similarity,
+        "error": error,
+        "timings": timings,
+    }
+
 @app.route("/api/face_attempt", methods=["POST"])
 def api_face_attempt():
     cid = int(request.form.get("candidate_id"))
@@ -213,39 +389,31 @@ def api_face_attempt():
     webcam_data = request.form.get("webcam_image")   # base64 data-URL from JS
     face_file   = request.files.get("face_file")
 
-    timestamp = int(datetime.utcnow().timestamp())
-    attempt_filename = f"{cid}_attempt_{timestamp}.jpg"
-    attempt_path = FACE_ATTEMPT_DIR / attempt_filename
-    ''' if webcam_data:
-        header, encoded = webcam_data.split(",", 1)
-        img_bytes = base64.b64decode(encoded)
-        
-        # PROCESS HERE before exception place
-        processed_bytes = preprocess_webcam_image(img_bytes)
-        attempt_path.write_bytes(processed_bytes)'''
     if webcam_data:
         # data:image/...;base64, prefix
         try:
             header, encoded = webcam_data.split(",", 1)
             img_bytes = base64.b64decode(encoded)
-            attempt_path.write_bytes(img_bytes)
         except Exception as e:
             flash(f"Failed to decode webcam image: {e}")
             return redirect(url_for("candidate", cid=cid))
     elif face_file:
-        face_file.save(attempt_path)
+        img_bytes = face_file.read()
     else:
         flash("No face image provided (upload or webcam)")
         return redirect(url_for("candidate", cid=cid))
 
-    # run face-only verification 
-    face_status, similarity, error = _run_face_verification(cid, str(attempt_path))
-
-    if error:
-        flash(f"Face verification error: {error}")
+    result = _verify_face_image(cid, img_bytes)
+    if result["status"] == "RETAKE":
+        flash(result["error"])
+    elif result["error"]:
+        flash(f"Face verification error: {result['error']}")
     else:
-        flash(f"Face verification completed — {face_status} (similarity: {similarity:.3f})")
+        flash(f"Face verification completed — {result['status']} (similarity: {result['similarity']:.3f})")
+    return redirect(url_for("candidate", cid=cid))
 
+def _record_face_result(cid, face_status, similarity, attempt_path, error=None, detail=None):
+    """Merge a face result with the existing OCR result and persist it (and log the attempt)."""
     #statusscheckkk
     existing   = get_verification(cid) or {}
     ocr_val    = existing.get("ocr_value")
@@ -256,6 +424,11 @@ def api_face_attempt():
         ocr_status = "PENDING"
     combined = _merge_status(ocr_status, face_status)
 
+    detail = dict(detail or {})
+    if error:
+        detail["error"] = error
+    attempts.log(cid, "face", status=face_status, combined_status=combined,
+                 face_score=similarity, image_path=attempt_path, detail=detail or None)
     upsert_verification(
         cid,
         status=combined,
@@ -266,18 +439,77 @@ def api_face_attempt():
         face_path=str(FACE_REF_DIR / f"{cid}.jpg"),
         face_attempt_path=str(attempt_path),
     )
-    return redirect(url_for("candidate", cid=cid))
+    return combined
 
-# Manual statuscheckk
+# Streaming face capture: detector-only per frame, ArcFace once on the best frame
 
-@app.route("/api/set_status", methods=["POST"])
-def api_set_status():
+@app.route("/api/face_stream/start", methods=["POST"])
+def api_face_stream_start():
     cid = int(request.form.get("candidate_id"))
-    status = request.form.get("status")
-    if status not in ("PASS", "FAIL", "PENDING", "OCR_UPLOADED"):
-        flash("Invalid status")
-        return redirect(url_for("candidate", cid=cid))
+    session = face_streams.create(
+        cid,
+        window_s=FACE_STREAM_WINDOW_S,
+        good_score=FACE_STREAM_GOOD_SCORE,
+        max_frames=FACE_STREAM_MAX_FRAMES,
+    )
+    return jsonify(session_id=session.id, window_ms=int(FACE_STREAM_WINDOW_S * 1000))
+
+@app.route("/api/face_stream/<session_id>/frame", methods=["POST"])
+def api_face_stream_frame(session_id):
+    session = face_streams.get(session_id)
+    if session is None:
+        return jsonify(error="Unknown or expired capture session"), 404
+
+    frame = request.get_data()
+    if frame and not session.done:
+        session = face_streams.offer(session_id, frame, face_engine)
+        if session is None:
+            return jsonify(error="Unknown or expired capture session"), 404
+    if session.done:
+        return jsonify(done=True, **session.progress())
+
+    if not session.ready():
+        if session.window_closed():
+            # nothing usable in the whole window: tell the candidate why
+            face_streams.finish(session)
+            return jsonify(done=True, status="RETAKE", **session.progress())
+        return jsonify(done=False, **session.progress())
+
+    if not face_streams.finish(session):
+        # a concurrent frame request finished this session first and is recognising it
+        return jsonify(done=True, **session.progress())
+    cid = session.cid
+    attempt_path = FACE_ATTEMPT_DIR / f"{cid}_stream_{int(datetime.utcnow().timestamp())}.jpg"
+    audit_writer.write(attempt_path, session.best_bytes)
+
+    # the winning frame already passed the gate; only recognition is left
+    timings = {}
+    face_status, similarity, error = _run_face_verification(
+        cid, session.best_bytes, check_quality=False, timings=timings)
+    combined = _record_face_result(cid, face_status, similarity, attempt_path, error,
+                                   detail={"stream": session.progress()})
+    # the page shows this result in place (no reload), so nothing is flashed
+    return jsonify(
+        done=True,
+        status=face_status,
+        combined_status=combined,
+        similarity=similarity,
+        error=error,
+        timings=timings,
+        **session.progress(),
+    )
+
+# Manual statuscheckk
+
+MANUAL_STATUSES = ("PASS", "FAIL", "PENDING", "OCR_UPLOADED")
+
+def _set_status(cid: int, status: str) -> dict:
+    """Manual override of the combined status; ValueError for an unknown status."""
+    if status not in MANUAL_STATUSES:
+        raise ValueError(f"Invalid status: {status}")
     existing = get_verification(cid) or {}
+    attempts.log(cid, "status", status=status, combined_status=status,
+                 detail={"previous": existing.get("status")})
     upsert_verification(
         cid,
         status=status,
@@ -288,7 +520,88 @@ def api_set_status():
         face_path=existing.get("face_path"),
         face_attempt_path=existing.get("face_attempt_path"),
     )
-    flash(f"Status manually set to {status}")
+    return {"candidate_id": cid, "status": status, "previous": existing.get("status")}
+
+@app.route("/api/set_status", methods=["POST"])
+def api_set_status():
+    cid = int(request.form.get("candidate_id"))
+    try:
+        _set_status(cid, request.form.get("status"))
+    except ValueError:
+        flash("Invalid status")
+        return redirect(url_for("candidate", cid=cid))
+    flash(f"Status manually set to {request.form.get('status')}")
+    return redirect(url_for("candidate", cid=cid))
+
+# Kiosk JSON API: one round trip per action, raw image bytes in, structured result out.
+# Images are the request body (application/octet-stream, image/*) or a multipart "image" file.
+
+API_V1 = "/api/v1"
+
+def _request_image(field="image"):
+    if request.mimetype in ("multipart/form-data", "application/x-www-form-urlencoded"):
+        file = request.files.get(field)
+        return file.read() if file else None
+    return request.get_data() or None
+
+@app.route(f"{API_V1}/candidates/<int:cid>")
+def api_v1_candidate(cid):
+    user = users.get_user(cid)
+    if user is None:
+        return jsonify(error="Candidate not found"), 404
+    return jsonify(candidate_id=cid, name=user.get("name"), id_type=user.get("id_type"),
+                   id_value=user.get("id_value"), verification=get_verification(cid))
+
+@app.route(f"{API_V1}/candidates/<int:cid>/ocr", methods=["POST"])
+def api_v1_ocr(cid):
+    if get_user_record(cid) is None:
+        return jsonify(error="Candidate not found"), 404
+    img_bytes = _request_image()
+    if not img_bytes:
+        return jsonify(error="No image in request body"), 400
+    return jsonify(_verify_id_image(cid, img_bytes))
+
+@app.route(f"{API_V1}/candidates/<int:cid>/face", methods=["POST"])
+def api_v1_face(cid):
+    if get_user_record(cid) is None:
+        return jsonify(error="Candidate not found"), 404
+    img_bytes = _request_image()
+    if not img_bytes:
+        return jsonify(error="No image in request body"), 400
+    return jsonify(_verify_face_image(cid, img_bytes))
+
+@app.route(f"{API_V1}/candidates/<int:cid>/status", methods=["PUT", "POST"])
+def api_v1_status(cid):
+    if get_user_record(cid) is None:
+        return jsonify(error="Candidate not found"), 404
+    body = request.get_json(silent=True) or request.form
+    try:
+        return jsonify(_set_status(cid, body.get("status")))
+    except ValueError as e:
+        return jsonify(error=str(e), allowed=list(MANUAL_STATUSES)), 400
+
+# Upload reference face
+
+@app.route("/api/upload_ref_face", methods=["POST"])
+def api_upload_ref_face():
+    cid = int(request.form.get("candidate_id"))
+    file = request.files.get("ref_face")
+    if not file:
+        flash("No reference face file provided")
+        return redirect(url_for("candidate", cid=cid))
+
+    dest = FACE_REF_DIR / f"{cid}.jpg"
+    file.save(dest)
+    hallticket_cache.invalidate(cid, dest)
+
+    try:
+        emb = ref_store.refresh(cid, dest)
+        _flag_duplicate_faces(cid, emb)
+    except Exception as e:
+        flash(f"Reference face saved but could not be processed: {e}")
+        return redirect(url_for("candidate", cid=cid))
+
+    flash("Reference face uploaded successfully")
     return redirect(url_for("candidate", cid=cid))
 
 @app.route("/next/<int:cid>")
@@ -299,55 +612,82 @@ def next_candidate(cid):
 
 @app.route("/report")
 def report():
-    users_db_path = BASE / "users.db"
-    users = []
-    import sqlite3 as _sqlite
-    with _sqlite.connect(users_db_path) as conn:
-        conn.row_factory = _sqlite.Row
-        cur = conn.execute("SELECT user_id, id_type, id_value FROM users ORDER BY user_id")
-        for r in cur.fetchall():
-            users.append({"user_id": r["user_id"], "id_type": r["id_type"], "id_value": r["id_value"]})
-
-    verifs = {}
-    with verify_connect() as conn:
-        cur = conn.execute("SELECT * FROM verifications")
-        for r in cur.fetchall():
-            verifs[r["candidate_id"]] = dict(r)
-
-    rows = []
-    total = passed = failed = 0
-    for u in users:
-        uid = u["user_id"]
-        v = verifs.get(uid, {})
-        status = v.get("status") or "PENDING"
-        if status == "PASS":  passed += 1
-        if status == "FAIL":  failed += 1
-        total += 1
-
-        lu = v.get("last_update")
-        if lu:
-            try:
-                parsed = datetime.fromisoformat(lu)
-                formatted_lu = (parsed.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-                                if parsed.tzinfo else parsed.strftime("%Y-%m-%d %H:%M:%S"))
-            except Exception:
-                formatted_lu = lu
-        else:
-            formatted_lu = None
-
-        rows.append({
-            "user_id":    uid,
-            "id_type":    u.get("id_type"),
-            "id_value":   u.get("id_value"),
-            "status":     status,
-            "ocr_value":  v.get("ocr_value"),
-            "face_score": round(v["face_score"], 3) if v.get("face_score") is not None else None,
-            "last_update": formatted_lu,
-        })
-
-    pass_pct = round(passed / total * 100, 1) if total else 0
-    fail_pct = round(failed / total * 100, 1) if total else 0
-    return render_template("report.html", rows=rows, pass_pct=pass_pct, fail_pct=fail_pct)
+    sort = request.args.get("sort", "user_id")
+    if sort not in ReportStore.SORTS:
+        sort = "user_id"
+    try:
+        page = int(request.args.get("page", 1))
+        per_page = int(request.args.get("per_page", REPORT_PAGE_SIZE))
+    except ValueError:
+        page, per_page = 1, REPORT_PAGE_SIZE
+
+    pager = report_store.page(
+        page=page,
+        per_page=per_page,
+        sort=sort,
+        order=request.args.get("order", "asc"),
+        status=request.args.get("status") or None,
+    )
+    pct = stats.snapshot()
+    return render_template("report.html", rows=pager["rows"], pager=pager,
+                           pass_pct=pct["pass_pct"], fail_pct=pct["fail_pct"])
+
+@app.route("/api/stats")
+def api_stats():
+    """Live counts by status / id_type / hour; cheap enough to poll every second."""
+    return jsonify(stats.snapshot())
+
+@app.route("/api/attempts/<int:cid>")
+def api_attempt_history(cid):
+    """Every OCR / face / manual-status attempt for one candidate, newest first."""
+    limit = request.args.get("limit", 100, type=int)
+    return jsonify(candidate_id=cid, attempts=attempts.history(cid, limit=limit))
+
+@app.route("/api/attempts")
+def api_recent_attempts():
+    """All attempts in the last ?minutes= (default 10), oldest first."""
+    minutes = request.args.get("minutes", 10, type=float)
+    limit = request.args.get("limit", 10000, type=int)
+    return jsonify(minutes=minutes, attempts=attempts.recent(minutes, limit=limit))
+
+@app.route("/api/attempts/ocr_stages")
+def api_ocr_stages():
+    """ID checks in the last ?hours= (default 24) by QR / OCR and the OCR stage that read the number."""
+    hours = request.args.get("hours", 24, type=float)
+    return jsonify(hours=hours, stages=attempts.ocr_stages(hours))
+
+@app.route("/api/export/<fmt>")
+def api_export(fmt):
+    """
+    Whole joined users / verifications table, streamed as it is read:
+    /api/export/csv|jsonl|parquet?status=PASS&since=2026-10-01&until=2026-10-02
+    """
+    if fmt not in result_export.FORMATS:
+        return jsonify({"error": f"Unknown format: {fmt}"}), 400
+    try:
+        since = result_export.parse_time(request.args.get("since"))
+        until = result_export.parse_time(request.args.get("until"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows = report_store.iter_export(status=request.args.get("status") or None,
+                                    since=since, until=until)
+    cols = ReportStore.EXPORT_COLUMNS
+    mimetype, ext = result_export.FORMATS[fmt]
+    headers = {"Content-Disposition": f"attachment; filename=verifications.{ext}"}
+
+    if fmt == "csv":
+        body = result_export.iter_csv(rows, cols)
+    elif fmt == "jsonl":
+        body = result_export.iter_jsonl(rows, cols)
+    else:
+        # one row group per batch goes out as it is read; the footer comes last
+        try:
+            body = result_export.iter_parquet(rows, cols)
+        except ImportError as e:
+            return jsonify({"error": str(e)}), 501
+
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
 #.
 @app.route("/register", methods=["GET", "POST"])
 def register():
@@ -361,35 +701,40 @@ def register():
     id_type  = request.form.get("id_type",  "aadhaar").strip()
 
     # auto-assign next candidate ID
-    import sqlite3 as _sq
-    with _sq.connect(BASE / "users.db") as conn:
-        row = conn.execute("SELECT MAX(user_id) FROM users").fetchone()
-        cid = (row[0] or 0) + 1
-        conn.execute(
-            "INSERT INTO users (user_id, id_type, id_value, name, gmail) VALUES (?, ?, ?, ?, ?)",
-            (cid, id_type, id_value, name, gmail)
-        )
-        conn.commit()
-
-    # save OCR image → uploads/ocr/<cid>.jpg
+    cid = users.create_user(id_type, id_value, name, gmail)
+    stats.add_candidate(cid, id_type)
+
+    # save OCR image → uploads/ocr/<cid>.jpg; written now, not queued: the hall
+    # ticket embeds it and may be requested straight after registration
     ocr_webcam = request.form.get("ocr_webcam")
     ocr_file   = request.files.get("ocr_file")
-    ocr_path   = OCR_DIR / f"{cid}.jpg"
     if ocr_webcam:
         _, enc = ocr_webcam.split(",", 1)
-        ocr_path.write_bytes(base64.b64decode(enc))
+        write_file(OCR_DIR / f"{cid}.jpg", base64.b64decode(enc))
     elif ocr_file:
-        ocr_file.save(ocr_path)
+        write_file(OCR_DIR / f"{cid}.jpg", ocr_file.read())
 
-    # save face image → uploads/facever/<cid>.jpg
+    # save face image → uploads/facever/<cid>.jpg; the embedding uses the buffer
     face_webcam = request.form.get("face_webcam")
     face_file   = request.files.get("face_file")
     face_path   = FACE_REF_DIR / f"{cid}.jpg"
+    face_bytes  = None
     if face_webcam:
         _, enc = face_webcam.split(",", 1)
-        face_path.write_bytes(base64.b64decode(enc))
+        face_bytes = base64.b64decode(enc)
     elif face_file:
-        face_file.save(face_path)
+        face_bytes = face_file.read()
+
+    hallticket_cache.invalidate(cid, face_path, OCR_DIR / f"{cid}.jpg")
+    if face_bytes:
+        # the reference photo, not an audit copy: face checks, ref_store and the
+        # hall ticket read it back, possibly before a queued write would land
+        write_file(face_path, face_bytes)
+        try:
+            emb = ref_store.refresh(cid, face_path, face_bytes)
+            _flag_duplicate_faces(cid, emb)
+        except Exception as e:
+            flash(f"Reference face could not be processed: {e}")
 
     flash(f"Candidate registered with ID {cid}", "success")
    # return redirect(url_for("candidate", cid=cid))
@@ -398,414 +743,80 @@ def register():
 @app.route("/hallticket/<int:cid>")
 def hallticket(cid):
     # Fetch candidate info
-    import sqlite3 as _sq
-    with _sq.connect(BASE / "users.db") as conn:
-        conn.row_factory = _sq.Row
-        user = conn.execute("SELECT * FROM users WHERE user_id=?", (cid,)).fetchone()
+    user = users.get_user(cid)
     if not user:
         flash("Candidate not found")
         return redirect(url_for("index"))
 
-    # Load photos as base64 for embedding in HTML
-    def img_b64(path):
-        p = Path(path)
-        if p.exists():
-            data = p.read_bytes()
-            return "data:image/jpeg;base64," + base64.b64encode(data).decode()
-        return ""
-
-    face_img = img_b64(FACE_REF_DIR / f"{cid}.jpg")
-    ocr_img  = img_b64(OCR_DIR      / f"{cid}.jpg")
-
-    name     = user["name"]    if "name"    in user.keys() else "—"
-    aadhaar  = user["id_value"] or "—"
-
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-<meta charset="utf-8">
-<style>
-  @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-  * {{ margin:0; padding:0; box-sizing:border-box; }}
-  body {{
-    font-family: 'Inter', Arial, sans-serif;
-    background: #fff;
-    color: #111;
-    padding: 0;
-  }}
-
-  .page {{
-    width: 210mm;
-    min-height: 297mm;
-    margin: 0 auto;
-    padding: 12mm 14mm;
-  }}
-
-  /* Header */
-  .header {{
-    display: flex;
-    align-items: center;
-    border-bottom: 3px solid #1a3c8f;
-    padding-bottom: 10px;
-    margin-bottom: 10px;
-    gap: 16px;
-  }}
-  .header-logo {{
-    width: 64px; height: 64px;
-    background: #1a3c8f;
-    border-radius: 8px;
-    display: flex; align-items: center; justify-content: center;
-    color: #fff; font-size: 22px; font-weight: 700; letter-spacing: 1px;
-    flex-shrink: 0;
-  }}
-  .header-text h1 {{
-    font-size: 18px; font-weight: 700; color: #1a3c8f; letter-spacing: 0.03em;
-  }}
-  .header-text p {{
-    font-size: 12px; color: #555; margin-top: 2px;
-  }}
-  .header-badge {{
-    margin-left: auto;
-    background: #1a3c8f;
-    color: #fff;
-    padding: 6px 16px;
-    border-radius: 6px;
-    font-size: 13px;
-    font-weight: 600;
-    letter-spacing: 0.05em;
-    flex-shrink: 0;
-  }}
-
-  /* Hall ticket title */
-  .ticket-title {{
-    text-align: center;
-    font-size: 15px;
-    font-weight: 700;
-    letter-spacing: 0.12em;
-    text-transform: uppercase;
-    color: #1a3c8f;
-    border: 2px solid #1a3c8f;
-    padding: 6px;
-    margin-bottom: 14px;
-    background: #eef2ff;
-  }}
-
-  /* Main body: info left, photos right */
-  .body-row {{
-    display: flex;
-    gap: 16px;
-    margin-bottom: 14px;
-  }}
-  .info-block {{
-    flex: 1;
-  }}
-  .photos-block {{
-    display: flex;
-    flex-direction: column;
-    gap: 8px;
-    align-items: center;
-    flex-shrink: 0;
-  }}
-  .photo-wrap {{
-    text-align: center;
-  }}
-  .photo-wrap img {{
-    width: 90px; height: 110px;
-    object-fit: cover;
-    border: 2px solid #1a3c8f;
-    border-radius: 4px;
-    display: block;
-  }}
-  .photo-wrap .photo-label {{
-    font-size: 9px;
-    color: #555;
-    margin-top: 3px;
-    text-transform: uppercase;
-    letter-spacing: 0.08em;
-  }}
-  .photo-placeholder {{
-    width: 90px; height: 110px;
-    background: #f0f0f0;
-    border: 2px dashed #aaa;
-    border-radius: 4px;
-    display: flex; align-items: center; justify-content: center;
-    font-size: 10px; color: #aaa; text-align: center;
-  }}
-
-  /* Info table */
-  table.info {{
-    width: 100%;
-    border-collapse: collapse;
-    font-size: 12.5px;
-  }}
-  table.info td {{
-    padding: 6px 8px;
-    border: 1px solid #d0d7e8;
-    vertical-align: top;
-  }}
-  table.info td.lbl {{
-    background: #eef2ff;
-    font-weight: 600;
-    color: #1a3c8f;
-    width: 38%;
-    white-space: nowrap;
-  }}
-  table.info td.val {{
-    color: #111;
-    font-weight: 500;
-  }}
-
-  /* Exam details box */
-  .exam-box {{
-    border: 2px solid #1a3c8f;
-    border-radius: 6px;
-    overflow: hidden;
-    margin-bottom: 14px;
-  }}
-  .exam-box-title {{
-    background: #1a3c8f;
-    color: #fff;
-    font-size: 12px;
-    font-weight: 700;
-    letter-spacing: 0.1em;
-    text-transform: uppercase;
-    padding: 5px 12px;
-  }}
-  .exam-grid {{
-    display: grid;
-    grid-template-columns: 1fr 1fr;
-    font-size: 12.5px;
-  }}
-  .exam-cell {{
-    padding: 7px 12px;
-    border-right: 1px solid #d0d7e8;
-    border-bottom: 1px solid #d0d7e8;
-  }}
-  .exam-cell:nth-child(even) {{ border-right: none; }}
-  .exam-cell .ec-label {{
-    font-size: 10px;
-    color: #1a3c8f;
-    font-weight: 600;
-    text-transform: uppercase;
-    letter-spacing: 0.07em;
-    margin-bottom: 2px;
-  }}
-  .exam-cell .ec-val {{
-    font-weight: 600;
-    color: #111;
-  }}
-
-  /* Address box */
-  .addr-box {{
-    border: 1px solid #d0d7e8;
-    border-radius: 6px;
-    padding: 10px 14px;
-    margin-bottom: 14px;
-    font-size: 12px;
-    color: #555;
-    background: #fafafa;
-  }}
-  .addr-box .addr-label {{
-    font-size: 10px;
-    font-weight: 700;
-    color: #1a3c8f;
-    text-transform: uppercase;
-    letter-spacing: 0.08em;
-    margin-bottom: 4px;
-  }}
-
-  /* Instructions */
-  .instructions {{
-    border: 1px solid #f0c040;
-    background: #fffbea;
-    border-radius: 6px;
-    padding: 10px 14px;
-    margin-bottom: 14px;
-    font-size: 11px;
-    color: #555;
-  }}
-  .instructions b {{ color: #b45309; }}
-  .instructions ol {{ padding-left: 16px; margin-top: 4px; }}
-  .instructions li {{ margin-bottom: 3px; }}
-
-  /* Signature row */
-  .sig-row {{
-    display: flex;
-    justify-content: space-between;
-    align-items: flex-end;
-    margin-top: 10px;
-    font-size: 11px;
-    color: #555;
-  }}
-  .sig-box {{
-    text-align: center;
-  }}
-  .sig-line {{
-    width: 140px;
-    border-top: 1px solid #333;
-    margin: 28px auto 4px;
-  }}
-
-  /* Footer */
-  .footer {{
-    border-top: 2px solid #1a3c8f;
-    margin-top: 14px;
-    padding-top: 6px;
-    font-size: 10px;
-    color: #888;
-    text-align: center;
-  }}
-</style>
-</head>
-<body>
-<div class="page">
-
-  <!-- Header -->
-  <div class="header">
-    <div class="header-logo">EVS</div>
-    <div class="header-text">
-      <h1>Exam Verification System</h1>
-      <p>Conducting Body &bull; National Examination Authority</p>
-    </div>
-    <div class="header-badge">ADMIT CARD</div>
-  </div>
-
-  <!-- Title -->
-  <div class="ticket-title">Hall Ticket &mdash; Examination Admit Card</div>
-
-  <!-- Body: info + photos -->
-  <div class="body-row">
-    <div class="info-block">
-      <table class="info">
-        <tr>
-          <td class="lbl">Candidate ID</td>
-          <td class="val" style="font-family:monospace; font-size:14px; letter-spacing:0.05em;">{cid}</td>
-        </tr>
-        <tr>
-          <td class="lbl">Candidate Name</td>
-          <td class="val">{name}</td>
-        </tr>
-        <tr>
-          <td class="lbl">Aadhaar Number</td>
-          <td class="val" style="font-family:monospace;">{aadhaar}</td>
-        </tr>
-        <tr>
-          <td class="lbl">Examination</td>
-          <td class="val">Graduate Aptitude Test in Engineering (EVS-2025)</td>
-        </tr>
-        <tr>
-          <td class="lbl">Paper / Subject</td>
-          <td class="val">Computer Science &amp; Information Technology (CS)</td>
-        </tr>
-        <tr>
-          <td class="lbl">Address</td>
-          <td class="val" style="color:#aaa;">123 Main Street, City, State &mdash; 000000<br><span style="font-size:10px;">(placeholder)</span></td>
-        </tr>
-      </table>
-    </div>
-
-    <!-- Photos -->
-    <div class="photos-block">
-      <div class="photo-wrap">
-        {"<img src='" + face_img + "'>" if face_img else "<div class='photo-placeholder'>No Face<br>Photo</div>"}
-        <div class="photo-label">Face Photo</div>
-      </div>
-      <div class="photo-wrap">
-        {"<img src='" + ocr_img + "'>" if ocr_img else "<div class='photo-placeholder'>No ID<br>Photo</div>"}
-        <div class="photo-label">ID Document</div>
-      </div>
-    </div>
-  </div>
-
-  <!-- Exam details -->
-  <div class="exam-box">
-    <div class="exam-box-title">Examination Schedule</div>
-    <div class="exam-grid">
-      <div class="exam-cell">
-        <div class="ec-label">Exam Name</div>
-        <div class="ec-val">EVS Graduate Aptitude Test 2025</div>
-      </div>
-      <div class="exam-cell">
-        <div class="ec-label">Exam Date</div>
-        <div class="ec-val">15 February 2025</div>
-      </div>
-      <div class="exam-cell">
-        <div class="ec-label">Reporting Time</div>
-        <div class="ec-val">08:30 AM</div>
-      </div>
-      <div class="exam-cell">
-        <div class="ec-label">Exam Time</div>
-        <div class="ec-val">09:30 AM &ndash; 12:30 PM</div>
-      </div>
-      <div class="exam-cell" style="grid-column: 1/-1;">
-        <div class="ec-label">Venue</div>
-        <div class="ec-val">Examination Hall No. 4, Block B &mdash; National University Campus, Main Road, City &mdash; 000000 &nbsp;<span style="color:#aaa; font-weight:400; font-size:11px;">(placeholder)</span></div>
-      </div>
-    </div>
-  </div>
-
-  <!-- Address -->
-  <div class="addr-box">
-    <div class="addr-label">Correspondence Address</div>
-    123 Main Street, Locality, City, State &mdash; PIN 000000 &nbsp;<span style="color:#bbb;">(placeholder)</span>
-  </div>
-
-  <!-- Instructions -->
-  <div class="instructions">
-    <b>Important Instructions:</b>
-    <ol>
-      <li>Candidates must bring this hall ticket along with a valid photo ID to the examination centre.</li>
-      <li>Mobile phones, electronic gadgets, and calculators are strictly prohibited inside the exam hall.</li>
-      <li>Candidates must report at least 30 minutes before the scheduled exam time.</li>
-      <li>Entry will not be allowed after the exam commences. No exceptions will be made.</li>
-      <li>This hall ticket is valid only with a government-issued photo ID proof.</li>
-    </ol>
-  </div>
-
-  <!-- Signatures -->
-  <div class="sig-row">
-    <div class="sig-box">
-      <div class="sig-line"></div>
-      Candidate's Signature
-    </div>
-    <div style="font-size:10px; color:#aaa; text-align:center;">
-      Generated by Exam Verification System<br>
-      This is a computer-generated document.
-    </div>
-    <div class="sig-box">
-      <div class="sig-line"></div>
-      Invigilator's Signature
-    </div>
-  </div>
-
-  <!-- Footer -->
-  <div class="footer">
-    Exam Verification System &bull; Candidate ID: {cid} &bull; This document is system-generated and valid without physical signature.
-  </div>
-
-</div>
-</body>
-</html>"""
-
-    try:
-        
-        from xhtml2pdf import pisa
-        import io
-
-        def generate_pdf(html_content):
-            pdf_buffer = io.BytesIO()
-            pisa.CreatePDF(html_content, dest=pdf_buffer)
-            return pdf_buffer.getvalue()
+    face_path = FACE_REF_DIR / f"{cid}.jpg"
+    ocr_path = OCR_DIR / f"{cid}.jpg"
 
-        pdf_bytes = generate_pdf(html)
-        resp = make_response(pdf_bytes)
-        resp.headers["Content-Type"] = "application/pdf"
-        resp.headers["Content-Disposition"] = f"inline; filename=hallticket_{cid}.pdf"
-        return resp
+    # same candidate row + same photos + same template = same PDF; the key is the ETag
+    key = hallticket_cache.key(user, face_path, ocr_path)
+    if key in request.if_none_match:
+        return _hallticket_headers(make_response("", 304), key)
 
+    try:
+        pdf_path = hallticket_cache.get_or_render(
+            cid, key, lambda: hallticket_cache.render(user, face_path, ocr_path))
     except ImportError:
         # fallback: return HTML directly if xhtml2pdf not installed
-        return html 
+        return hallticket_cache.html(user, face_path, ocr_path)
+
+    resp = send_file(pdf_path, mimetype="application/pdf",
+                     download_name=f"hallticket_{cid}.pdf", conditional=True, etag=key)
+    return _hallticket_headers(resp, key)
+
+@app.route("/api/halltickets")
+def api_halltickets():
+    """
+    Hall tickets for a whole range / filter:
+    /api/halltickets?from=1000&to=1999&status=PASS&format=zip|pdf
+    zip is streamed as it is rendered; pdf starts a background job (202) whose
+    merged files are fetched from /api/halltickets/jobs/<job_id>.
+    """
+    fmt = request.args.get("format", "zip")
+    if fmt not in ("zip", "pdf"):
+        return jsonify({"error": f"Unknown format: {fmt}"}), 400
+    filters = {
+        "status": request.args.get("status") or None,
+        "first_id": request.args.get("from", type=int),
+        "last_id": request.args.get("to", type=int),
+    }
+    busy = jsonify({"error": "A bulk hall-ticket job is already running, try again later"}), 503
+    if fmt == "zip":
+        body = hallticket_jobs.stream_zip(**filters)
+        if body is None:
+            return busy
+        return Response(body, mimetype="application/zip",
+                        headers={"Content-Disposition": "attachment; filename=halltickets.zip"})
+
+    job_id = hallticket_jobs.start_pdf(HALLTICKET_MERGE_MAX, **filters)
+    if job_id is None:
+        return busy
+    status_url = url_for("api_hallticket_job", job_id=job_id)
+    return jsonify(job_id=job_id, status="running", status_url=status_url), 202, {"Location": status_url}
+
+@app.route("/api/halltickets/jobs/<job_id>")
+def api_hallticket_job(job_id):
+    job = hallticket_jobs.job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    job["files"] = [url_for("api_hallticket_job_file", job_id=job_id, name=name) for name in job["files"]]
+    return jsonify(job), 202 if job["status"] == "running" else 200
+
+@app.route("/api/halltickets/jobs/<job_id>/<name>")
+def api_hallticket_job_file(job_id, name):
+    path = hallticket_jobs.file(job_id, name)
+    if path is None:
+        return jsonify({"error": "Unknown file"}), 404
+    return send_file(path, mimetype="application/pdf", download_name=name)
+
+def _hallticket_headers(resp, key):
+    resp.set_etag(key)
+    # personal data: browsers may keep it, but must revalidate (a cheap 304) before reuse
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
 
 if __name__ == "__main__":
     app.run(debug=True)
@@ -8,6 +8,7 @@ from datetime import datetime, timezone
 
 from Untitled_1 import OCREngine, UserDatabase, IDVerifier
 from Untitled_2 import StudentVerifier, InsightFaceEngine
+from face_store import ReferenceEmbeddingStore
 
 BASE = Path(__file__).parent
 UPLOAD_DIR = BASE / "uploads"
@@ -15,6 +16,7 @@ OCR_DIR = UPLOAD_DIR / "ocr"
 FACE_REF_DIR = UPLOAD_DIR / "facever"
 FACE_ATTEMPT_DIR = UPLOAD_DIR / "face_attempts"
 VERIFY_DB = BASE / "verify.db"
+USERS_DB = BASE / "users.db"
 USERS_DB_URL = f"sqlite:///{BASE / 'users.db'}"
 
 for d in (UPLOAD_DIR, OCR_DIR, FACE_REF_DIR, FACE_ATTEMPT_DIR):
@@ -26,6 +28,9 @@ app.secret_key = "dev-secret"
 # ─── shared InsightFace engine (loaded once at startup) ───────────────────────
 face_engine = InsightFaceEngine()
 
+# ─── reference embeddings, computed once per uploaded photo ───────────────────
+ref_store = ReferenceEmbeddingStore(USERS_DB, face_engine)
+
 # ─── DB helpers ───────────────────────────────────────────────────────────────
 
 def verify_connect():
@@ -180,6 +185,12 @@ def api_upload_ref_face():
         )
         conn.commit()
 
+    try:
+        ref_store.refresh(cid, dest)
+    except Exception as e:
+        flash(f"Reference face saved but could not be processed: {e}")
+        return redirect(url_for("candidate", cid=cid))
+
     flash("Reference face uploaded successfully")
     return redirect(url_for("candidate", cid=cid))
 
@@ -196,7 +207,7 @@ def _run_face_verification(cid: int, live_image_path: str):
         return "FAIL", None, "No reference face found. Upload one first."
 
     try:
-        ref_emb  = face_engine.extract_embedding(str(ref_path))
+        ref_emb  = ref_store.get_or_compute(cid, ref_path)
         live_emb = face_engine.extract_embedding(live_image_path)
         result   = face_engine.compare(ref_emb, live_emb)  # threshold=0.4 default
         face_status = "PASS" if result["match"] else "FAIL"
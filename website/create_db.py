@@ -21,6 +21,8 @@ with engine.begin() as conn:
             user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
             image_path TEXT NOT NULL,
             embedding BLOB,           -- optional, pre‑computed vector
+            model_tag TEXT,           -- face model that produced the embedding
+            image_sha256 TEXT,        -- digest of the photo it was computed from
             uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP
         ) """))
     
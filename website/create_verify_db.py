@@ -21,6 +21,8 @@ CREATE TABLE IF NOT EXISTS verifications (
 
 def create_db():
     with sqlite3.connect(VERIFY_DB) as conn:
+        # many kiosks write concurrently; WAL is persistent once set on the file
+        conn.execute("PRAGMA journal_mode=WAL")
         conn.executescript(schema)
         conn.commit()
     print(f"verify.db created at {VERIFY_DB}")
@@ -0,0 +1,757 @@
+"""
+DATA ACCESS LAYER
+-----------------
+One process-wide entry point for users.db and verify.db.
+
+- ConnectionPool     : a bounded pool of long-lived sqlite3 connections per
+                       database file. Connections are opened once (pragmas,
+                       row_factory) and handed out per request, so a page view
+                       no longer pays for create_engine / connect. sqlite3
+                       keeps the compiled form of every statement per
+                       connection, so the fixed SQL below is prepared once and
+                       reused on every call.
+- UserStore          : users table (also what IDVerifier needs: get_user_id_record)
+- GroupCommitWriter  : one background thread owns the only write connection;
+                       writes queued within max_delay_ms of each other are
+                       committed in ONE transaction (one fsync), each caller
+                       gets a Future for its own statement
+- VerificationStore  : verifications table; WAL, atomic INSERT ... ON CONFLICT
+                       upserts, all writes through a GroupCommitWriter
+- AttemptLog         : append-only attempts table (every OCR / face / manual
+                       status attempt) on the same writer, with monthly
+                       archive files and a per-day roll-up for old rows
+- ReportStore        : /report as one paginated SQL join of users.db with
+                       verify.db ATTACHed, aggregates computed in SQL; also
+                       streams the full joined result set for exports
+
+    users = UserStore(ConnectionPool(USERS_DB))
+    users.get_user(cid)
+"""
+
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+class ConnectionPool:
+    def __init__(self, db_path, size=8, pragmas=None, timeout=30.0, attach=None):
+        """
+        size    : max connections kept open; extra callers wait for one to free up
+        pragmas : {"journal_mode": "WAL", ...} applied to every new connection
+        timeout : sqlite busy timeout in seconds
+        attach  : {"schema_name": other_db_path} ATTACHed on every new connection
+        """
+        self.db_path = Path(db_path)
+        self.size = size
+        self.pragmas = pragmas or {}
+        self.attach = attach or {}
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        for schema, path in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        """A pooled connection; commits on success, rolls back if the block raises."""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened = 0
+
+
+# readers never block the writer and vice versa; NORMAL is durable in WAL mode
+# except for the last transactions on power loss
+WAL_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+}
+
+
+class GroupCommitWriter:
+    _STOP = object()
+
+    def __init__(self, db_path, pragmas=None, max_delay_ms=2.0, max_batch=512, timeout=30.0):
+        self.db_path = Path(db_path)
+        self.max_delay = max_delay_ms / 1000.0
+        self.max_batch = max_batch
+
+        # autocommit mode: transactions are managed explicitly in _commit
+        self._conn = sqlite3.connect(self.db_path, timeout=timeout, isolation_level=None,
+                                     check_same_thread=False, cached_statements=256)
+        for name, value in (pragmas or {}).items():
+            self._conn.execute(f"PRAGMA {name} = {value}")
+
+        self._pending = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def submit(self, sql: str, params=()) -> Future:
+        """Queue one statement; the Future resolves to its rowcount once committed."""
+        fut = Future()
+        self._pending.put((sql, params, fut))
+        return fut
+
+    def execute(self, sql: str, params=()):
+        """submit() and wait for the commit."""
+        return self.submit(sql, params).result()
+
+    def close(self):
+        """Commit everything still queued, then stop (also runs at interpreter exit)."""
+        if self._worker.is_alive():
+            self._pending.put(self._STOP)
+            self._worker.join()
+
+    # -------- writer thread --------
+    def _collect(self):
+        batch = [self._pending.get()]
+        if batch[0] is self._STOP:
+            return batch
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = (self._pending.get(timeout=remaining) if remaining > 0
+                        else self._pending.get_nowait())
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is self._STOP:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = batch[-1] is self._STOP
+            ops = batch[:-1] if stop else batch
+            if ops:
+                self._commit(ops)
+            if stop:
+                self._conn.close()
+                return
+
+    def _commit(self, ops):
+        done, failed = [], []
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for sql, params, fut in ops:
+                # a bad statement only fails its own caller, not the whole group
+                self._conn.execute("SAVEPOINT op")
+                try:
+                    rowcount = self._conn.execute(sql, params).rowcount
+                    self._conn.execute("RELEASE op")
+                    done.append((fut, rowcount))
+                except Exception as e:
+                    self._conn.execute("ROLLBACK TO op")
+                    self._conn.execute("RELEASE op")
+                    failed.append((fut, e))
+            self._conn.execute("COMMIT")
+        except Exception as e:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            for _, _, fut in ops:
+                fut.set_exception(e)
+            return
+
+        for fut, rowcount in done:
+            fut.set_result(rowcount)
+        for fut, e in failed:
+            fut.set_exception(e)
+
+
+# =========================
+# users.db
+# =========================
+class UserStore:
+    SELECT_USER = "SELECT * FROM users WHERE user_id = ?"
+    SELECT_ID_RECORD = "SELECT id_type, id_value FROM users WHERE user_id = ?"
+    SELECT_ALL = "SELECT user_id, id_type, id_value FROM users ORDER BY user_id"
+    SELECT_MAX_ID = "SELECT MAX(user_id) FROM users"
+    INSERT_USER = """
+        INSERT INTO users (user_id, id_type, id_value, name, gmail)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    # ID numbers compared the way IDVerifier does (upper case, no spaces), whatever form
+    # they were stored in: /register keeps them as typed, bulk enrolment normalised
+    ID_NORM = "UPPER(REPLACE(id_value, ' ', ''))"
+    INDEX_ID_VALUE = f"CREATE INDEX IF NOT EXISTS idx_users_id_norm ON users({ID_NORM})"
+    DROP_OLD_INDEX = "DROP INDEX IF EXISTS idx_users_id_value"
+    SELECT_BY_ID_VALUES = f"SELECT DISTINCT {ID_NORM} FROM users WHERE {ID_NORM} IN ({{marks}})"
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    def get_user(self, user_id: int):
+        """Full users row as a dict, or None."""
+        with self.pool.connection() as conn:
+            row = conn.execute(self.SELECT_USER, (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_user_id_record(self, user_id: int):
+        """Same contract as Untitled_1.UserDatabase, so IDVerifier can use this store."""
+        with self.pool.connection() as conn:
+            row = conn.execute(self.SELECT_ID_RECORD, (user_id,)).fetchone()
+        if row is None:
+            raise ValueError("User not found")
+        return dict(row)
+
+    def list_users(self):
+        with self.pool.connection() as conn:
+            return [dict(r) for r in conn.execute(self.SELECT_ALL)]
+
+    def create_user(self, id_type, id_value, name, gmail) -> int:
+        """Insert with the next free user_id (read + insert in one transaction)."""
+        return self.create_users([(id_type, id_value, name, gmail)])[0]
+
+    def create_users(self, records, extra=None) -> list:
+        """
+        Insert [(id_type, id_value, name, gmail), ...] under consecutive new
+        user_ids, all in ONE write transaction, so concurrent registrations can
+        never be handed the same ids. MAX(user_id) on the primary key is a
+        single index probe. extra(conn, ids) runs inside the same transaction
+        (e.g. the user_faces rows), so everything commits or nothing does.
+        """
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(self.SELECT_MAX_ID).fetchone()
+            start = (row[0] or 0) + 1
+            ids = list(range(start, start + len(records)))
+            conn.executemany(self.INSERT_USER, [(cid,) + tuple(rec) for cid, rec in zip(ids, records)])
+            if extra is not None:
+                extra(conn, ids)
+        return ids
+
+    def ensure_indexes(self):
+        with self.pool.connection() as conn:
+            conn.execute(self.DROP_OLD_INDEX)
+            conn.execute(self.INDEX_ID_VALUE)
+
+    def find_enrolled(self, id_values) -> set:
+        """
+        The normalised ID numbers among these already in users.db, under any
+        id_type (an aadhaar / aadhar spelling never hides a duplicate).
+        """
+        id_values = list({(v or "").upper().replace(" ", "") for v in id_values})
+        found = set()
+        with self.pool.connection() as conn:
+            # stay well below SQLite's bound-parameter limit
+            for i in range(0, len(id_values), 500):
+                part = id_values[i:i + 500]
+                q = self.SELECT_BY_ID_VALUES.format(marks=", ".join("?" * len(part)))
+                found.update(v for (v,) in conn.execute(q, part))
+        return found
+
+
+# =========================
+# verify.db
+# =========================
+class VerificationStore:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS verifications (
+            candidate_id INTEGER PRIMARY KEY,
+            status TEXT,
+            ocr_value TEXT,
+            db_value TEXT,
+            ocr_path TEXT,
+            face_path TEXT,
+            face_attempt_path TEXT,
+            face_score REAL,
+            last_update TEXT
+        )
+    """
+    SELECT_ONE = "SELECT * FROM verifications WHERE candidate_id = ?"
+    SELECT_ALL = "SELECT * FROM verifications"
+    UPSERT = """
+        INSERT INTO verifications
+            (candidate_id, status, ocr_value, db_value, ocr_path,
+             face_score, face_path, face_attempt_path, last_update)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(candidate_id) DO UPDATE SET
+            status = excluded.status,
+            ocr_value = excluded.ocr_value,
+            db_value = excluded.db_value,
+            ocr_path = excluded.ocr_path,
+            face_score = excluded.face_score,
+            face_path = excluded.face_path,
+            face_attempt_path = excluded.face_attempt_path,
+            last_update = excluded.last_update
+    """
+
+    def __init__(self, db_path, pool_size=8, max_delay_ms=2.0):
+        """Readers share a pooled set of WAL connections; every write goes through one writer thread."""
+        self.pool = ConnectionPool(db_path, size=pool_size, pragmas=WAL_PRAGMAS)
+        with self.pool.connection() as conn:
+            conn.execute(self.SCHEMA)
+        self.writer = GroupCommitWriter(db_path, pragmas=WAL_PRAGMAS, max_delay_ms=max_delay_ms)
+
+    def get(self, cid: int):
+        with self.pool.connection() as conn:
+            row = conn.execute(self.SELECT_ONE, (cid,)).fetchone()
+        return dict(row) if row else None
+
+    def all(self):
+        """{candidate_id: row dict}"""
+        with self.pool.connection() as conn:
+            return {r["candidate_id"]: dict(r) for r in conn.execute(self.SELECT_ALL)}
+
+    def upsert(self, cid, status=None, ocr_value=None, db_value=None,
+               ocr_path=None, face_score=None, face_path=None, face_attempt_path=None) -> Future:
+        """Queue an atomic insert-or-replace of the row; the Future resolves once it is committed."""
+        now = datetime.now(timezone.utc).isoformat()
+        return self.writer.submit(self.UPSERT, (cid, status, ocr_value, db_value, ocr_path,
+                                                face_score, face_path, face_attempt_path, now))
+
+    def close(self):
+        self.writer.close()
+        self.pool.close()
+
+
+# =========================
+# verify.db attempt log
+# =========================
+class AttemptLog:
+    """
+    Append-only history of every OCR / face / manual-status attempt; the
+    verifications row only keeps the latest. Rows are queued on the same
+    group-commit writer as the verifications upserts, so logging an attempt
+    shares their transaction instead of paying its own fsync.
+
+    Old rows are moved out by archive(): counted into attempt_rollup (per UTC
+    day, kind, status) and copied into one sqlite file per month, so the live
+    table stays small enough for the two hot queries (one candidate's history,
+    everything since a timestamp) to be index range scans.
+    """
+
+    # AUTOINCREMENT: ids are never reused once archive() empties the table, so an
+    # id names one attempt across the live table and every archive file
+    TABLE = """
+        CREATE TABLE IF NOT EXISTS {schema}attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            candidate_id INTEGER NOT NULL,
+            ts TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            status TEXT,
+            combined_status TEXT,
+            ocr_value TEXT,
+            db_value TEXT,
+            face_score REAL,
+            image_path TEXT,
+            detail TEXT
+        )
+    """
+    SCHEMA = [
+        TABLE.format(schema=""),
+        "CREATE INDEX IF NOT EXISTS idx_attempts_candidate_ts ON attempts(candidate_id, ts)",
+        "CREATE INDEX IF NOT EXISTS idx_attempts_ts ON attempts(ts)",
+        """
+        CREATE TABLE IF NOT EXISTS attempt_rollup (
+            day TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            scored INTEGER NOT NULL,
+            score_sum REAL NOT NULL,
+            PRIMARY KEY (day, kind, status)
+        )
+        """,
+    ]
+    COLUMNS = ("candidate_id", "ts", "kind", "status", "combined_status",
+               "ocr_value", "db_value", "face_score", "image_path", "detail")
+    INSERT = f"INSERT INTO attempts ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+    SELECT_HISTORY = """
+        SELECT * FROM attempts WHERE candidate_id = ?
+        ORDER BY ts DESC LIMIT ?
+    """
+    SELECT_SINCE = "SELECT * FROM attempts WHERE ts >= ? ORDER BY ts LIMIT ?"
+    # ID checks by how they ended: QR vs OCR, and which OCR stage read the number
+    SELECT_OCR_STAGES = """
+        SELECT COALESCE(json_extract(detail, '$.method'), 'ocr') AS method,
+               json_extract(detail, '$.ocr_stage') AS stage,
+               COALESCE(status, '') AS status,
+               COUNT(*) AS attempts,
+               AVG(COALESCE(json_array_length(detail, '$.ocr_stages'), 0)) AS avg_stages_tried
+        FROM attempts WHERE kind = 'ocr' AND ts >= ?
+        GROUP BY 1, 2, 3 ORDER BY attempts DESC
+    """
+
+    # archive(): one chunk of old rows per short transaction, so kiosk writes keep flowing
+    SELECT_OLDEST = "SELECT MIN(ts) FROM attempts"
+    PICK_CHUNK = "INSERT INTO temp.archive_ids SELECT id FROM attempts WHERE ts < ? ORDER BY ts LIMIT ?"
+    ROLL_UP_CHUNK = """
+        INSERT INTO attempt_rollup (day, kind, status, attempts, scored, score_sum)
+        SELECT substr(ts, 1, 10), kind, COALESCE(status, ''),
+               COUNT(*), COUNT(face_score), COALESCE(SUM(face_score), 0)
+        FROM attempts WHERE id IN temp.archive_ids
+        GROUP BY 1, 2, 3
+        ON CONFLICT(day, kind, status) DO UPDATE SET
+            attempts = attempts + excluded.attempts,
+            scored = scored + excluded.scored,
+            score_sum = score_sum + excluded.score_sum
+    """
+    # rows already in the archive (copied, then a crash before the delete committed) are
+    # skipped; any other id clash is an IntegrityError, so nothing is deleted uncopied
+    COPY_CHUNK = """
+        INSERT INTO arch.attempts
+        SELECT * FROM attempts l
+        WHERE l.id IN temp.archive_ids AND NOT EXISTS (
+            SELECT 1 FROM arch.attempts a
+            WHERE a.id = l.id AND a.ts = l.ts AND a.candidate_id = l.candidate_id AND a.kind = l.kind
+        )
+    """
+    COUNT_COPIED = """
+        SELECT COUNT(*) FROM arch.attempts a JOIN attempts l ON l.id = a.id
+        WHERE l.id IN temp.archive_ids AND a.ts = l.ts AND a.candidate_id = l.candidate_id
+    """
+    DELETE_CHUNK = "DELETE FROM attempts WHERE id IN temp.archive_ids"
+
+    def __init__(self, store: VerificationStore):
+        """Shares the VerificationStore's read pool and its writer thread."""
+        self.pool = store.pool
+        self.writer = store.writer
+        with self.pool.connection() as conn:
+            for sql in self.SCHEMA:
+                conn.execute(sql)
+
+    @staticmethod
+    def _now():
+        # fixed width, so stored timestamps sort and compare as plain strings
+        return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+    def log(self, cid, kind, status=None, combined_status=None, ocr_value=None,
+            db_value=None, face_score=None, image_path=None, detail=None) -> Future:
+        """
+        Queue one attempt (kind: "ocr" / "face" / "status"); detail is an optional
+        dict stored as JSON. Fire and forget: the Future only matters to callers
+        that want to wait for the commit.
+        """
+        row = (cid, self._now(), kind, status, combined_status, ocr_value, db_value,
+               face_score, None if image_path is None else str(image_path),
+               None if detail is None else json.dumps(detail))
+        return self.writer.submit(self.INSERT, row)
+
+    def history(self, cid: int, limit=100):
+        """Newest first."""
+        with self.pool.connection() as conn:
+            return [self._row(r) for r in conn.execute(self.SELECT_HISTORY, (cid, limit))]
+
+    def since(self, ts, limit=10000):
+        """Every attempt at or after ts (UTC ISO string or aware datetime), oldest first."""
+        if isinstance(ts, datetime):
+            ts = ts.astimezone(timezone.utc).isoformat(timespec="microseconds")
+        with self.pool.connection() as conn:
+            return [self._row(r) for r in conn.execute(self.SELECT_SINCE, (ts, limit))]
+
+    def recent(self, minutes=10, limit=10000):
+        return self.since(datetime.now(timezone.utc) - timedelta(minutes=minutes), limit)
+
+    def ocr_stages(self, hours=24):
+        """
+        ID-check counts since `hours` ago per (method, OCR stage, status), from
+        the attempt detail: the QR share and the stage order the OCR cascade
+        should use come from here.
+        """
+        ts = (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat(timespec="microseconds")
+        with self.pool.connection() as conn:
+            return [dict(r) for r in conn.execute(self.SELECT_OCR_STAGES, (ts,))]
+
+    @staticmethod
+    def _row(r):
+        row = dict(r)
+        if row.get("detail"):
+            row["detail"] = json.loads(row["detail"])
+        return row
+
+    def archive(self, before, archive_dir, chunk=20000) -> dict:
+        """
+        Move every attempt older than `before` (UTC ISO string / aware datetime)
+        into archive_dir/attempts-YYYY-MM.db, adding it to attempt_rollup in the
+        same transaction as its delete. Safe to re-run after a crash: a chunk
+        copied but not deleted is recognised (same id, ts, candidate) and not
+        copied twice. A chunk is only deleted once every one of its rows is in
+        the archive file. Returns {month: rows moved}.
+        """
+        if isinstance(before, datetime):
+            before = before.astimezone(timezone.utc).isoformat(timespec="microseconds")
+        archive_dir = Path(archive_dir)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+
+        conn = sqlite3.connect(self.pool.db_path, timeout=self.pool.timeout, isolation_level=None)
+        moved = {}
+        try:
+            for name, value in WAL_PRAGMAS.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (id INTEGER PRIMARY KEY)")
+            while True:
+                oldest = conn.execute(self.SELECT_OLDEST).fetchone()[0]
+                if oldest is None or oldest >= before:
+                    break
+                # one archive file per calendar month of the oldest remaining row
+                month = oldest[:7]
+                year, mon = int(month[:4]), int(month[5:7])
+                next_month = f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+                end = min(before, next_month)
+                conn.execute("ATTACH DATABASE ? AS arch", (str(archive_dir / f"attempts-{month}.db"),))
+                try:
+                    conn.execute(self.TABLE.format(schema="arch."))
+                    while True:
+                        conn.execute("BEGIN IMMEDIATE")
+                        try:
+                            conn.execute("DELETE FROM temp.archive_ids")
+                            n = conn.execute(self.PICK_CHUNK, (end, chunk)).rowcount
+                            if n:
+                                conn.execute(self.ROLL_UP_CHUNK)
+                                conn.execute(self.COPY_CHUNK)
+                                copied = conn.execute(self.COUNT_COPIED).fetchone()[0]
+                                if copied != n:
+                                    raise sqlite3.IntegrityError(
+                                        f"only {copied} of {n} attempts reached {month} archive")
+                                conn.execute(self.DELETE_CHUNK)
+                            conn.execute("COMMIT")
+                        except BaseException:
+                            conn.execute("ROLLBACK")
+                            raise
+                        moved[month] = moved.get(month, 0) + n
+                        if n < chunk:
+                            break
+                finally:
+                    conn.execute("DETACH DATABASE arch")
+        finally:
+            conn.close()
+        return moved
+
+
+# =========================
+# /report
+# =========================
+class ReportStore:
+    """
+    Reads through a users.db pool with verify.db ATTACHed as "v". Only one page
+    of rows ever leaves SQLite; counts and percentages are aggregated in SQL.
+    """
+
+    # sort key -> SQL expression (whitelisted: these are spliced into ORDER BY)
+    SORTS = {
+        "user_id": "u.user_id",
+        "id_type": "u.id_type",
+        "status": "status",
+        "face_score": "v.face_score",
+        "last_update": "v.last_update",
+    }
+
+    INDEXES = [
+        "CREATE INDEX IF NOT EXISTS idx_users_id_type ON users(id_type, user_id)",
+        "CREATE INDEX IF NOT EXISTS v.idx_verifications_status ON verifications(status)",
+        "CREATE INDEX IF NOT EXISTS v.idx_verifications_last_update ON verifications(last_update)",
+        "CREATE INDEX IF NOT EXISTS v.idx_verifications_face_score ON verifications(face_score)",
+    ]
+
+    FROM = """
+        FROM users u
+        LEFT JOIN v.verifications v ON v.candidate_id = u.user_id
+    """
+
+    # ISO timestamps as "YYYY-MM-DD HH:MM:SS", "+ UTC" when the stored value had an offset
+    LAST_UPDATE = """
+        CASE
+            WHEN v.last_update IS NULL THEN NULL
+            WHEN strftime('%Y-%m-%d %H:%M:%S', v.last_update) IS NULL THEN v.last_update
+            WHEN v.last_update LIKE '%+__:__' OR v.last_update LIKE '%-__:__'
+                 OR v.last_update LIKE '%Z'
+                THEN strftime('%Y-%m-%d %H:%M:%S', v.last_update) || ' UTC'
+            ELSE strftime('%Y-%m-%d %H:%M:%S', v.last_update)
+        END
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        if "v" not in pool.attach:
+            raise ValueError("ReportStore needs verify.db attached as 'v'")
+        self.pool = pool
+
+    def ensure_indexes(self):
+        with self.pool.connection() as conn:
+            for sql in self.INDEXES:
+                conn.execute(sql)
+
+    def _where(self, status, since=None, until=None, first_id=None, last_id=None):
+        """
+        since / until: ISO timestamps (UTC, as stored) bounding v.last_update, until exclusive.
+        first_id / last_id: inclusive candidate id range.
+        """
+        conds, params = [], []
+        if status == "PENDING":
+            conds.append("(v.status IS NULL OR v.status = 'PENDING')")
+        elif status:
+            conds.append("v.status = ?")
+            params.append(status)
+        if since:
+            conds.append("v.last_update >= ?")
+            params.append(since)
+        if until:
+            conds.append("v.last_update < ?")
+            params.append(until)
+        if first_id is not None:
+            conds.append("u.user_id >= ?")
+            params.append(first_id)
+        if last_id is not None:
+            conds.append("u.user_id <= ?")
+            params.append(last_id)
+        if not conds:
+            return "", ()
+        return "WHERE " + " AND ".join(conds), tuple(params)
+
+    def page(self, page=1, per_page=50, sort="user_id", order="asc", status=None) -> dict:
+        if sort not in self.SORTS:
+            raise ValueError(f"Unsupported sort column: {sort}")
+        direction = "DESC" if str(order).lower() == "desc" else "ASC"
+        per_page = max(1, min(int(per_page), 500))
+        where, params = self._where(status)
+
+        with self.pool.connection() as conn:
+            total = self._count(conn, status)
+            pages = max(1, -(-total // per_page))
+            page = max(1, min(int(page), pages))
+
+            rows = conn.execute(f"""
+                SELECT u.user_id, u.id_type, u.id_value,
+                       COALESCE(v.status, 'PENDING') AS status,
+                       v.ocr_value,
+                       ROUND(v.face_score, 3) AS face_score,
+                       {self.LAST_UPDATE} AS last_update
+                {self.FROM}
+                {where}
+                ORDER BY {self.SORTS[sort]} {direction}, u.user_id {direction}
+                LIMIT ? OFFSET ?
+            """, params + (per_page, (page - 1) * per_page)).fetchall()
+
+        return {
+            "rows": [dict(r) for r in rows],
+            "total": total,
+            "page": page,
+            "pages": pages,
+            "per_page": per_page,
+            "sort": sort,
+            "order": direction.lower(),
+            "status": status,
+        }
+
+    # counts are driven from the small side: COUNT over users' primary key, or
+    # the verifications status index joined back to users (never the full LEFT JOIN)
+    COUNT_USERS = "SELECT COUNT(*) FROM users"
+    COUNT_BY_STATUS = """
+        SELECT v.status, COUNT(*)
+        FROM v.verifications v
+        JOIN users u ON u.user_id = v.candidate_id
+        WHERE v.status IN ({})
+        GROUP BY v.status
+    """
+    COUNT_DECIDED = """
+        SELECT COUNT(*)
+        FROM v.verifications v
+        JOIN users u ON u.user_id = v.candidate_id
+        WHERE v.status IS NOT NULL AND v.status != 'PENDING'
+    """
+
+    def _status_counts(self, conn, statuses):
+        sql = self.COUNT_BY_STATUS.format(", ".join("?" * len(statuses)))
+        counts = dict(conn.execute(sql, tuple(statuses)).fetchall())
+        return [counts.get(s, 0) for s in statuses]
+
+    def _count(self, conn, status):
+        if not status:
+            return conn.execute(self.COUNT_USERS).fetchone()[0]
+        if status == "PENDING":
+            total = conn.execute(self.COUNT_USERS).fetchone()[0]
+            return total - conn.execute(self.COUNT_DECIDED).fetchone()[0]
+        return self._status_counts(conn, [status])[0]
+
+    EXPORT_COLUMNS = [
+        "candidate_id", "name", "id_type", "id_value", "status",
+        "ocr_value", "db_value", "face_score",
+        "ocr_path", "face_path", "face_attempt_path", "last_update",
+    ]
+
+    def iter_export(self, status=None, since=None, until=None, batch_size=1000):
+        """
+        Yield every matching row as a tuple in EXPORT_COLUMNS order, candidate id
+        order, batch_size rows at a time from a server-side cursor.
+        """
+        where, params = self._where(status, since, until)
+        for row in self._stream(f"""
+            SELECT u.user_id, u.name, u.id_type, u.id_value,
+                   COALESCE(v.status, 'PENDING'),
+                   v.ocr_value, v.db_value, v.face_score,
+                   v.ocr_path, v.face_path, v.face_attempt_path, v.last_update
+            {self.FROM}
+            {where}
+            ORDER BY u.user_id
+        """, params, batch_size):
+            yield tuple(row)
+
+    def iter_users(self, status=None, first_id=None, last_id=None, batch_size=1000):
+        """Full users rows (as UserStore.get_user returns them) in candidate id order, streamed."""
+        where, params = self._where(status, first_id=first_id, last_id=last_id)
+        for row in self._stream(f"SELECT u.* {self.FROM} {where} ORDER BY u.user_id",
+                                params, batch_size):
+            yield dict(row)
+
+    def _stream(self, sql, params, batch_size):
+        # its own connection, so a long export never holds a pooled one;
+        # in WAL mode it doesn't block writers either
+        conn = self.pool._open()
+        try:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
@@ -0,0 +1,371 @@
+"""
+BULK CANDIDATE ENROLLMENT
+-------------------------
+Imports a board roster (CSV or JSON Lines) plus its photos (a directory or a
+zip) in one streaming pass, instead of one /register form POST per candidate.
+
+Roster columns (header names are case-insensitive):
+    name, id_type, id_value, face_image   required
+    gmail (or email), id_image             optional
+face_image / id_image are paths inside the image directory / zip; a bare file
+name also matches a file in any sub-folder of the zip.
+
+Pipeline, one chunk of roster rows at a time (memory stays bounded):
+1. validate       : required fields, known id_type, id_value format,
+                    duplicates within the roster and against users.db
+2. precompute     : in a process pool, reference embedding (+ frame quality
+                    gate) of the face photo and a quality check of the ID
+                    photo (decodable, text large and sharp enough for OCR).
+                    The next chunk is computed while this one is committed.
+3. commit         : users rows under freshly allocated consecutive ids,
+                    user_faces embeddings and the photos on disk, in ONE
+                    users.db transaction per chunk
+Every rejected row is reported with a machine-readable reason.
+
+Running web workers pick the new candidates up on their next stats resync,
+and add their faces to the in-memory 1:N face index before its next duplicate
+search (scripts/dedupe_faces.py audits the whole roster for duplicates).
+"""
+
+import abc
+import csv
+import json
+import os
+import re
+import time
+import zipfile
+from multiprocessing import Pool
+from pathlib import Path, PurePosixPath
+
+import cv2
+
+from datastore import ConnectionPool, UserStore
+from face_store import ReferenceEmbeddingStore, bytes_digest, encode_embedding
+from image_io import decode_image_max
+from ocr_preprocess import DEFAULT_MAX_SIDE, normalize_resolution
+
+
+# same patterns IDVerifier looks for (Untitled_1.IndianIDFormats), without pulling in OCR
+ID_PATTERNS = {
+    "aadhaar": r"[2-9][0-9]{11}",
+    "aadhar": r"[2-9][0-9]{11}",
+    "pan": r"[A-Z]{5}[0-9]{4}[A-Z]",
+    "passport": r"[A-Z][0-9]{7}",
+    "voter": r"[A-Z]{3}[0-9]{7}",
+    "hallticket": r"[0-9]{10}",
+}
+
+REPORT_COLUMNS = ["row", "name", "id_type", "id_value", "reason", "detail"]
+ENROLLED_COLUMNS = ["row", "candidate_id", "name", "id_type", "id_value"]
+
+
+class EnrollmentRejected(ValueError):
+    def __init__(self, reason: str, message: str = ""):
+        super().__init__(message or reason)
+        self.reason = reason
+
+
+# =========================
+# roster + images
+# =========================
+def iter_roster(path):
+    """Yield (row number, {lower-case column: stripped value}) from a .csv or .jsonl roster."""
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson", ".json"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for n, row in enumerate(rows, start=1):
+            yield n, {str(k).strip().lower(): ("" if v is None else str(v).strip())
+                      for k, v in row.items() if k is not None}
+
+
+class ImageSource(abc.ABC):
+    """Photos referenced by the roster, read from a directory or a zip archive."""
+
+    @staticmethod
+    def open(path):
+        path = Path(path)
+        if path.is_dir():
+            return DirectoryImages(path)
+        if zipfile.is_zipfile(path):
+            return ZipImages(path)
+        raise ValueError(f"Image source must be a directory or a zip file: {path}")
+
+    @abc.abstractmethod
+    def read(self, name: str) -> bytes:
+        """Bytes of one roster photo, None if it is not in the source."""
+
+    def close(self):
+        pass
+
+
+class DirectoryImages(ImageSource):
+    def __init__(self, root):
+        self.root = Path(root).resolve()
+
+    def read(self, name):
+        path = (self.root / name).resolve()
+        # roster paths must not escape the image directory
+        if self.root not in path.parents or not path.is_file():
+            return None
+        return path.read_bytes()
+
+
+class ZipImages(ImageSource):
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path)
+        self.names = {}
+        for info in self.zip.infolist():
+            if info.is_dir():
+                continue
+            self.names[info.filename.lower()] = info.filename
+            # exports often nest everything under one folder: allow bare file names
+            self.names.setdefault(PurePosixPath(info.filename).name.lower(), info.filename)
+
+    def read(self, name):
+        member = self.names.get(name.replace("\\", "/").lstrip("/").lower())
+        return None if member is None else self.zip.read(member)
+
+    def close(self):
+        self.zip.close()
+
+
+def clean_record(row: dict) -> dict:
+    """Validated, normalised roster row; raises EnrollmentRejected."""
+    missing = [k for k in ("name", "id_type", "id_value", "face_image") if not row.get(k)]
+    if missing:
+        raise EnrollmentRejected("missing_field", ", ".join(missing))
+    id_type = row["id_type"].lower()
+    if id_type not in ID_PATTERNS:
+        raise EnrollmentRejected("bad_id_type", row["id_type"])
+    # same normalisation IDVerifier compares with
+    id_value = row["id_value"].upper().replace(" ", "")
+    if not re.fullmatch(ID_PATTERNS[id_type], id_value):
+        raise EnrollmentRejected("bad_id_value", f"{row['id_value']} is not a valid {id_type} number")
+    return {
+        "name": row["name"],
+        "gmail": row.get("gmail") or row.get("email") or "",
+        "id_type": id_type,
+        "id_value": id_value,
+        "face_image": row["face_image"],
+        "id_image": row.get("id_image") or None,
+    }
+
+
+# =========================
+# worker side: precompute
+# =========================
+_face = None
+_check_quality = True
+_id_checks = {}
+
+
+def _init_worker(check_quality, min_id_dpi, min_id_sharpness):
+    """Runs once per pool process: load the face model this worker keeps for the run."""
+    global _face, _check_quality, _id_checks
+    # one OpenCV thread per process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+    _check_quality = check_quality
+    _id_checks = {"min_dpi": min_id_dpi, "min_sharpness": min_id_sharpness}
+
+    sock = os.environ.get("FACE_SERVER_SOCKET")
+    if sock:
+        from face_server import FaceEngineClient
+        _face = FaceEngineClient(sock)
+    else:
+        from Untitled_2 import InsightFaceEngine
+        from frame_quality import FrameQualityGate
+        _face = InsightFaceEngine(quality_gate=FrameQualityGate() if check_quality else None)
+
+
+def assess_id_image(data: bytes, min_dpi=150, min_sharpness=30.0) -> dict:
+    """
+    Cheap pre-exam check that an ID photo will OCR: decodes, card text found
+    and printed at >= min_dpi, not blurred. Raises EnrollmentRejected.
+    """
+    # decoded the way OCREngine decodes it, so the measured DPI is what OCR will see
+    try:
+        gray = decode_image_max(data, DEFAULT_MAX_SIDE, grayscale=True)
+    except ValueError:
+        raise EnrollmentRejected("id_undecodable", "ID image could not be decoded")
+    gray, info = normalize_resolution(gray)
+    # Laplacian variance, as in frame_quality; meanStdDev skips numpy's float64 pass
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+    metrics = {
+        "id_size": info["src_size"],
+        "id_dpi": info["effective_dpi"],
+        "id_sharpness": round(float(std[0, 0]) ** 2, 1),
+    }
+    if info["effective_dpi"] is None:
+        raise EnrollmentRejected("id_no_text", "no text lines found on the ID image")
+    if info["effective_dpi"] < min_dpi:
+        raise EnrollmentRejected("id_low_resolution",
+                                 f"card text at ~{info['effective_dpi']} dpi, need {min_dpi}")
+    if metrics["id_sharpness"] < min_sharpness:
+        raise EnrollmentRejected("id_blurry", f"sharpness {metrics['id_sharpness']}")
+    return metrics
+
+
+def _precompute(task):
+    """(row, face bytes, id bytes) -> (row, result); result has "embedding" or "reason"."""
+    row, face_bytes, id_bytes = task
+    t0 = time.perf_counter()
+    res = {}
+    try:
+        if id_bytes is not None:
+            res["id_quality"] = assess_id_image(id_bytes, **_id_checks)
+        emb = _face.extract_embedding_from_bytes(face_bytes, check_quality=_check_quality)
+        res["embedding"] = encode_embedding(emb)
+        res["model_tag"] = _face.model_tag
+    except EnrollmentRejected as e:
+        res = {"reason": e.reason, "detail": str(e)}
+    except ValueError as e:
+        # FrameQualityError carries a reason (no_face, blurry, ...); others are decode errors
+        res = {"reason": f"face_{getattr(e, 'reason', 'invalid')}", "detail": str(e)}
+    except Exception as e:
+        res = {"reason": "error", "detail": f"{type(e).__name__}: {e}"}
+    res["seconds"] = time.perf_counter() - t0
+    return row, res
+
+
+# =========================
+# parent side: validate, commit, report
+# =========================
+class BulkEnroller:
+    INSERT_FACE = """
+        INSERT INTO user_faces (user_id, image_path, embedding, model_tag, image_sha256)
+        VALUES (?, ?, ?, ?, ?)
+    """
+
+    def __init__(self, users_db, upload_dir, workers=None, chunk_size=500,
+                 check_quality=True, min_id_dpi=150, min_id_sharpness=30.0):
+        self.pool = ConnectionPool(users_db, size=2)
+        self.users = UserStore(self.pool)
+        self.users.ensure_indexes()
+        # creates / migrates user_faces; the embeddings themselves come from the workers
+        ReferenceEmbeddingStore(self.pool, face_engine=None)
+        self.face_dir = Path(upload_dir) / "facever"
+        self.ocr_dir = Path(upload_dir) / "ocr"
+        self.face_dir.mkdir(parents=True, exist_ok=True)
+        self.ocr_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.worker_args = (check_quality, min_id_dpi, min_id_sharpness)
+
+    def run(self, roster, images: ImageSource, rejected_out, enrolled_out=None, progress=None) -> dict:
+        """
+        rejected_out / enrolled_out: text files the CSV reports are written to.
+        progress: optional object with add(result_dict), called once per roster row.
+        Returns {"enrolled": n, "rejected": n}.
+        """
+        self._rejected = csv.writer(rejected_out)
+        self._rejected.writerow(REPORT_COLUMNS)
+        self._enrolled = csv.writer(enrolled_out) if enrolled_out else None
+        if self._enrolled:
+            self._enrolled.writerow(ENROLLED_COLUMNS)
+        self._progress = progress
+        self.counts = {"enrolled": 0, "rejected": 0}
+        seen = set()
+
+        with Pool(self.workers, initializer=_init_worker, initargs=self.worker_args) as pool:
+            pending = None
+            for chunk in self._chunks(roster):
+                records, tasks = self._prepare(chunk, images, seen)
+                # keep the workers busy on this chunk while the previous one commits
+                job = pool.map_async(_precompute, tasks, chunksize=max(1, len(tasks) // (4 * self.workers)))
+                if pending is not None:
+                    self._commit(*pending)
+                pending = (records, job)
+            if pending is not None:
+                self._commit(*pending)
+        self.pool.close()
+        return self.counts
+
+    def _chunks(self, roster):
+        chunk = []
+        for item in roster:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _reject(self, n, row, reason, detail=""):
+        self._rejected.writerow([n, row.get("name", ""), row.get("id_type", ""),
+                                 row.get("id_value", ""), reason, detail])
+        self.counts["rejected"] += 1
+        if self._progress:
+            self._progress.add({"status": "REJECTED"})
+
+    def _prepare(self, chunk, images, seen):
+        """Validate one chunk and read its photos: ({row: record}, precompute tasks)."""
+        valid = []
+        for n, row in chunk:
+            try:
+                valid.append((n, clean_record(row)))
+            except EnrollmentRejected as e:
+                self._reject(n, row, e.reason, str(e) if str(e) != e.reason else "")
+
+        enrolled = self.users.find_enrolled({rec["id_value"] for _, rec in valid})
+        records, tasks = {}, []
+        for n, rec in valid:
+            # the ID number alone identifies a person, whatever id_type spelling a row used
+            key = rec["id_value"]
+            if key in enrolled:
+                self._reject(n, rec, "already_enrolled")
+                continue
+            if key in seen:
+                self._reject(n, rec, "duplicate_in_roster")
+                continue
+            face_bytes = images.read(rec["face_image"])
+            if not face_bytes:
+                self._reject(n, rec, "face_image_missing", rec["face_image"])
+                continue
+            id_bytes = None
+            if rec["id_image"]:
+                id_bytes = images.read(rec["id_image"])
+                if not id_bytes:
+                    self._reject(n, rec, "id_image_missing", rec["id_image"])
+                    continue
+            seen.add(key)
+            rec["face_bytes"], rec["id_bytes"] = face_bytes, id_bytes
+            records[n] = rec
+            tasks.append((n, face_bytes, id_bytes))
+        return records, tasks
+
+    def _commit(self, records, job):
+        accepted = []
+        for n, res in job.get():
+            rec = records[n]
+            if "reason" in res:
+                self._reject(n, rec, res["reason"], res.get("detail", ""))
+            else:
+                accepted.append((n, rec, res))
+        if not accepted:
+            return
+
+        def write_faces_and_photos(conn, ids):
+            faces = []
+            for cid, (_, rec, res) in zip(ids, accepted):
+                face_path = self.face_dir / f"{cid}.jpg"
+                face_path.write_bytes(rec["face_bytes"])
+                if rec["id_bytes"] is not None:
+                    (self.ocr_dir / f"{cid}.jpg").write_bytes(rec["id_bytes"])
+                faces.append((cid, str(face_path), res["embedding"], res["model_tag"],
+                              bytes_digest(rec["face_bytes"])))
+            conn.executemany(self.INSERT_FACE, faces)
+
+        ids = self.users.create_users(
+            [(rec["id_type"], rec["id_value"], rec["name"], rec["gmail"]) for _, rec, _ in accepted],
+            extra=write_faces_and_photos,
+        )
+        for cid, (n, rec, res) in zip(ids, accepted):
+            if self._enrolled:
+                self._enrolled.writerow([n, cid, rec["name"], rec["id_type"], rec["id_value"]])
+            if self._progress:
+                self._progress.add({"status": "ENROLLED", "seconds": res["seconds"]})
+        self.counts["enrolled"] += len(ids)
+        records.clear()
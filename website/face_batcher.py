@@ -0,0 +1,104 @@
+"""
+MICRO-BATCHING FACE ENGINE
+--------------------------
+Sits in front of the shared InsightFaceEngine.
+
+- Each Flask handler runs detection + alignment on its own image (in its own thread)
+- The aligned 112x112 crops are queued to ONE background worker
+- The worker waits up to `max_wait_ms` for more crops (or until `max_batch_size`),
+  runs a single batched ArcFace pass and hands each caller its own embedding
+
+Drop-in for InsightFaceEngine wherever only extract_embedding / compare are used.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from result_cache import decode_array, embedding_key, encode_array
+
+
+class BatchingFaceEngine:
+    def __init__(self, engine, max_batch_size=16, max_wait_ms=5.0, cache=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+
+        self.engine = engine
+        self.model_tag = engine.model_tag
+        self.cache_tag = engine.cache_tag
+        # optional result_cache.ResultCache for *_from_bytes embeddings
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._pending = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run, name="face-batcher", daemon=True
+        )
+        self._worker.start()
+
+    # -------- caller side --------
+    def submit(self, crop) -> Future:
+        fut = Future()
+        self._pending.put((crop, fut))
+        return fut
+
+    def extract_embedding(self, image_path: str):
+        try:
+            with open(image_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            raise ValueError("Invalid image path")
+        return self.extract_embedding_from_image(self.engine.decode(data))
+
+    def extract_embedding_from_bytes(self, data: bytes, check_quality=False):
+        def compute():
+            return self.extract_embedding_from_image(self.engine.decode(data), check_quality)
+
+        if self.cache is None:
+            return compute()
+        return self.cache.get_or_compute(
+            embedding_key(self.cache_tag, data, check_quality), compute,
+            encode=encode_array, decode=decode_array,
+        )
+
+    def extract_embedding_from_image(self, img, check_quality=False):
+        # detection (+ quality gate) stays in the caller's thread; only ArcFace is batched
+        crop = self.engine.detect_and_align(img, check_quality)
+        return self.submit(crop).result()
+
+    def assess_frame_from_bytes(self, data: bytes) -> dict:
+        return self.engine.assess_frame_from_bytes(data)
+
+    def compare(self, emb1, emb2, threshold=0.4):
+        return self.engine.compare(emb1, emb2, threshold=threshold)
+
+    # -------- worker side --------
+    def _collect(self):
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            crops = [crop for crop, _ in batch]
+            try:
+                feats = self.engine.embed_aligned(crops)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+
+            for (_, fut), feat in zip(batch, feats):
+                fut.set_result(feat)
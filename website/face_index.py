@@ -0,0 +1,289 @@
+"""
+1:N FACE SEARCH INDEX
+---------------------
+All enrolled reference embeddings live in ONE contiguous, L2-normalized matrix,
+so "who else does this face look like?" is a single matrix-vector product
+instead of N calls to InsightFaceEngine.compare.
+
+- Flat scan   : exact, float32 (BLAS) or float16 (half the RAM, scanned in blocks)
+- IVF (opt.)  : spherical k-means partitions; a query scans only `nprobe` lists
+
+Used by /register (duplicate warning) and scripts/dedupe_faces.py (bulk audit).
+Safe to share between request threads: add / search hold the index lock.
+An index built by from_db() remembers the last user_faces.face_id it has seen;
+sync() adds every face stored since (other web workers, bulk enrolment).
+"""
+
+import threading
+
+import numpy as np
+
+from face_store import iter_embeddings, iter_faces_after, max_face_id
+
+
+# rows converted to float32 per block when scanning a float16 matrix
+SCAN_BLOCK = 65536
+
+
+def _normalize(mat):
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def _top_k(scores, k):
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+class FaceIndex:
+    def __init__(self, dim=512, dtype=np.float32, capacity=1024):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._matrix = np.empty((capacity, dim), dtype=self.dtype)
+        self._size = 0
+        self._row_of = {}          # user_id -> row
+
+        # IVF state (None until build_ivf is called)
+        self._centroids = None
+        self._lists = None
+        self._list_of = {}         # row -> IVF list
+        # _grow swaps the arrays and add writes rows in place: one reader / writer at a time
+        self._lock = threading.Lock()
+
+        # set by from_db(): where sync() looks for newer faces
+        self._source = None
+        self._synced_face_id = 0
+
+    # -------- building --------
+    @classmethod
+    def from_db(cls, db_path, model_tag=None, dtype=np.float32):
+        # read the high-water mark first: a face stored during the load is added
+        # again by the next sync(), which is harmless (add replaces)
+        synced = max_face_id(db_path)
+        ids, embs = [], []
+        for user_id, emb in iter_embeddings(db_path, model_tag):
+            ids.append(user_id)
+            embs.append(emb)
+        if not ids:
+            index = cls(dtype=dtype)
+        else:
+            index = cls(dim=embs[0].shape[0], dtype=dtype, capacity=len(ids))
+            index.add_many(ids, np.stack(embs))
+        index._source = (db_path, model_tag)
+        index._synced_face_id = synced
+        return index
+
+    def sync(self) -> int:
+        """
+        Add the faces stored in the database since the last sync (one primary
+        key range scan); returns how many. A no-op unless built by from_db().
+        """
+        if self._source is None:
+            return 0
+        db_path, model_tag = self._source
+        added = 0
+        for face_id, user_id, emb in iter_faces_after(db_path, self._synced_face_id, model_tag):
+            with self._lock:
+                if emb is not None:
+                    self._add(user_id, emb)
+                    added += 1
+                self._synced_face_id = max(self._synced_face_id, face_id)
+        return added
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, need):
+        cap = self._matrix.shape[0]
+        if need <= cap:
+            return
+        while cap < need:
+            cap *= 2
+        ids = np.empty(cap, dtype=np.int64)
+        mat = np.empty((cap, self.dim), dtype=self.dtype)
+        ids[:self._size] = self._ids[:self._size]
+        mat[:self._size] = self._matrix[:self._size]
+        self._ids, self._matrix = ids, mat
+
+    def add(self, user_id: int, emb):
+        """Insert or replace the embedding for user_id."""
+        with self._lock:
+            self._add(user_id, emb)
+
+    def _add(self, user_id, emb):
+        vec = _normalize(emb).astype(self.dtype)
+        row = self._row_of.get(user_id)
+        if row is None:
+            self._grow(self._size + 1)
+            row = self._size
+            self._size += 1
+            self._row_of[user_id] = row
+            self._ids[row] = user_id
+        self._matrix[row] = vec
+
+        if self._centroids is not None:
+            self._assign_row(row)
+
+    def add_many(self, user_ids, embs):
+        """Bulk insert of users not yet in the index (one normalize + copy)."""
+        user_ids = list(user_ids)
+        with self._lock:
+            if any(uid in self._row_of for uid in user_ids):
+                for uid, emb in zip(user_ids, embs):
+                    self._add(uid, emb)
+            else:
+                self._append(user_ids, embs)
+
+    def _append(self, user_ids, embs):
+        start = self._size
+        self._grow(start + len(user_ids))
+        self._ids[start:start + len(user_ids)] = user_ids
+        self._matrix[start:start + len(user_ids)] = _normalize(embs).astype(self.dtype)
+        for offset, uid in enumerate(user_ids):
+            self._row_of[uid] = start + offset
+        self._size += len(user_ids)
+
+        if self._centroids is not None:
+            for row in range(start, self._size):
+                self._assign_row(row)
+
+    # -------- flat scan --------
+    def _scan(self, q, rows=None):
+        """Cosine scores of q against all rows (or a subset of row numbers)."""
+        mat = self._matrix[:self._size] if rows is None else self._matrix[rows]
+        if self.dtype == np.float32:
+            return mat @ q
+
+        out = np.empty(mat.shape[0], dtype=np.float32)
+        for start in range(0, mat.shape[0], SCAN_BLOCK):
+            block = mat[start:start + SCAN_BLOCK].astype(np.float32)
+            out[start:start + SCAN_BLOCK] = block @ q
+        return out
+
+    def search(self, emb, k=5, threshold=None, exclude=None, nprobe=None):
+        """
+        Best matches for one embedding -> [(user_id, similarity), ...]
+        exclude : user_id to skip (the candidate being registered)
+        nprobe  : IVF lists to scan; ignored until build_ivf() has run
+        """
+        with self._lock:
+            return self._search(emb, k, threshold, exclude, nprobe)
+
+    def _search(self, emb, k, threshold, exclude, nprobe):
+        if self._size == 0:
+            return []
+        q = _normalize(emb)
+
+        if self._centroids is not None and nprobe:
+            rows = self._probe_rows(q, nprobe)
+            scores = self._scan(q, rows)
+        else:
+            rows = None
+            scores = self._scan(q)
+
+        extra = 1 if exclude is not None else 0
+        results = []
+        for i in _top_k(scores, k + extra):
+            row = i if rows is None else rows[i]
+            user_id = int(self._ids[row])
+            score = float(scores[i])
+            if user_id == exclude:
+                continue
+            if threshold is not None and score < threshold:
+                break
+            results.append((user_id, score))
+        return results[:k]
+
+    # -------- IVF partitions --------
+    def build_ivf(self, nlist=1024, iters=10, sample=100000, seed=0):
+        """Spherical k-means over (a sample of) the index; lists hold row numbers."""
+        with self._lock:
+            self._build_ivf(nlist, iters, sample, seed)
+
+    def _build_ivf(self, nlist, iters, sample, seed):
+        n = self._size
+        nlist = max(1, min(nlist, n))
+        rng = np.random.default_rng(seed)
+
+        train_rows = rng.choice(n, size=min(sample, n), replace=False)
+        train = self._matrix[train_rows].astype(np.float32)
+        centroids = train[rng.choice(train.shape[0], size=nlist, replace=False)]
+
+        for _ in range(iters):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = train[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+
+        mat = self._matrix[:n]
+        assign = np.empty(n, dtype=np.int64)
+        for start in range(0, n, SCAN_BLOCK):
+            block = mat[start:start + SCAN_BLOCK].astype(np.float32)
+            assign[start:start + SCAN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+
+        self._centroids = centroids
+        self._lists = [np.flatnonzero(assign == c) for c in range(nlist)]
+        self._list_of = dict(enumerate(assign.tolist()))
+
+    def _assign_row(self, row):
+        vec = self._matrix[row].astype(np.float32)
+        c = int(np.argmax(self._centroids @ vec))
+        prev = self._list_of.get(row)
+        if prev == c:
+            return
+        if prev is not None:
+            self._lists[prev] = self._lists[prev][self._lists[prev] != row]
+        self._lists[c] = np.append(self._lists[c], row)
+        self._list_of[row] = c
+
+    def _probe_rows(self, q, nprobe):
+        nearest = _top_k(self._centroids @ q, nprobe)
+        return np.concatenate([self._lists[c] for c in nearest])
+
+    # -------- bulk de-duplication --------
+    def find_duplicates(self, threshold=0.4, k=5, nprobe=None, batch=1024):
+        """
+        Every pair (a, b, similarity) with a < b and similarity >= threshold.
+        Flat mode scores each query block against SCAN_BLOCK rows at a time
+        (batch x SCAN_BLOCK floats at most, whatever the index size);
+        IVF mode runs one probed search per row (approximate, k per row).
+        """
+        with self._lock:
+            if self._centroids is not None and nprobe:
+                return self._ivf_duplicates(threshold, k, nprobe)
+            return self._flat_duplicates(threshold, batch)
+
+    def _ivf_duplicates(self, threshold, k, nprobe):
+        pairs = {}
+        for row in range(self._size):
+            q = self._matrix[row].astype(np.float32)
+            a = int(self._ids[row])
+            for b, score in self._search(q, k, threshold, a, nprobe):
+                pairs[(min(a, b), max(a, b))] = score
+        return sorted((a, b, s) for (a, b), s in pairs.items())
+
+    def _flat_duplicates(self, threshold, batch):
+        pairs = {}
+        mat = self._matrix[:self._size]
+        for start in range(0, self._size, batch):
+            queries = mat[start:start + batch].astype(np.float32)
+            # upper triangle only (each pair once): rows before `start` were queried already
+            for col in range(start, self._size, SCAN_BLOCK):
+                block = mat[col:col + SCAN_BLOCK]
+                if self.dtype != np.float32:
+                    block = block.astype(np.float32)
+                scores = queries @ block.T
+                qi, cj = np.nonzero(scores >= threshold)
+                for i, j in zip(qi.tolist(), cj.tolist()):
+                    if start + i < col + j:
+                        a, b = int(self._ids[start + i]), int(self._ids[col + j])
+                        pairs[(min(a, b), max(a, b))] = float(scores[i, j])
+        return sorted((a, b, s) for (a, b), s in pairs.items())
@@ -0,0 +1,223 @@
+"""
+SHARED FACE INFERENCE SERVER (UNIX SOCKET)
+------------------------------------------
+Loads InsightFace ONCE and serves embeddings to every web worker on the box,
+so N gunicorn workers no longer mean N copies of buffalo_l in RAM.
+
+Run:
+    python face_server.py --socket /tmp/evs-face.sock
+Point the web app at it:
+    FACE_SERVER_SOCKET=/tmp/evs-face.sock python app.py
+
+Wire format (little-endian):
+    request  : magic b"FEV1" | op u8 | length u32 | payload
+    response : status u8     | length u32         | payload
+
+    OP_EMBED         : payload = encoded image bytes (jpg/png) -> float32[dim] embedding
+    OP_INFO          : payload = empty                          -> utf-8 model tag
+    OP_EMBED_CHECKED : like OP_EMBED, but through the frame quality gate first
+    OP_ASSESS        : payload = encoded image bytes -> utf-8 JSON quality metrics
+                       (detector + gate only, no ArcFace)
+
+    status 0 = OK, 1 = error (payload is the utf-8 message),
+           2 = frame rejected (payload is "<reason>\n<message>")
+
+Requests from all connections share one BatchingFaceEngine, so concurrent
+workers also get their ArcFace passes batched together.
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from Untitled_2 import InsightFaceEngine
+from face_batcher import BatchingFaceEngine
+from frame_quality import FrameQualityError, FrameQualityGate
+from result_cache import ResultCache
+
+
+MAGIC = b"FEV1"
+REQUEST_HEADER = struct.Struct("<4sBI")
+RESPONSE_HEADER = struct.Struct("<BI")
+
+OP_EMBED = 1
+OP_INFO = 2
+OP_EMBED_CHECKED = 3
+OP_ASSESS = 4
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_QUALITY = 2
+
+MAX_PAYLOAD = 32 * 1024 * 1024
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("socket closed mid-message")
+        got += k
+    return bytes(buf)
+
+
+# =========================
+# SERVER
+# =========================
+class _FaceRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        engine = self.server.engine
+        while True:
+            try:
+                header = _recv_exact(self.request, REQUEST_HEADER.size)
+            except ConnectionError:
+                return
+
+            magic, op, length = REQUEST_HEADER.unpack(header)
+            if magic != MAGIC or length > MAX_PAYLOAD:
+                self._reply(STATUS_ERROR, b"bad request header")
+                return
+            payload = _recv_exact(self.request, length) if length else b""
+
+            try:
+                if op in (OP_EMBED, OP_EMBED_CHECKED):
+                    emb = engine.extract_embedding_from_bytes(
+                        payload, check_quality=(op == OP_EMBED_CHECKED))
+                    self._reply(STATUS_OK, np.asarray(emb, dtype="<f4").tobytes())
+                elif op == OP_ASSESS:
+                    metrics = engine.assess_frame_from_bytes(payload)
+                    self._reply(STATUS_OK, json.dumps(metrics).encode())
+                elif op == OP_INFO:
+                    self._reply(STATUS_OK, engine.model_tag.encode())
+                else:
+                    self._reply(STATUS_ERROR, f"unknown op {op}".encode())
+            except FrameQualityError as e:
+                self._reply(STATUS_QUALITY, f"{e.reason}\n{e}".encode())
+            except Exception as e:
+                self._reply(STATUS_ERROR, str(e).encode())
+
+    def _reply(self, status, payload):
+        self.request.sendall(RESPONSE_HEADER.pack(status, len(payload)) + payload)
+
+
+class FaceInferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, engine):
+        self.engine = engine
+        path = Path(socket_path)
+        if path.exists():
+            path.unlink()   # stale socket from a previous run
+        super().__init__(str(path), _FaceRequestHandler)
+        os.chmod(path, 0o660)
+
+
+# =========================
+# CLIENT SHIM
+# =========================
+class FaceEngineClient:
+    """
+    Same surface as InsightFaceEngine for the web app (extract_embedding,
+    compare, model_tag), backed by the shared server. One connection per thread.
+    """
+
+    def __init__(self, socket_path, timeout=30.0):
+        self.socket_path = str(socket_path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self.model_tag = self._call(OP_INFO, b"").decode()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _roundtrip(self, sock, op, payload):
+        sock.sendall(REQUEST_HEADER.pack(MAGIC, op, len(payload)) + payload)
+        status, length = RESPONSE_HEADER.unpack(_recv_exact(sock, RESPONSE_HEADER.size))
+        body = _recv_exact(sock, length) if length else b""
+        return status, body
+
+    def _call(self, op, payload):
+        sock = getattr(self._local, "sock", None)
+        try:
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            status, body = self._roundtrip(sock, op, payload)
+        except (ConnectionError, OSError):
+            # server restarted or connection went stale: reconnect once
+            if sock is not None:
+                sock.close()
+            sock = self._local.sock = self._connect()
+            status, body = self._roundtrip(sock, op, payload)
+
+        if status == STATUS_QUALITY:
+            reason, _, message = body.decode(errors="replace").partition("\n")
+            raise FrameQualityError(reason, message)
+        if status != STATUS_OK:
+            raise ValueError(body.decode(errors="replace"))
+        return body
+
+    def extract_embedding_from_bytes(self, data: bytes, check_quality=False):
+        op = OP_EMBED_CHECKED if check_quality else OP_EMBED
+        return np.frombuffer(self._call(op, bytes(data)), dtype="<f4")
+
+    def assess_frame_from_bytes(self, data: bytes) -> dict:
+        return json.loads(self._call(OP_ASSESS, bytes(data)))
+
+    def extract_embedding(self, image_path: str):
+        path = Path(image_path)
+        if not path.exists():
+            raise ValueError("Invalid image path")
+        return self.extract_embedding_from_bytes(path.read_bytes())
+
+    def extract_embedding_from_image(self, img, check_quality=False):
+        ok, buf = cv2.imencode(".png", img)   # lossless, so results match in-process
+        if not ok:
+            raise ValueError("Invalid image data")
+        return self.extract_embedding_from_bytes(buf.tobytes(), check_quality)
+
+    compare = staticmethod(InsightFaceEngine.compare)
+
+
+# =========================
+# ENTRY POINT
+# =========================
+def main():
+    parser = argparse.ArgumentParser(description="Shared InsightFace embedding server")
+    parser.add_argument("--socket", default=os.environ.get("FACE_SERVER_SOCKET", "/tmp/evs-face.sock"))
+    parser.add_argument("--model", default="buffalo_l")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-side", type=int, default=1280,
+                        help="downscale images to this longest side before detection (0 = off)")
+    parser.add_argument("--cache", default=os.environ.get("RESULT_CACHE_DB"),
+                        help="SQLite result cache file (omit for an in-memory cache only)")
+    args = parser.parse_args()
+
+    engine = BatchingFaceEngine(
+        InsightFaceEngine(model_name=args.model, quality_gate=FrameQualityGate(),
+                          max_side=args.max_side or None),
+        max_batch_size=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+        cache=ResultCache(args.cache),
+    )
+    with FaceInferenceServer(args.socket, engine) as server:
+        print(f"Face server ({engine.model_tag}) listening on {args.socket}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
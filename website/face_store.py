@@ -0,0 +1,171 @@
+"""
+REFERENCE FACE EMBEDDING STORE
+------------------------------
+Reference photos (uploads/facever/<cid>.jpg) are embedded ONCE, when they are
+registered or replaced, and the vector is kept in users.db -> user_faces.embedding.
+
+Each stored vector carries:
+- model_tag    : which face model produced it (InsightFaceEngine.model_tag)
+- image_sha256 : digest of the photo bytes it was computed from
+
+A stored vector is only reused when BOTH still match, so swapping the photo on
+disk or upgrading the model silently falls back to a fresh embedding.
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+from datastore import ConnectionPool
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_faces (
+    face_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    image_path TEXT NOT NULL,
+    embedding BLOB,
+    model_tag TEXT,
+    image_sha256 TEXT,
+    uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# columns added on top of the original create_db.py layout
+NEW_COLUMNS = [
+    ("model_tag",    "TEXT"),
+    ("image_sha256", "TEXT"),
+]
+
+
+def bytes_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path) -> str:
+    return bytes_digest(Path(path).read_bytes())
+
+
+def encode_embedding(emb) -> bytes:
+    return np.asarray(emb, dtype=np.float32).tobytes()
+
+
+def decode_embedding(blob: bytes):
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def iter_embeddings(db_path, model_tag=None):
+    """Yield (user_id, embedding) for the latest stored face of every user."""
+    q = """
+        SELECT f.user_id, f.embedding
+        FROM user_faces f
+        JOIN (SELECT user_id, MAX(face_id) AS face_id
+              FROM user_faces GROUP BY user_id) latest
+          ON latest.face_id = f.face_id
+        WHERE f.embedding IS NOT NULL
+    """
+    params = ()
+    if model_tag is not None:
+        q += " AND f.model_tag = ?"
+        params = (model_tag,)
+
+    with sqlite3.connect(db_path) as conn:
+        for user_id, blob in conn.execute(q + " ORDER BY f.user_id", params):
+            yield user_id, decode_embedding(blob)
+
+
+def max_face_id(db_path) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COALESCE(MAX(face_id), 0) FROM user_faces").fetchone()[0]
+
+
+def iter_faces_after(db_path, face_id, model_tag=None):
+    """
+    Yield (face_id, user_id, embedding) for every face stored after face_id,
+    oldest first. save() replaces a face with a new row, so this is every
+    face added or changed since; rows of another model yield embedding None.
+    """
+    q = """
+        SELECT face_id, user_id, embedding, model_tag
+        FROM user_faces WHERE face_id > ?
+        ORDER BY face_id
+    """
+    with sqlite3.connect(db_path) as conn:
+        for fid, user_id, blob, tag in conn.execute(q, (face_id,)):
+            usable = blob is not None and (model_tag is None or tag == model_tag)
+            yield fid, user_id, decode_embedding(blob) if usable else None
+
+
+class ReferenceEmbeddingStore:
+    def __init__(self, db, face_engine):
+        """db: path to users.db, or a datastore.ConnectionPool over it (shared with the app)."""
+        if not isinstance(db, ConnectionPool):
+            db = ConnectionPool(db, size=2)
+        self.pool = db
+        self.db_path = db.db_path
+        self.face = face_engine
+        self.ensure_schema()
+
+    def _connect(self):
+        return self.pool.connection()
+
+    def ensure_schema(self):
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(user_faces)")}
+            for col_name, col_type in NEW_COLUMNS:
+                if col_name not in existing:
+                    conn.execute(f"ALTER TABLE user_faces ADD COLUMN {col_name} {col_type}")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_user_faces_user ON user_faces(user_id)"
+            )
+            conn.commit()
+
+    def load(self, user_id: int, image_sha256: str):
+        """Stored embedding for user_id, or None if missing / stale."""
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT embedding, model_tag, image_sha256
+                FROM user_faces
+                WHERE user_id = ?
+                ORDER BY face_id DESC
+                LIMIT 1
+            """, (user_id,)).fetchone()
+
+        if row is None or row["embedding"] is None:
+            return None
+        if row["model_tag"] != self.face.model_tag or row["image_sha256"] != image_sha256:
+            return None
+        return decode_embedding(row["embedding"])
+
+    def all_embeddings(self):
+        return iter_embeddings(self.db_path, self.face.model_tag)
+
+    def save(self, user_id: int, image_path, embedding, image_sha256: str):
+        # one reference face per candidate: replace whatever was there before
+        with self._connect() as conn:
+            conn.execute("DELETE FROM user_faces WHERE user_id = ?", (user_id,))
+            conn.execute("""
+                INSERT INTO user_faces (user_id, image_path, embedding, model_tag, image_sha256)
+                VALUES (?, ?, ?, ?, ?)
+            """, (user_id, str(image_path), encode_embedding(embedding),
+                  self.face.model_tag, image_sha256))
+            conn.commit()
+
+    def refresh(self, user_id: int, image_path, data: bytes = None):
+        """(Re)compute and persist the reference embedding. Call on register / upload."""
+        if data is None:
+            data = Path(image_path).read_bytes()
+        emb = self.face.extract_embedding_from_bytes(data)
+        self.save(user_id, image_path, emb, bytes_digest(data))
+        return emb
+
+    def get_or_compute(self, user_id: int, image_path):
+        """Stored embedding if still valid for this photo + model, else recompute once."""
+        data = Path(image_path).read_bytes()
+        emb = self.load(user_id, bytes_digest(data))
+        if emb is not None:
+            return emb
+        return self.refresh(user_id, image_path, data)
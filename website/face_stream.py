@@ -0,0 +1,196 @@
+"""
+STREAMING FACE CAPTURE
+----------------------
+The kiosk page POSTs small downscaled JPEG frames one after another. For every
+frame only the detector + quality gate run (no ArcFace). The session keeps the
+best-scoring frame and is "ready" as soon as either
+- a frame scores >= good_score, or
+- the capture window has elapsed / max_frames were seen and a usable frame exists.
+
+The caller then runs recognition ONCE on the winning frame.
+
+Sessions live in the registry's SQLite file (the result cache DB), so the
+frames of one capture may land on any web worker; without a db_path they
+stay in the memory of the worker that created them (single worker only).
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+class FaceStreamSession:
+    def __init__(self, cid: int, window_s=1.5, good_score=45.0, max_frames=20):
+        self.id = uuid.uuid4().hex
+        self.cid = cid
+        self.window_s = window_s
+        self.good_score = good_score
+        self.max_frames = max_frames
+
+        # wall clock, not monotonic: a session may be resumed by another process
+        self.started = time.time()
+        self.frames = 0
+        self.best_bytes = None
+        self.best_metrics = None
+        self.best_score = float("-inf")
+        self.last_reason = None
+        self.done = False
+
+    def elapsed(self) -> float:
+        return time.time() - self.started
+
+    @staticmethod
+    def assess(data: bytes, face_engine):
+        """Score one frame (detector only): (score, metrics, None) or (None, None, reason)."""
+        try:
+            metrics = face_engine.assess_frame_from_bytes(data)
+        except ValueError as e:     # FrameQualityError or undecodable frame
+            return None, None, str(e)
+        return metrics.get("quality_score", 0.0), metrics, None
+
+    def apply(self, data: bytes, score, metrics, reason):
+        """Count an assessed frame and keep it if it is the best so far."""
+        self.frames += 1
+        self.last_reason = reason
+        if score is not None and score > self.best_score:
+            self.best_bytes = data
+            self.best_metrics = metrics
+            self.best_score = score
+
+    def window_closed(self) -> bool:
+        return self.elapsed() >= self.window_s or self.frames >= self.max_frames
+
+    def ready(self) -> bool:
+        if self.best_bytes is None:
+            return False
+        return self.best_score >= self.good_score or self.window_closed()
+
+    def progress(self) -> dict:
+        return {
+            "session_id": self.id,
+            "frames": self.frames,
+            "elapsed_ms": int(self.elapsed() * 1000),
+            "best_score": None if self.best_bytes is None else round(self.best_score, 2),
+            "reason": self.last_reason,
+        }
+
+
+class FaceStreamRegistry:
+    """
+    Frames are scored outside any lock, then folded into the stored session by
+    one statement (frame count + best frame), so concurrent frames of a session
+    are never lost. finish() flips done once; a finished session takes no more
+    frames and is dropped when it expires.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS face_streams (
+            id TEXT PRIMARY KEY,
+            cid INTEGER NOT NULL,
+            window_s REAL NOT NULL,
+            good_score REAL NOT NULL,
+            max_frames INTEGER NOT NULL,
+            started REAL NOT NULL,
+            frames INTEGER NOT NULL DEFAULT 0,
+            best_bytes BLOB,
+            best_metrics TEXT,
+            best_score REAL,
+            last_reason TEXT,
+            done INTEGER NOT NULL DEFAULT 0
+        )
+    """
+    COLUMNS = ("id", "cid", "window_s", "good_score", "max_frames", "started",
+               "frames", "best_bytes", "best_metrics", "best_score", "last_reason", "done")
+    INSERT = "INSERT INTO face_streams (id, cid, window_s, good_score, max_frames, started) VALUES (?, ?, ?, ?, ?, ?)"
+    SELECT = f"SELECT {', '.join(COLUMNS)} FROM face_streams WHERE id = ?"
+    # a frame only replaces the best one if it scores higher (score NULL = unusable frame)
+    OFFER = """
+        UPDATE face_streams SET
+            frames = frames + 1,
+            last_reason = ?,
+            best_bytes = CASE WHEN ? > COALESCE(best_score, -1e308) THEN ? ELSE best_bytes END,
+            best_metrics = CASE WHEN ? > COALESCE(best_score, -1e308) THEN ? ELSE best_metrics END,
+            best_score = CASE WHEN ? > COALESCE(best_score, -1e308) THEN ? ELSE best_score END
+        WHERE id = ? AND done = 0
+    """
+    FINISH = "UPDATE face_streams SET done = 1 WHERE id = ? AND done = 0"
+    EXPIRE = "DELETE FROM face_streams WHERE started < ?"
+
+    def __init__(self, db_path=None, ttl_s=60.0):
+        """db_path: SQLite file shared by every web worker; None = this process only."""
+        self.ttl_s = ttl_s
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path is not None:
+            self._conn = sqlite3.connect(Path(db_path), timeout=5.0, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(self.SCHEMA)
+
+    def create(self, cid: int, **kwargs) -> FaceStreamSession:
+        session = FaceStreamSession(cid, **kwargs)
+        with self._lock:
+            self._expire()
+            if self._conn is None:
+                self._sessions[session.id] = session
+            else:
+                self._conn.execute(self.INSERT, (session.id, cid, session.window_s, session.good_score,
+                                                 session.max_frames, session.started))
+        return session
+
+    def get(self, session_id: str):
+        with self._lock:
+            if self._conn is None:
+                return self._sessions.get(session_id)
+            row = self._conn.execute(self.SELECT, (session_id,)).fetchone()
+        return None if row is None else self._session(row)
+
+    def offer(self, session_id: str, data: bytes, face_engine):
+        """
+        Score one frame and fold it into the session. Returns the session as
+        it stands afterwards (done=True if it had already finished: the frame
+        is ignored), or None if the session is unknown / expired.
+        """
+        score, metrics, reason = FaceStreamSession.assess(data, face_engine)
+        with self._lock:
+            if self._conn is None:
+                session = self._sessions.get(session_id)
+                if session is not None and not session.done:
+                    session.apply(data, score, metrics, reason)
+                return session
+            blob = None if metrics is None else json.dumps(metrics, default=float)
+            self._conn.execute(self.OFFER, (reason, score, data, score, blob, score, score, session_id))
+            row = self._conn.execute(self.SELECT, (session_id,)).fetchone()
+        return None if row is None else self._session(row)
+
+    def finish(self, session: FaceStreamSession) -> bool:
+        """Mark the session done; True for exactly one caller, the one that acts on it."""
+        with self._lock:
+            if self._conn is None:
+                won = not session.done
+            else:
+                won = self._conn.execute(self.FINISH, (session.id,)).rowcount > 0
+        session.done = True
+        return won
+
+    def _expire(self):
+        if self._conn is not None:
+            self._conn.execute(self.EXPIRE, (time.time() - self.ttl_s,))
+            return
+        stale = [sid for sid, s in self._sessions.items() if s.elapsed() > self.ttl_s]
+        for sid in stale:
+            del self._sessions[sid]
+
+    @staticmethod
+    def _session(row):
+        (sid, cid, window_s, good_score, max_frames, started, frames,
+         best_bytes, best_metrics, best_score, last_reason, done) = row
+        s = FaceStreamSession(cid, window_s=window_s, good_score=good_score, max_frames=max_frames)
+        s.id, s.started, s.frames, s.last_reason, s.done = sid, started, frames, last_reason, bool(done)
+        if best_bytes is not None:
+            s.best_bytes, s.best_metrics, s.best_score = best_bytes, json.loads(best_metrics), best_score
+        return s
@@ -0,0 +1,156 @@
+"""
+FRAME QUALITY GATE
+------------------
+Cheap checks that run BEFORE the ArcFace model, using only pixels and the
+detector's own output (bbox + 5 keypoints). Bad live captures are rejected
+with an actionable reason instead of failing later on a low similarity.
+
+Stages:
+1. precheck(img)            : whole-frame exposure + blur on a small thumbnail
+2. check_faces(img, ...)    : face count, detector score, face size,
+                              face-crop sharpness (Laplacian variance),
+                              face-crop exposure, head pose (yaw / pitch / roll)
+
+Same spirit as Testroute.preprocess_webcam_image, but we measure instead of
+"fixing" the frame, so the candidate can simply be asked to retake it.
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+
+class FrameQualityError(ValueError):
+    def __init__(self, reason: str, message: str, metrics=None):
+        super().__init__(message)
+        self.reason = reason
+        self.metrics = metrics or {}
+
+
+def _laplacian_var(gray) -> float:
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+class FrameQualityGate:
+    def __init__(self,
+                 min_frame_sharpness=15.0,
+                 min_face_sharpness=40.0,
+                 min_brightness=50.0,
+                 max_brightness=210.0,
+                 min_face_px=80,
+                 min_det_score=0.6,
+                 max_yaw=0.35,
+                 max_pitch=0.35,
+                 max_roll_deg=20.0,
+                 thumb_width=320):
+        self.min_frame_sharpness = min_frame_sharpness
+        self.min_face_sharpness = min_face_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_face_px = min_face_px
+        self.min_det_score = min_det_score
+        self.max_yaw = max_yaw
+        self.max_pitch = max_pitch
+        self.max_roll_deg = max_roll_deg
+        self.thumb_width = thumb_width
+
+    # -------- stage 1: whole frame, before detection --------
+    def precheck(self, img) -> dict:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape
+        if w > self.thumb_width:
+            gray = cv2.resize(gray, (self.thumb_width, int(h * self.thumb_width / w)),
+                              interpolation=cv2.INTER_AREA)
+
+        metrics = {
+            "frame_brightness": float(gray.mean()),
+            "frame_sharpness": _laplacian_var(gray),
+        }
+        self._check_exposure(metrics["frame_brightness"], metrics)
+        if metrics["frame_sharpness"] < self.min_frame_sharpness:
+            raise FrameQualityError(
+                "blurry", "Image is blurry — hold still and retake", metrics)
+        return metrics
+
+    # -------- stage 2: detector output --------
+    def check_faces(self, img, bboxes, kpss) -> dict:
+        if bboxes.shape[0] == 0:
+            raise FrameQualityError(
+                "no_face", "No face detected — look straight at the camera")
+        if bboxes.shape[0] > 1:
+            raise FrameQualityError(
+                "multiple_faces", "More than one face in frame — only the candidate should be visible")
+        return self.check_face(img, bboxes[0], kpss[0])
+
+    def check_face(self, img, bbox, kps) -> dict:
+        x1, y1, x2, y2, score = [float(v) for v in bbox[:5]]
+        face_w, face_h = x2 - x1, y2 - y1
+        metrics = {"det_score": score, "face_px": min(face_w, face_h)}
+
+        if score < self.min_det_score:
+            raise FrameQualityError(
+                "low_confidence", "Face not clearly visible — remove obstructions and retake", metrics)
+        if metrics["face_px"] < self.min_face_px:
+            raise FrameQualityError(
+                "too_small", "Face too small — move closer to the camera", metrics)
+
+        h, w = img.shape[:2]
+        crop = img[max(0, int(y1)):min(h, int(y2)), max(0, int(x1)):min(w, int(x2))]
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        metrics["face_brightness"] = float(gray.mean())
+        metrics["face_sharpness"] = _laplacian_var(gray)
+
+        self._check_exposure(metrics["face_brightness"], metrics)
+        if metrics["face_sharpness"] < self.min_face_sharpness:
+            raise FrameQualityError(
+                "blurry", "Face is blurry — hold still and retake", metrics)
+
+        metrics.update(self.estimate_pose(kps))
+        if abs(metrics["yaw"]) > self.max_yaw:
+            raise FrameQualityError(
+                "pose_yaw", "Head turned — face the camera directly", metrics)
+        if abs(metrics["pitch"]) > self.max_pitch:
+            raise FrameQualityError(
+                "pose_pitch", "Head tilted up/down — look straight ahead", metrics)
+        if abs(metrics["roll"]) > self.max_roll_deg:
+            raise FrameQualityError(
+                "pose_roll", "Head tilted sideways — keep your head level", metrics)
+        return metrics
+
+    def score(self, metrics: dict) -> float:
+        """One number for ranking frames that all passed the gate (higher is better)."""
+        pose_penalty = abs(metrics.get("yaw", 0.0)) + abs(metrics.get("pitch", 0.0))
+        return (math.log1p(metrics.get("face_sharpness", 0.0))
+                * math.sqrt(metrics.get("face_px", 0.0))
+                * metrics.get("det_score", 0.0)
+                * max(0.0, 1.0 - pose_penalty))
+
+    # -------- helpers --------
+    def _check_exposure(self, brightness, metrics):
+        if brightness < self.min_brightness:
+            raise FrameQualityError(
+                "too_dark", "Image too dark — improve lighting on the face", metrics)
+        if brightness > self.max_brightness:
+            raise FrameQualityError(
+                "too_bright", "Image overexposed — avoid direct light behind or on the camera", metrics)
+
+    @staticmethod
+    def estimate_pose(kps) -> dict:
+        """
+        Rough pose from the 5 SCRFD keypoints
+        (left eye, right eye, nose, left mouth corner, right mouth corner).
+        yaw / pitch are offsets of the nose, normalised by face geometry (0 = frontal).
+        """
+        kps = np.asarray(kps, dtype=np.float32)
+        le, re, nose, lm, rm = kps[:5]
+        eye_mid = (le + re) / 2
+        mouth_mid = (lm + rm) / 2
+        eye_dist = max(float(np.linalg.norm(re - le)), 1e-6)
+        face_len = max(float(mouth_mid[1] - eye_mid[1]), 1e-6)
+
+        yaw = float(nose[0] - eye_mid[0]) / eye_dist
+        # frontal faces have the nose roughly halfway between eyes and mouth
+        pitch = float(nose[1] - eye_mid[1]) / face_len - 0.5
+        roll = math.degrees(math.atan2(float(re[1] - le[1]), float(re[0] - le[0])))
+        return {"yaw": yaw, "pitch": pitch, "roll": roll}
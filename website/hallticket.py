@@ -0,0 +1,527 @@
+"""
+HALL TICKET RENDERING + PDF CACHE
+---------------------------------
+The admit card (templates/hallticket.html, compiled once per process, fonts
+from static/fonts so rendering never touches the network) is rendered once
+per distinct set of inputs and then served from disk:
+
+- ticket_key(user, face_digest, id_digest, qr) : sha256 over the candidate
+  row, both photo digests, the gate-QR slot / key fingerprint and
+  TEMPLATE_VERSION, so ANY change to what the ticket shows (re-registration,
+  new reference photo, new exam slot or signing key, template edit) gives a
+  new key
+- HallTicketCache : rendered PDFs on disk (one file per candidate, older
+  renders are removed when a new one lands), photo digests memoised per
+  (mtime, size) so a repeat download only stats two files and reads the PDF;
+  print-size photo thumbnails are kept too, keyed by the photo digest
+
+The key doubles as the HTTP ETag.
+
+Bulk generation (a whole centre at once) renders through the same cache in a
+process pool, so an interrupted run resumes by skipping every ticket already
+on disk, and packs the PDFs into a streamed zip or merged print files:
+
+- iter_rendered(users, ...) : (cid, pdf path | None, status, seconds) in candidate order
+- iter_zip(results)         : zip archive bytes, one member at a time
+- write_merged(results, ..) : one PDF per `per_file` tickets (pip install pypdf)
+
+The web app never forks its own (threaded) process for this: BulkTicketJobs
+runs scripts/bulk_halltickets.py as a child process, a bounded number at a
+time, streaming the zip from its stdout or leaving merged PDFs in a job dir.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from multiprocessing import Pool
+from pathlib import Path
+
+import cv2
+
+import ticket_qr
+from image_io import decode_image_max
+
+
+# bump whenever templates/hallticket.html or the photo thumbnails change, so cached PDFs are re-rendered
+TEMPLATE_VERSION = "3"
+
+
+# =========================
+# rendering
+# =========================
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+FONT_DIR = Path(__file__).parent / "static" / "fonts"
+
+# photos are shown at 90x110 CSS px; 3x that is ~300 dpi on paper. Thumbnails
+# are cropped to the frame's aspect, since xhtml2pdf ignores object-fit
+PHOTO_SIZE = (270, 330)
+PHOTO_QUALITY = 85
+
+_template = None
+
+
+def get_template():
+    """hallticket.html, parsed and compiled once per process (workers included)."""
+    global _template
+    if _template is None:
+        from jinja2 import Environment, FileSystemLoader
+
+        env = Environment(loader=FileSystemLoader(str(TEMPLATE_DIR)), autoescape=True)
+        _template = env.get_template("hallticket.html")
+    return _template
+
+
+def _data_url(data, mimetype="image/jpeg"):
+    return f"data:{mimetype};base64," + base64.b64encode(data).decode() if data else ""
+
+
+def make_thumbnail(data: bytes, size=PHOTO_SIZE, quality=PHOTO_QUALITY) -> bytes:
+    """Centre-crop to the size's aspect, then shrink to size (never enlarge); JPEG bytes."""
+    img = decode_image_max(data, 2 * max(size))
+    h, w = img.shape[:2]
+    tw, th = size
+    if w * th > h * tw:             # too wide: trim the sides
+        cw = h * tw // th
+        img = img[:, (w - cw) // 2:(w - cw) // 2 + cw]
+    else:                           # too tall: trim top / bottom
+        ch = w * th // tw
+        img = img[(h - ch) // 2:(h - ch) // 2 + ch]
+    if img.shape[1] > tw:
+        img = cv2.resize(img, (tw, th), interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode thumbnail")
+    return buf.tobytes()
+
+
+def render_html(user: dict, face_thumb=None, id_thumb=None, qr_text=None) -> str:
+    """
+    Admit card HTML for one users row; thumbnails (JPEG bytes) and the gate
+    QR code (ticket_qr payload, if given) are embedded as data URLs.
+    """
+    return get_template().render(
+        cid=user["user_id"],
+        name=user.get("name") or "—",
+        id_value=user.get("id_value") or "—",
+        face_img=_data_url(face_thumb),
+        id_img=_data_url(id_thumb),
+        qr_img=_data_url(ticket_qr.qr_png(qr_text) if qr_text else None, "image/png"),
+        font_dir=FONT_DIR.as_posix(),
+    )
+
+
+def render_pdf(html: str) -> bytes:
+    """xhtml2pdf render; raises ImportError if xhtml2pdf is not installed."""
+    from xhtml2pdf import pisa
+
+    pdf_buffer = io.BytesIO()
+    pisa.CreatePDF(html, dest=pdf_buffer)
+    return pdf_buffer.getvalue()
+
+
+def ticket_key(user: dict, face_digest, id_digest, qr=None) -> str:
+    payload = json.dumps(
+        {"v": TEMPLATE_VERSION, "user": user, "face": face_digest, "id": id_digest, "qr": qr},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# =========================
+# disk cache
+# =========================
+class HallTicketCache:
+    def __init__(self, cache_dir, qr_key=None, exam_slot=None):
+        """qr_key + exam_slot: print a signed gate QR (ticket_qr) on every ticket."""
+        self.cache_dir = Path(cache_dir)
+        self.qr_key = qr_key
+        self.exam_slot = exam_slot
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._digests = {}          # photo path -> (mtime_ns, size, sha256)
+        self._locks = {}            # cid -> render lock (one render per candidate at a time)
+        self._guard = threading.Lock()
+
+    # -------- inputs --------
+    def file_digest(self, path):
+        """sha256 of a photo, recomputed only when its mtime / size change; None if missing."""
+        path = str(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._digests.pop(path, None)
+            return None
+        memo = self._digests.get(path)
+        if memo and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+            return memo[2]
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self._digests[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def qr_text(self, user: dict):
+        if not (self.qr_key and self.exam_slot):
+            return None
+        return ticket_qr.make_payload(self.qr_key, user["user_id"], user.get("id_type") or "",
+                                      user.get("id_value") or "", self.exam_slot)
+
+    def key(self, user: dict, face_path, id_path) -> str:
+        qr = None
+        if self.qr_key and self.exam_slot:
+            qr = [self.exam_slot, ticket_qr.key_fingerprint(self.qr_key)]
+        return ticket_key(user, self.file_digest(face_path), self.file_digest(id_path), qr)
+
+    def thumbnail(self, path):
+        """
+        Print-size JPEG of a photo, made once per photo content; None if the
+        photo is missing or does not decode (the ticket shows "No Photo").
+        """
+        digest = self.file_digest(path)
+        if digest is None:
+            return None
+        thumb = self.cache_dir / "thumbs" / digest[:2] / f"{digest}-{PHOTO_SIZE[0]}x{PHOTO_SIZE[1]}.jpg"
+        try:
+            return thumb.read_bytes()
+        except FileNotFoundError:
+            pass
+        try:
+            data = make_thumbnail(Path(path).read_bytes())
+        except ValueError:
+            # truncated / corrupt upload: a ticket without the photo beats a 500
+            return None
+        self._write(thumb, data)
+        return data
+
+    def html(self, user: dict, face_path, id_path) -> str:
+        return render_html(user, self.thumbnail(face_path), self.thumbnail(id_path), self.qr_text(user))
+
+    def render(self, user: dict, face_path, id_path) -> bytes:
+        return render_pdf(self.html(user, face_path, id_path))
+
+    # -------- storage --------
+    def _dir(self, cid):
+        return self.cache_dir / f"{cid // 1000:04d}"
+
+    def path(self, cid, key) -> Path:
+        return self._dir(cid) / f"{cid}-{key[:24]}.pdf"
+
+    def get(self, cid, key):
+        path = self.path(cid, key)
+        return path if path.exists() else None
+
+    @staticmethod
+    def _write(path, data):
+        # write + rename, so a concurrent reader never sees half a file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def put(self, cid, key, pdf: bytes) -> Path:
+        path = self.path(cid, key)
+        self._write(path, pdf)
+        for old in path.parent.glob(f"{cid}-*.pdf"):
+            if old != path:
+                old.unlink(missing_ok=True)
+        return path
+
+    def get_or_render(self, cid, key, render) -> Path:
+        """Cached PDF path; render() -> bytes runs once per key even under concurrent requests."""
+        path = self.get(cid, key)
+        if path is not None:
+            return path
+        with self._guard:
+            lock = self._locks.setdefault(cid, threading.Lock())
+        with lock:
+            path = self.get(cid, key)
+            if path is None:
+                path = self.put(cid, key, render())
+        with self._guard:
+            self._locks.pop(cid, None)
+        return path
+
+    def invalidate(self, cid, *photo_paths):
+        """Inputs changed (register / new reference photo): drop memoised digests and old PDFs."""
+        for p in photo_paths:
+            self._digests.pop(str(p), None)
+        for old in self._dir(cid).glob(f"{cid}-*.pdf"):
+            old.unlink(missing_ok=True)
+
+
+# =========================
+# bulk generation
+# =========================
+_worker_cache = None
+
+
+def _init_render_worker(cache_dir, qr_key=None, exam_slot=None):
+    global _worker_cache
+    _worker_cache = HallTicketCache(cache_dir, qr_key, exam_slot)
+
+
+def _render_one(task):
+    """(user, face path, id path) -> (cid, pdf path or None, "cached" / "rendered" / error, seconds)."""
+    user, face_path, id_path = task
+    cid = user["user_id"]
+    t0 = time.perf_counter()
+    key = _worker_cache.key(user, face_path, id_path)
+    path = _worker_cache.get(cid, key)
+    if path is not None:
+        return cid, str(path), "cached", time.perf_counter() - t0
+    try:
+        pdf = _worker_cache.render(user, face_path, id_path)
+    except ImportError:
+        # no renderer installed: fail the run, not every ticket
+        raise
+    except Exception as e:
+        return cid, None, f"error: {type(e).__name__}: {e}", time.perf_counter() - t0
+    return cid, str(_worker_cache.put(cid, key, pdf)), "rendered", time.perf_counter() - t0
+
+
+def iter_rendered(users, face_dir, id_dir, cache_dir, workers=None, qr_key=None, exam_slot=None):
+    """
+    Render (or reuse) the ticket of every users row, pisa being CPU-bound and
+    single-threaded, in `workers` processes. Yields in input order. Pass the
+    same qr_key / exam_slot as the web app so both share cached PDFs.
+    """
+    face_dir, id_dir = Path(face_dir), Path(id_dir)
+    tasks = ((u, face_dir / f"{u['user_id']}.jpg", id_dir / f"{u['user_id']}.jpg") for u in users)
+    with Pool(workers or os.cpu_count() or 1, initializer=_init_render_worker,
+              initargs=(str(cache_dir), qr_key, exam_slot)) as pool:
+        yield from pool.imap(_render_one, tasks, chunksize=4)
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer ZipFile streams into; drained after each member."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buf += b
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def iter_zip(results, errors=None):
+    """
+    Zip archive bytes for iter_rendered() results, produced one ticket at a
+    time so neither side ever holds more than one PDF. PDFs are already
+    compressed, so members are stored. Failed tickets are appended to the
+    `errors` list (cid, reason) if given, and listed in errors.txt.
+    """
+    sink = _ZipSink()
+    failed = []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for cid, path, status, _ in results:
+            if path is None:
+                failed.append((cid, status))
+                continue
+            with open(path, "rb") as src, zf.open(f"hallticket_{cid}.pdf", "w") as dst:
+                while True:
+                    chunk = src.read(1 << 16)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            yield sink.drain()
+        if failed:
+            zf.writestr("errors.txt", "".join(f"{cid}\t{reason}\n" for cid, reason in failed))
+    if errors is not None:
+        errors.extend(failed)
+    yield sink.drain()
+
+
+def write_merged(results, out_pattern, per_file=500, errors=None):
+    """
+    Merge tickets into print files of at most per_file tickets each
+    (out_pattern like "centre-{:04d}.pdf"); only one batch is in memory at a
+    time. Returns the paths written.
+    """
+    try:
+        from pypdf import PdfWriter
+    except ImportError as e:
+        raise ImportError("Merged PDF output needs pypdf: pip install pypdf") from e
+
+    written, batch = [], []
+
+    def flush():
+        if not batch:
+            return
+        writer = PdfWriter()
+        for path in batch:
+            writer.append(path)
+        out = Path(str(out_pattern).format(len(written) + 1))
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "wb") as f:
+            writer.write(f)
+        writer.close()
+        written.append(out)
+        batch.clear()
+
+    for cid, path, status, _ in results:
+        if path is None:
+            if errors is not None:
+                errors.append((cid, status))
+            continue
+        batch.append(path)
+        if len(batch) >= per_file:
+            flush()
+    flush()
+    return written
+
+
+# =========================
+# web: bulk jobs in a child process
+# =========================
+BULK_SCRIPT = Path(__file__).parent / "scripts" / "bulk_halltickets.py"
+# finished PDF jobs are removed this long after they started
+JOB_TTL_S = 24 * 3600
+
+
+class _ChildOutput:
+    """
+    WSGI body streaming a child's stdout. close() runs when the response ends
+    or the client goes away, and kills the child if it is still rendering.
+    """
+
+    def __init__(self, proc, on_close):
+        self.proc = proc
+        self.on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        while True:
+            chunk = self.proc.stdout.read(1 << 16)
+            if not chunk:
+                break
+            yield chunk
+        self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self.proc.poll() is None:
+                if hasattr(os, "killpg"):
+                    # the child's render pool too: it runs in the child's own session
+                    os.killpg(self.proc.pid, signal.SIGKILL)
+                else:
+                    self.proc.kill()
+            self.proc.wait()
+            self.proc.stdout.close()
+        finally:
+            self.on_close()
+
+
+class BulkTicketJobs:
+    def __init__(self, jobs_dir, cli_args=(), env=None, max_jobs=1):
+        """
+        cli_args: extra bulk_halltickets.py arguments (--workers, --cache-dir, db paths ...)
+        env     : child environment (HALLTICKET_QR_KEY ...); None = inherit
+        max_jobs: children this web worker runs at once; more requests get None (busy)
+        """
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.cli_args = [str(a) for a in cli_args]
+        self.env = env
+        self._slots = threading.BoundedSemaphore(max_jobs)
+
+    def _command(self, fmt, out, status=None, first_id=None, last_id=None, extra=()):
+        cmd = [sys.executable, str(BULK_SCRIPT), "--format", fmt, "--out", str(out),
+               *self.cli_args, *(str(a) for a in extra)]
+        for flag, value in (("--status", status), ("--from-id", first_id), ("--to-id", last_id)):
+            if value is not None:
+                cmd += [flag, str(value)]
+        return cmd
+
+    def stream_zip(self, **filters):
+        """Response body with the zip as the child renders it; None if busy."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            proc = subprocess.Popen(self._command("zip", "-", **filters), stdout=subprocess.PIPE,
+                                    stdin=subprocess.DEVNULL, env=self.env, start_new_session=True)
+        except BaseException:
+            self._slots.release()
+            raise
+        return _ChildOutput(proc, self._slots.release)
+
+    def start_pdf(self, per_file, **filters):
+        """Start merged-PDF rendering in the background; the job id, or None if busy."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            self._expire()
+            job_id = uuid.uuid4().hex
+            job_dir = self.jobs_dir / job_id
+            job_dir.mkdir()
+            proc = subprocess.Popen(
+                self._command("pdf", job_dir / "halltickets.pdf", extra=("--per-file", per_file), **filters),
+                stdout=subprocess.DEVNULL, stdin=subprocess.DEVNULL, env=self.env, start_new_session=True)
+        except BaseException:
+            self._slots.release()
+            raise
+        threading.Thread(target=self._wait, args=(proc, job_dir), daemon=True).start()
+        return job_id
+
+    def _wait(self, proc, job_dir):
+        try:
+            code = proc.wait()
+        finally:
+            self._slots.release()
+        done = {"returncode": code, "files": sorted(p.name for p in job_dir.glob("halltickets-*.pdf"))}
+        HallTicketCache._write(job_dir / "status.json", json.dumps(done).encode())
+
+    def job(self, job_id):
+        """{"status": "running" / "done" / "failed", "files": [...]}, or None for an unknown job."""
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+            return None
+        job_dir = self.jobs_dir / job_id
+        if not job_dir.is_dir():
+            return None
+        try:
+            done = json.loads((job_dir / "status.json").read_text())
+        except FileNotFoundError:
+            return {"status": "running", "files": []}
+        return {"status": "done" if done["returncode"] == 0 else "failed", "files": done["files"]}
+
+    def file(self, job_id, name):
+        """Path of a finished job's PDF, or None."""
+        info = self.job(job_id)
+        if not info or name not in info["files"]:
+            return None
+        return self.jobs_dir / job_id / name
+
+    def _expire(self):
+        cutoff = time.time() - JOB_TTL_S
+        for job_dir in self.jobs_dir.iterdir():
+            try:
+                if job_dir.is_dir() and job_dir.stat().st_mtime < cutoff:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,130 @@
+"""
+IN-MEMORY IMAGE HELPERS
+-----------------------
+- decode_image       : request bytes -> BGR ndarray via cv2.imdecode (no temp file)
+- decode_image_max   : same, but never larger than max_side; big JPEGs are decoded
+                       at 1/2, 1/4 or 1/8 scale by libjpeg itself (IMREAD_REDUCED_*)
+                       so a 12 MP phone photo never costs a full-resolution decode
+- fit_within         : downscale an already-decoded image to max_side
+- write_file         : atomic write (temp file + rename), for files read back at once
+- AsyncImageWriter   : audit copies are written by a background thread, so the
+                       request never waits on disk before inference
+"""
+
+import atexit
+import logging
+import queue
+import struct
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+def decode_image(data, flags=cv2.IMREAD_COLOR):
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if img is None:
+        raise ValueError("Invalid image data")
+    return img
+
+
+_REDUCED_COLOR = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                  8: cv2.IMREAD_REDUCED_COLOR_8}
+_REDUCED_GRAYSCALE = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                      8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+
+def peek_size(data):
+    """(width, height) from a JPEG / PNG header without decoding, else None."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        (length,) = struct.unpack(">H", data[i + 2:i + 4])
+        # SOF0..SOF15 carry the frame size (C4 / C8 / CC are not frames)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            h, w = struct.unpack(">HH", data[i + 5:i + 9])
+            return w, h
+        i += 2 + length
+    return None
+
+
+def fit_within(img, max_side):
+    """Downscale (never upscale) so the longest side is at most max_side."""
+    if not max_side:
+        return img
+    h, w = img.shape[:2]
+    if max(h, w) <= max_side:
+        return img
+    scale = max_side / max(h, w)
+    return cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def decode_image_max(data, max_side, grayscale=False):
+    """decode_image capped at max_side, using the cheapest JPEG reduction that stays >= max_side."""
+    size = peek_size(data) if max_side else None
+    if size is None:
+        return fit_within(decode_image(data, cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR), max_side)
+
+    reduced = _REDUCED_GRAYSCALE if grayscale else _REDUCED_COLOR
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    for factor in (8, 4, 2):
+        if max(size) // factor >= max_side:
+            flags = reduced[factor]
+            break
+    return fit_within(decode_image(data, flags), max_side)
+
+
+log = logging.getLogger(__name__)
+
+
+def write_file(path, data: bytes):
+    """Write via a .part file and rename, so readers never see a half-written file."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".part")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+class AsyncImageWriter:
+    _STOP = object()
+
+    def __init__(self):
+        self._pending = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._run, name="image-writer", daemon=True
+        )
+        self._worker.start()
+        atexit.register(self.close)
+
+    def write(self, path, data: bytes):
+        """Queue `data` to be written to `path`; returns immediately."""
+        self._pending.put((Path(path), bytes(data)))
+
+    def close(self):
+        """Flush everything still queued (also runs at interpreter exit)."""
+        if self._worker.is_alive():
+            self._pending.put(self._STOP)
+            self._worker.join()
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is self._STOP:
+                return
+            path, data = item
+            try:
+                write_file(path, data)
+            except OSError as e:
+                log.error("Audit image write failed for %s: %s", path, e)
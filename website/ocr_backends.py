@@ -0,0 +1,131 @@
+"""
+OCR BACKENDS
+------------
+OCREngine does the image preprocessing; a backend turns the final grayscale
+ndarray into text.
+
+- "pytesseract" : default. Spawns a `tesseract` process per call (temp files,
+                  language model reloaded every time).
+- "tesserocr"   : keeps a pool of initialised Tesseract C-API handles alive for
+                  the life of the process. Images are handed over in memory and
+                  recognition releases the GIL, so pool_size threads OCR in parallel.
+                  pip install tesserocr
+
+Every backend implements:
+    recognize(gray, psm=6, whitelist=None) -> str
+    orientation(gray) -> int    clockwise rotation (0/90/180/270) that makes the
+                                text upright; 0 when Tesseract's OSD data is
+                                missing or it cannot tell
+"""
+
+import os
+import queue
+import re
+from contextlib import contextmanager
+
+import numpy as np
+import pytesseract
+
+
+class PytesseractBackend:
+    name = "pytesseract"
+
+    def __init__(self, tesseract_path=None, lang="eng"):
+        if tesseract_path:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_path
+        self.lang = lang
+
+    def recognize(self, gray, psm=6, whitelist=None) -> str:
+        config = f"--psm {psm}"
+        if whitelist:
+            config += f" -c tessedit_char_whitelist={whitelist}"
+        return pytesseract.image_to_string(gray, lang=self.lang, config=config)
+
+    def orientation(self, gray) -> int:
+        try:
+            osd = pytesseract.image_to_osd(gray, config="--psm 0")
+        except pytesseract.TesseractError:
+            return 0
+        m = re.search(r"Rotate:\s*(\d+)", osd)
+        return int(m.group(1)) % 360 if m else 0
+
+
+class TesserocrBackend:
+    name = "tesserocr"
+
+    def __init__(self, tessdata_path=None, lang="eng", pool_size=None):
+        try:
+            import tesserocr
+        except ImportError as e:
+            raise ImportError(
+                "OCR backend 'tesserocr' needs the tesserocr package: pip install tesserocr"
+            ) from e
+
+        self.pool_size = pool_size or os.cpu_count() or 1
+        self._handles = queue.Queue()
+        kwargs = {"lang": lang}
+        if tessdata_path:
+            kwargs["path"] = tessdata_path
+        for _ in range(self.pool_size):
+            self._handles.put(tesserocr.PyTessBaseAPI(**kwargs))
+
+    @contextmanager
+    def _handle(self):
+        api = self._handles.get()
+        try:
+            yield api
+        finally:
+            self._handles.put(api)
+
+    def recognize(self, gray, psm=6, whitelist=None) -> str:
+        gray = np.ascontiguousarray(gray, dtype=np.uint8)
+        h, w = gray.shape[:2]
+        with self._handle() as api:
+            api.SetPageSegMode(psm)
+            api.SetVariable("tessedit_char_whitelist", whitelist or "")
+            api.SetImageBytes(gray.tobytes(), w, h, 1, w)
+            try:
+                return api.GetUTF8Text()
+            finally:
+                api.Clear()
+
+    def orientation(self, gray) -> int:
+        import tesserocr
+
+        gray = np.ascontiguousarray(gray, dtype=np.uint8)
+        h, w = gray.shape[:2]
+        with self._handle() as api:
+            api.SetPageSegMode(tesserocr.PSM.OSD_ONLY)
+            api.SetImageBytes(gray.tobytes(), w, h, 1, w)
+            try:
+                osd = api.DetectOrientationScript()
+            except RuntimeError:
+                osd = None
+            finally:
+                api.Clear()
+        if not osd:
+            return 0
+        # orient_deg is how far the page is rotated counter-clockwise
+        return (360 - int(osd["orient_deg"])) % 360
+
+    def close(self):
+        while not self._handles.empty():
+            self._handles.get_nowait().End()
+
+
+BACKENDS = {
+    PytesseractBackend.name: PytesseractBackend,
+    TesserocrBackend.name: TesserocrBackend,
+}
+
+
+def make_backend(name="pytesseract", tesseract_path=None):
+    """
+    Backend by name. tesseract_path is the tesseract binary, so it only applies
+    to pytesseract; tesserocr finds its tessdata via TESSDATA_PREFIX.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name} (choose from {', '.join(BACKENDS)})")
+    if name == PytesseractBackend.name:
+        return PytesseractBackend(tesseract_path=tesseract_path)
+    return BACKENDS[name]()
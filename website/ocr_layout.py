@@ -0,0 +1,119 @@
+"""
+ID CARD LAYOUT ANALYSIS
+-----------------------
+Finds the text lines on a card that could hold the ID number, so OCR can run
+on a few small single-line crops instead of the whole card.
+
+1. Morphological gradient + Otsu        -> character strokes
+2. Wide horizontal closing               -> characters merge into line blobs
+3. Contours, filtered by size/aspect     -> candidate lines
+4. Ranked by aspect ratio vs the expected ID's length, and by font size
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+
+# printed length of each ID value incl. spaces (aadhaar: "XXXX XXXX XXXX")
+EXPECTED_CHARS = {
+    "aadhaar": 14,
+    "aadhar": 14,
+    "pan": 10,
+    "passport": 8,
+    "voter": 10,
+    "hallticket": 10,
+}
+
+# width / height of one printed character, roughly, for common ID fonts
+CHAR_ASPECT = 0.6
+
+
+def _line_contours(gray):
+    """Steps 1-3: contours of the text-line blobs."""
+    W = gray.shape[1]
+
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+    join = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, W // 40), 1))
+    lines = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, join)
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return contours
+
+
+def find_id_line_boxes(gray, id_type: str, max_lines=6):
+    """Candidate (x, y, w, h) boxes for the ID-number line, best first."""
+    H, W = gray.shape[:2]
+    contours = _line_contours(gray)
+
+    target = EXPECTED_CHARS.get(id_type, 10) * CHAR_ASPECT
+    boxes = []
+    for c in contours:
+        x, y, w, h = cv2.boundingRect(c)
+        if h < max(8, H * 0.015) or h > H * 0.15:
+            continue
+        if w < W * 0.1:
+            continue
+        if not 2.5 <= w / h <= 30:
+            continue
+        boxes.append((x, y, w, h))
+    if not boxes:
+        return []
+
+    # ID numbers are printed larger than the surrounding text: reward lines
+    # taller than the typical line, penalise aspect far from the expected length
+    median_h = float(np.median([h for _, _, _, h in boxes]))
+
+    def score(box):
+        _, _, w, h = box
+        return abs(math.log((w / h) / target)) - math.log(h / median_h)
+
+    return sorted(boxes, key=score)[:max_lines]
+
+
+def median_line_height(gray):
+    """Median height in px of the text-line blobs, or None if there are too few to tell."""
+    H = gray.shape[0]
+    heights = []
+    for c in _line_contours(gray):
+        _, _, w, h = cv2.boundingRect(c)
+        if max(4, H * 0.01) <= h <= H * 0.15 and w >= 2.5 * h:
+            heights.append(h)
+    if len(heights) < 3:
+        return None
+    return float(np.median(heights))
+
+
+def estimate_skew(gray, max_angle=15.0):
+    """
+    Small-angle skew of the text lines in degrees (positive = lines rise to the
+    right), from the median angle of the long line blobs; 0.0 if unsure.
+    """
+    angles = []
+    for c in _line_contours(gray):
+        (_, _), (w, h), angle = cv2.minAreaRect(c)
+        if w < h:
+            w, h = h, w
+            angle -= 90
+        # OpenCV versions disagree on the angle range: fold into (-90, 90]
+        angle = (angle + 90) % 180 - 90
+        if h > 0 and w / h >= 4 and abs(angle) <= max_angle:
+            angles.append(-angle)
+    if len(angles) < 3:
+        return 0.0
+    return float(np.median(angles))
+
+
+def crop_line(gray, box, pad=4, target_height=48):
+    """Padded, binarised crop of one line, scaled so glyphs are a comfortable size for Tesseract."""
+    H, W = gray.shape[:2]
+    x, y, w, h = box
+    crop = gray[max(0, y - pad):min(H, y + h + pad), max(0, x - pad):min(W, x + w + pad)]
+
+    if crop.shape[0] < target_height:
+        scale = target_height / crop.shape[0]
+        crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+    return cv2.threshold(crop, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
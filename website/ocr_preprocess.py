@@ -0,0 +1,146 @@
+"""
+OCR PREPROCESSING CASCADE
+-------------------------
+Progressively more expensive ways to binarise a whole ID card. The caller OCRs
+each variant in turn and stops at the first one where the expected ID pattern
+matches, so clean scans only ever pay for stage 1.
+
+1. otsu      : global Otsu threshold (what OCREngine always did)
+2. adaptive  : local Gaussian threshold, for uneven lighting / glare / shadows
+3. deskew    : upright the card (Tesseract OSD, 90 deg steps) and remove small
+               line skew, then Otsu
+4. upscale   : 2x enlargement for small printed text, then Otsu
+
+Stages that would not change the image (no rotation found, card already large)
+are skipped instead of re-running Tesseract on the same pixels.
+
+Before any of this, normalize_resolution() brings phone-camera uploads down to
+the resolution Tesseract actually needs: the card's printed body text is
+measured on a thumbnail and the image is scaled so that text sits at
+target_dpi (body text on Indian ID cards is ~9 pt). Never upscales.
+"""
+
+import math
+import time
+
+import cv2
+
+from ocr_layout import estimate_skew, median_line_height
+
+
+STAGES = ("otsu", "adaptive", "deskew", "upscale")
+
+# below this the correction is within Tesseract's own tolerance
+MIN_SKEW_DEG = 0.5
+
+# upscaling stops once the card is this wide
+UPSCALE_MAX_WIDTH = 2400
+
+# resolution normalisation
+ID_TEXT_PT = 9.0
+DEFAULT_TARGET_DPI = 300
+DEFAULT_MAX_SIDE = 2400         # hard cap, whatever the camera
+MEASURE_SIDE = 1000             # thumbnail the text height is measured on
+
+
+def normalize_resolution(gray, target_dpi=DEFAULT_TARGET_DPI, max_side=DEFAULT_MAX_SIDE):
+    """
+    (resized gray, info). info reports the source/output size, the scale
+    applied, the measured effective DPI and how long the normalisation took.
+    target_dpi=None only applies the max_side cap.
+    """
+    t0 = time.perf_counter()
+    h, w = gray.shape[:2]
+    scale = 1.0
+    if max_side and max(h, w) > max_side:
+        scale = max_side / max(h, w)
+
+    effective_dpi = None
+    if target_dpi:
+        thumb_scale = min(1.0, MEASURE_SIDE / max(h, w))
+        thumb = gray if thumb_scale == 1.0 else cv2.resize(
+            gray, None, fx=thumb_scale, fy=thumb_scale, interpolation=cv2.INTER_AREA)
+        line_h = median_line_height(thumb)
+        if line_h is not None:
+            # line blob height ~ the font's point size at this resolution
+            effective_dpi = line_h / thumb_scale / ID_TEXT_PT * 72
+            scale = min(scale, target_dpi / effective_dpi)
+
+    out = gray
+    if scale < 0.9:
+        out = cv2.resize(gray, (max(1, math.floor(w * scale)), max(1, math.floor(h * scale))),
+                         interpolation=cv2.INTER_AREA)
+    else:
+        scale = 1.0
+
+    return out, {
+        "src_size": [w, h],
+        "size": [out.shape[1], out.shape[0]],
+        "scale": round(scale, 3),
+        "effective_dpi": None if effective_dpi is None else round(effective_dpi),
+        "normalize_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+
+
+def otsu(gray):
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def adaptive(gray, block_size=31, c=15):
+    gray = cv2.medianBlur(gray, 3)
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block_size, c
+    )
+
+
+def rotate_upright(gray, clockwise_deg: int):
+    if clockwise_deg == 90:
+        return cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
+    if clockwise_deg == 180:
+        return cv2.rotate(gray, cv2.ROTATE_180)
+    if clockwise_deg == 270:
+        return cv2.rotate(gray, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return gray
+
+
+def deskew(gray, angle_deg: float):
+    """Rotate by -angle_deg about the centre, growing the canvas so no text is cut off."""
+    h, w = gray.shape[:2]
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), -angle_deg, 1.0)
+    cos, sin = abs(M[0, 0]), abs(M[0, 1])
+    new_w, new_h = int(h * sin + w * cos), int(h * cos + w * sin)
+    M[0, 2] += new_w / 2 - w / 2
+    M[1, 2] += new_h / 2 - h / 2
+    return cv2.warpAffine(
+        gray, M, (new_w, new_h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE
+    )
+
+
+def upscale(gray, factor=2.0, max_width=UPSCALE_MAX_WIDTH):
+    """Enlarged copy, or None when the card is already wide enough."""
+    factor = min(factor, max_width / gray.shape[1])
+    if factor < 1.2:
+        return None
+    return cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
+
+
+def iter_variants(gray, orientation=None):
+    """
+    Yield (stage, binarised image) in cascade order. Lazy: nothing past the
+    stage the caller stops at is computed.
+    orientation: callable gray -> clockwise degrees (OCR backend's OSD), optional.
+    """
+    yield "otsu", otsu(gray)
+    yield "adaptive", adaptive(gray)
+
+    rotation = orientation(gray) if orientation is not None else 0
+    upright = rotate_upright(gray, rotation)
+    skew = estimate_skew(upright)
+    if abs(skew) >= MIN_SKEW_DEG:
+        upright = deskew(upright, skew)
+    if upright is not gray:
+        yield "deskew", otsu(upright)
+
+    big = upscale(upright)
+    if big is not None:
+        yield "upscale", otsu(big)
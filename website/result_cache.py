@@ -0,0 +1,148 @@
+"""
+CONTENT-ADDRESSED RESULT CACHE
+------------------------------
+Key   = "<engine/config tag>:<sha256 of the input bytes>"
+Value = raw bytes (OCR text, JSON, float32 embedding ...)
+
+Two tiers:
+- memory : small LRU (OrderedDict) per process
+- disk   : SQLite file shared by every process on the box, evicted
+           least-recently-used first once it grows past max_disk_bytes
+
+The tag must change whenever the engine, model or preprocessing changes,
+so stale results are simply never looked up again (and age out on disk).
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+# last_access only steers LRU eviction: refreshing it at most this often keeps
+# disk-tier hits read-only (no write lock shared with every other process)
+TOUCH_INTERVAL_S = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache(last_access);
+"""
+
+
+def content_key(tag: str, data: bytes) -> str:
+    return f"{tag}:{hashlib.sha256(data).hexdigest()}"
+
+
+def embedding_key(model_tag: str, data: bytes, check_quality=False) -> str:
+    # gated and ungated reads are kept apart so a cache hit never skips the gate
+    return content_key(f"face:{model_tag}:{'gated' if check_quality else 'raw'}", data)
+
+
+def encode_array(arr) -> bytes:
+    return np.asarray(arr, dtype=np.float32).tobytes()
+
+
+def decode_array(blob: bytes):
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+class ResultCache:
+    def __init__(self, db_path=None, memory_items=2048, max_disk_bytes=256 * 1024 * 1024):
+        """db_path=None keeps the memory tier only."""
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._conn = None
+        self._disk_bytes = 0
+        if db_path is not None:
+            self._conn = sqlite3.connect(Path(db_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._disk_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    # -------- public API --------
+    def get(self, key: str):
+        with self._lock:
+            value = self._mem.get(key)
+            if value is not None:
+                self._mem.move_to_end(key)
+                return value
+
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT value, last_access FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > TOUCH_INTERVAL_S:
+                self._conn.execute(
+                    "UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            value = bytes(row[0])
+            self._remember(key, value)
+            return value
+
+    def put(self, key: str, value: bytes):
+        value = bytes(value)
+        with self._lock:
+            self._remember(key, value)
+            if self._conn is None:
+                return
+
+            old = self._conn.execute(
+                "SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()))
+            self._disk_bytes += len(value) - (old[0] if old else 0)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def get_or_compute(self, key: str, compute, encode=bytes, decode=bytes):
+        """Cached value for key, else compute(), store encode(result), return it."""
+        cached = self.get(key)
+        if cached is not None:
+            return decode(cached)
+        result = compute()
+        self.put(key, encode(result))
+        return result
+
+    # -------- internals (lock held) --------
+    def _remember(self, key, value):
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_items:
+            self._mem.popitem(last=False)
+
+    def _evict(self):
+        # other processes write too: re-read the real size before deleting anything
+        self._disk_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+
+        # drop least-recently-used rows until we're back under 90% of the budget
+        target = int(self.max_disk_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT key, size FROM cache ORDER BY last_access ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._disk_bytes <= target:
+                break
+            doomed.append((key,))
+            self._disk_bytes -= size
+        self._conn.executemany("DELETE FROM cache WHERE key = ?", doomed)
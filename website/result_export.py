@@ -0,0 +1,149 @@
+"""
+VERIFICATION RESULT EXPORT
+--------------------------
+Turns ReportStore.iter_export() rows into CSV / JSON Lines text chunks (for a
+streamed HTTP response or a file) or a Parquet file, a batch at a time, so
+memory stays flat however many candidates there are.
+
+- iter_csv(rows, columns)         -> str chunks, header first
+- iter_jsonl(rows, columns)       -> str chunks, one object per line
+- iter_parquet(rows, columns)     -> bytes chunks, one row group of batch_size
+                                     rows each, footer last (pip install pyarrow)
+- write_parquet(rows, columns, f) -> the same, into a path or file
+- parse_time(value)               -> "since" / "until" filter value as stored
+                                     in verify.db (UTC ISO timestamp)
+"""
+
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from itertools import islice
+
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def parse_time(value):
+    """ISO date / datetime (naive = UTC) -> UTC ISO string comparable with last_update, or None."""
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value} (use ISO format, e.g. 2026-10-18T09:00)")
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(timezone.utc).isoformat()
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_csv(rows, columns, batch_size=1000):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for batch in _batches(rows, batch_size):
+        writer.writerows(batch)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def iter_jsonl(rows, columns, batch_size=1000):
+    for batch in _batches(rows, batch_size):
+        yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in batch)
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet export needs pyarrow: pip install pyarrow") from e
+    return pa, pq
+
+
+def _parquet_schema(pa, columns):
+    types = {"candidate_id": pa.int64(), "face_score": pa.float64()}
+    return pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+
+def _parquet_table(pa, schema, batch):
+    arrays = []
+    for field, col in zip(schema, zip(*batch)):
+        if field.type == pa.string():
+            col = [None if v is None else str(v) for v in col]
+        arrays.append(pa.array(col, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(rows, columns, out, batch_size=10000):
+    """Write to a path or binary file object; returns the number of rows written."""
+    pa, pq = _pyarrow()
+    schema = _parquet_schema(pa, columns)
+    written = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for batch in _batches(rows, batch_size):
+            writer.write_table(_parquet_table(pa, schema, batch))
+            written += len(batch)
+    return written
+
+
+class _ParquetSink(io.RawIOBase):
+    """Write-only, non-seekable buffer ParquetWriter writes into; drained after each row group."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buf += b
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+def iter_parquet(rows, columns, batch_size=10000):
+    """
+    Parquet file bytes, yielded as each row group is written: the first bytes
+    go out after batch_size rows and only one row group is ever buffered. A
+    missing pyarrow raises ImportError here, before anything is yielded.
+    """
+    pa, pq = _pyarrow()
+    schema = _parquet_schema(pa, columns)
+    return _iter_parquet(pa, pq, schema, rows, batch_size)
+
+
+def _iter_parquet(pa, pq, schema, rows, batch_size):
+    sink = _ParquetSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in _batches(rows, batch_size):
+            writer.write_table(_parquet_table(pa, schema, batch))
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
@@ -0,0 +1,50 @@
+"""
+Attempt log archival.
+
+Moves verification attempts older than --keep-days out of verify.db into one
+sqlite file per month (attempts-YYYY-MM.db in --archive-dir), adding them to
+the attempt_rollup per-day counts first. Keeps the live attempts table small
+so per-candidate history and "last N minutes" queries stay index lookups.
+Run it from cron, e.g. nightly:
+
+    python scripts/archive_attempts.py --keep-days 30
+    python scripts/archive_attempts.py --keep-days 7 --archive-dir /mnt/archive/attempts
+"""
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+import argparse
+import sys
+import time
+sys.path.append(str(Path(__file__).parent.parent))
+
+from datastore import AttemptLog, VerificationStore
+
+BASE = Path(__file__).parent.parent
+VERIFY_DB = BASE / "verify.db"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive and roll up old verification attempts")
+    parser.add_argument("--keep-days", type=float, default=30, help="attempts newer than this stay live")
+    parser.add_argument("--archive-dir", default=str(BASE / "archive" / "attempts"))
+    parser.add_argument("--chunk", type=int, default=20000, help="rows moved per transaction")
+    parser.add_argument("--verify-db", default=str(VERIFY_DB))
+    args = parser.parse_args(argv)
+
+    store = VerificationStore(args.verify_db, pool_size=1)
+    try:
+        log = AttemptLog(store)
+        before = datetime.now(timezone.utc) - timedelta(days=args.keep_days)
+        t0 = time.perf_counter()
+        moved = log.archive(before, args.archive_dir, chunk=args.chunk)
+    finally:
+        store.close()
+
+    for month, n in sorted(moved.items()):
+        print(f"{month}: {n} attempt(s) archived")
+    print(f"Archived {sum(moved.values())} attempt(s) older than {before:%Y-%m-%d %H:%M} UTC "
+          f"in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Time saved by resolution normalisation.
+
+Runs every image in a folder through the OCR read (ROI + cascade) and/or face
+embedding twice, once at full resolution and once with the engines' default
+normalisation, and prints per-image and total timings.
+
+    python scripts/bench_resolution.py uploads/ocr --ocr --id-type aadhaar
+    python scripts/bench_resolution.py uploads/facever --face
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+sys.path.append(str(Path(__file__).parent.parent))
+
+from Untitled_1 import IDVerifier, OCREngine
+from image_io import decode_image
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png"}
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def bench(images, label, run_full, run_norm):
+    total_full = total_norm = 0.0
+    print(f"\n{label}")
+    for path in images:
+        data = path.read_bytes()
+        try:
+            t_full = timed(lambda: run_full(data))
+            t_norm = timed(lambda: run_norm(data))
+        except ValueError as e:
+            print(f"  {path.name}: skipped ({e})")
+            continue
+        total_full += t_full
+        total_norm += t_norm
+        print(f"  {path.name}: full {t_full * 1000:.0f} ms -> normalised {t_norm * 1000:.0f} ms")
+
+    saved = total_full - total_norm
+    pct = 100 * saved / total_full if total_full else 0.0
+    print(f"  total: full {total_full:.2f} s, normalised {total_norm:.2f} s, "
+          f"saved {saved:.2f} s ({pct:.0f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark resolution normalisation")
+    parser.add_argument("folder")
+    parser.add_argument("--ocr", action="store_true", help="benchmark the ID-card OCR read")
+    parser.add_argument("--face", action="store_true", help="benchmark face detection + embedding")
+    parser.add_argument("--id-type", default="aadhaar", help="ID pattern the OCR read looks for")
+    args = parser.parse_args()
+
+    images = sorted(p for p in Path(args.folder).iterdir() if p.suffix.lower() in IMAGE_EXTS)
+    if not images:
+        print(f"No images in {args.folder}")
+        return
+
+    if args.ocr or not args.face:
+        full = IDVerifier(None, OCREngine(target_dpi=None, max_side=None))
+        norm = IDVerifier(None, OCREngine())
+        bench(images, "OCR read",
+              lambda d: full.read_id(decode_image(d), args.id_type),
+              lambda d: norm.read_id(norm.ocr.decode(d), args.id_type))
+
+    if args.face:
+        from Untitled_2 import InsightFaceEngine
+        full = InsightFaceEngine(max_side=None)
+        norm = InsightFaceEngine()
+        bench(images, "Face embedding",
+              full.extract_embedding_from_bytes,
+              norm.extract_embedding_from_bytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Bulk candidate enrollment.
+
+Enrolls a whole centre's roster from the board's export (CSV or JSON Lines)
+and a directory or zip of photos: validates every row, precomputes reference
+face embeddings and ID-photo quality in parallel, inserts accepted candidates
+in chunked transactions under newly allocated ids and writes a rejection
+report (row, reason) for everything else. See enrollment.py for the roster
+columns.
+
+    python scripts/bulk_enroll.py roster.csv photos.zip
+    python scripts/bulk_enroll.py roster.jsonl photos/ --workers 8 --enrolled enrolled.csv
+    python scripts/bulk_enroll.py roster.csv photos.zip --no-quality-gate --min-id-dpi 120
+
+Re-running with the same roster is safe: candidates already in users.db are
+reported as already_enrolled instead of being added twice.
+"""
+from pathlib import Path
+import argparse
+import os
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from enrollment import BulkEnroller, ImageSource, iter_roster
+from run_batch_verify import Progress
+
+BASE = Path(__file__).parent.parent
+USERS_DB = BASE / "users.db"
+UPLOAD_DIR = BASE / "uploads"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enroll candidates from a roster + photos")
+    parser.add_argument("roster", help="CSV or JSONL roster")
+    parser.add_argument("images", help="directory or zip with the face / ID photos")
+    parser.add_argument("--rejected", default="rejected.csv", help="rejection report (CSV)")
+    parser.add_argument("--enrolled", default=None, help="also write row -> candidate_id (CSV)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=500, help="candidates per transaction")
+    parser.add_argument("--no-quality-gate", action="store_true",
+                        help="accept any face photo with exactly one face")
+    parser.add_argument("--min-id-dpi", type=int, default=150,
+                        help="reject ID photos whose card text is smaller than this")
+    parser.add_argument("--users-db", default=str(USERS_DB))
+    parser.add_argument("--upload-dir", default=str(UPLOAD_DIR))
+    args = parser.parse_args(argv)
+
+    if not Path(args.users_db).exists():
+        print(f"users.db not found at {args.users_db}")
+        return
+
+    total = sum(1 for _ in iter_roster(args.roster))
+    print(f"{total} roster rows, {args.workers} workers")
+
+    enroller = BulkEnroller(args.users_db, args.upload_dir, workers=args.workers,
+                            chunk_size=args.chunk_size,
+                            check_quality=not args.no_quality_gate,
+                            min_id_dpi=args.min_id_dpi)
+    images = ImageSource.open(args.images)
+    progress = Progress(total)
+    enrolled_out = open(args.enrolled, "w", newline="") if args.enrolled else None
+    try:
+        with open(args.rejected, "w", newline="") as rejected_out:
+            counts = enroller.run(iter_roster(args.roster), images, rejected_out,
+                                  enrolled_out, progress=progress)
+    finally:
+        images.close()
+        if enrolled_out:
+            enrolled_out.close()
+
+    progress.report(final=True)
+    print(f"Enrolled {counts['enrolled']}, rejected {counts['rejected']} (see {args.rejected})")
+
+
+if __name__ == '__main__':
+    main()
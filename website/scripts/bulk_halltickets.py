@@ -0,0 +1,112 @@
+"""
+Bulk hall-ticket generation.
+
+Renders the admit card of every selected candidate in a process pool (pisa is
+CPU-bound and single-threaded) through the same on-disk cache /hallticket
+uses, then streams them into a zip or merges them into print-ready PDFs.
+
+Resuming: every finished ticket is already in the cache, so re-running the
+same command after a crash / Ctrl-C only renders what is missing.
+
+    python scripts/bulk_halltickets.py --out centre.zip
+    python scripts/bulk_halltickets.py --from-id 1000 --to-id 1999 --out room4.zip
+    python scripts/bulk_halltickets.py --status PASS --format pdf --per-file 250 --out print/centre.pdf
+        -> print/centre-0001.pdf, print/centre-0002.pdf, ...   (pip install pypdf)
+    python scripts/bulk_halltickets.py --out - > centre.zip   # zip on stdout (what /api/halltickets streams)
+"""
+from pathlib import Path
+import argparse
+import os
+import sys
+sys.path.append(str(Path(__file__).parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from datastore import ConnectionPool, ReportStore
+from hallticket import iter_rendered, iter_zip, write_merged
+from run_batch_verify import Progress
+
+BASE = Path(__file__).parent.parent
+USERS_DB = BASE / "users.db"
+VERIFY_DB = BASE / "verify.db"
+FACE_REF_DIR = BASE / "uploads" / "facever"
+OCR_DIR = BASE / "uploads" / "ocr"
+CACHE_DIR = Path(os.environ.get("HALLTICKET_CACHE_DIR", BASE / "cache" / "halltickets"))
+# same settings as app.py, so tickets printed here match (and share cache with) /hallticket;
+# no key, no gate QR on the tickets
+QR_KEY = os.environ.get("HALLTICKET_QR_KEY") or None
+EXAM_SLOT = os.environ.get("EXAM_SLOT", "20250215-0930")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate hall tickets for many candidates")
+    parser.add_argument("--from-id", type=int, default=None, help="first candidate id (inclusive)")
+    parser.add_argument("--to-id", type=int, default=None, help="last candidate id (inclusive)")
+    parser.add_argument("--status", default=None, help="only candidates with this verification status")
+    parser.add_argument("--format", choices=("zip", "pdf"), default="zip")
+    parser.add_argument("--per-file", type=int, default=500, help="tickets per merged PDF (pdf format)")
+    parser.add_argument("--out", required=True,
+                        help="zip file ('-' = stdout), or merged PDF name (numbered per file)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR))
+    parser.add_argument("--exam-slot", default=EXAM_SLOT, help="slot printed in the signed gate QR")
+    parser.add_argument("--users-db", default=str(USERS_DB))
+    parser.add_argument("--verify-db", default=str(VERIFY_DB))
+    args = parser.parse_args(argv)
+    to_stdout = args.format == "zip" and args.out == "-"
+    if to_stdout:
+        # the zip owns stdout: every message goes to stderr
+        zip_out, sys.stdout = sys.stdout.buffer, sys.stderr
+
+    pool = ConnectionPool(args.users_db, size=1, attach={"v": args.verify_db})
+    store = ReportStore(pool)
+    filters = {"status": args.status, "first_id": args.from_id, "last_id": args.to_id}
+    total = sum(1 for _ in store.iter_users(**filters))
+    print(f"{total} hall tickets to generate, {args.workers} workers")
+    if not total and not to_stdout:
+        return
+
+    progress = Progress(total)
+
+    def tracked(results):
+        for cid, path, status, seconds in results:
+            progress.add({"status": "ERROR" if path is None else status.upper(), "seconds": seconds})
+            if path is None:
+                print(f"Candidate {cid}: {status}")
+            yield cid, path, status, seconds
+
+    results = tracked(iter_rendered(store.iter_users(**filters), FACE_REF_DIR, OCR_DIR,
+                                    args.cache_dir, workers=args.workers,
+                                    qr_key=QR_KEY, exam_slot=args.exam_slot))
+    errors = []
+    try:
+        if to_stdout:
+            for chunk in iter_zip(results, errors):
+                zip_out.write(chunk)
+                zip_out.flush()
+            written = []
+        elif args.format == "zip":
+            out = Path(args.out)
+            tmp = out.with_name(out.name + ".part")
+            with open(tmp, "wb") as f:
+                for chunk in iter_zip(results, errors):
+                    f.write(chunk)
+            os.replace(tmp, out)
+            written = [out]
+        else:
+            pattern = args.out
+            if "{" not in pattern:
+                p = Path(pattern)
+                pattern = str(p.with_name(f"{p.stem}-{{:04d}}{p.suffix or '.pdf'}"))
+            written = write_merged(results, pattern, per_file=args.per_file, errors=errors)
+    finally:
+        pool.close()
+
+    progress.report(final=True)
+    for path in written:
+        print(f"Written {path}")
+    if errors:
+        print(f"{len(errors)} ticket(s) failed; re-run to retry them")
+
+
+if __name__ == '__main__':
+    main()
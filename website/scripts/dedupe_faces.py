@@ -0,0 +1,87 @@
+"""
+Bulk duplicate-enrolment audit.
+
+Loads every stored reference embedding from users.db (user_faces) into a
+FaceIndex and lists candidate pairs whose faces match above --threshold.
+
+    python scripts/dedupe_faces.py --threshold 0.5 --out duplicates.csv
+    python scripts/dedupe_faces.py --ivf 1024 --nprobe 16      # large rosters
+"""
+from pathlib import Path
+import argparse
+import csv
+import sqlite3
+import sys
+import time
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from face_index import FaceIndex
+
+BASE = Path(__file__).parent.parent
+
+
+def pick_model_tag(db_path):
+    """Most common model tag in user_faces; vectors from different models don't compare."""
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute("""
+            SELECT model_tag, COUNT(*) AS n FROM user_faces
+            WHERE embedding IS NOT NULL
+            GROUP BY model_tag ORDER BY n DESC LIMIT 1
+        """).fetchone()
+    return row[0] if row else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find candidates enrolled with the same face")
+    parser.add_argument("--db", default=str(BASE / "users.db"))
+    parser.add_argument("--model-tag", default=None,
+                        help="only compare embeddings from this model (default: most common)")
+    parser.add_argument("--threshold", type=float, default=0.4)
+    parser.add_argument("--float16", action="store_true", help="halve index memory")
+    parser.add_argument("--ivf", type=int, default=0, metavar="NLIST",
+                        help="build an IVF index with NLIST partitions (approximate)")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--k", type=int, default=5, help="matches kept per candidate in IVF mode")
+    parser.add_argument("--out", default=None, help="write pairs to this CSV instead of stdout")
+    args = parser.parse_args()
+
+    if not Path(args.db).exists():
+        print(f"users.db not found at {args.db}")
+        return
+
+    model_tag = args.model_tag or pick_model_tag(args.db)
+    dtype = np.float16 if args.float16 else np.float32
+
+    t0 = time.perf_counter()
+    index = FaceIndex.from_db(args.db, model_tag=model_tag, dtype=dtype)
+    print(f"Loaded {len(index)} embeddings ({model_tag}) in {time.perf_counter() - t0:.2f}s")
+    if len(index) < 2:
+        return
+
+    nprobe = None
+    if args.ivf:
+        t0 = time.perf_counter()
+        index.build_ivf(nlist=args.ivf)
+        nprobe = args.nprobe
+        print(f"Built IVF ({args.ivf} lists) in {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    pairs = index.find_duplicates(threshold=args.threshold, k=args.k, nprobe=nprobe)
+    print(f"Found {len(pairs)} pair(s) >= {args.threshold} in {time.perf_counter() - t0:.2f}s")
+
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["candidate_a", "candidate_b", "similarity"])
+            for a, b, score in pairs:
+                writer.writerow([a, b, f"{score:.4f}"])
+        print(f"Written to {args.out}")
+    else:
+        for a, b, score in pairs:
+            print(f"Candidate {a} <-> {b}: similarity={score:.3f}")
+
+
+if __name__ == '__main__':
+    main()
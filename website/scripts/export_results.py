@@ -0,0 +1,83 @@
+"""
+Bulk export of verification results.
+
+Streams the joined users.db / verify.db table (one row per candidate, PENDING
+if never verified) to CSV, JSON Lines or Parquet, a batch at a time, so a
+million-row export runs in constant memory. Same data as /api/export/<fmt>.
+
+    python scripts/export_results.py > all.csv
+    python scripts/export_results.py --format jsonl --status FAIL --out fails.jsonl
+    python scripts/export_results.py --since 2026-10-01 --until 2026-10-02 --out day.csv
+    python scripts/export_results.py --format parquet --out results.parquet   # pip install pyarrow
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+sys.path.append(str(Path(__file__).parent.parent))
+
+import result_export
+from datastore import ConnectionPool, ReportStore
+
+BASE = Path(__file__).parent.parent
+USERS_DB = BASE / "users.db"
+VERIFY_DB = BASE / "verify.db"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export verification results")
+    parser.add_argument("--format", choices=sorted(result_export.FORMATS), default="csv")
+    parser.add_argument("--status", default=None, help="PASS / FAIL / PENDING ... (default: all)")
+    parser.add_argument("--since", default=None, help="last update at or after (ISO, UTC if no offset)")
+    parser.add_argument("--until", default=None, help="last update before (ISO, UTC if no offset)")
+    parser.add_argument("--out", default=None, help="output file (default: stdout; required for parquet)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--users-db", default=str(USERS_DB))
+    parser.add_argument("--verify-db", default=str(VERIFY_DB))
+    args = parser.parse_args(argv)
+
+    try:
+        since = result_export.parse_time(args.since)
+        until = result_export.parse_time(args.until)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.format == "parquet" and not args.out:
+        parser.error("--out is required for parquet")
+
+    pool = ConnectionPool(args.users_db, size=1, attach={"v": args.verify_db})
+    store = ReportStore(pool)
+    cols = ReportStore.EXPORT_COLUMNS
+    rows = store.iter_export(status=args.status, since=since, until=until,
+                             batch_size=args.batch_size)
+
+    t0 = time.perf_counter()
+    count = 0
+
+    def counted(it):
+        nonlocal count
+        for row in it:
+            count += 1
+            yield row
+
+    try:
+        if args.format == "parquet":
+            result_export.write_parquet(counted(rows), cols, args.out)
+        else:
+            chunks = (result_export.iter_csv if args.format == "csv" else result_export.iter_jsonl)(
+                counted(rows), cols, batch_size=args.batch_size)
+            out = open(args.out, "w", newline="") if args.out else sys.stdout
+            try:
+                for chunk in chunks:
+                    out.write(chunk)
+            finally:
+                if args.out:
+                    out.close()
+    finally:
+        pool.close()
+
+    print(f"Exported {count} row(s) in {time.perf_counter() - t0:.1f}s"
+          + (f" to {args.out}" if args.out else ""), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
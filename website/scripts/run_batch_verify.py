@@ -1,25 +1,67 @@
+"""
+Batch verification engine.
+
+Verifies every candidate in users.db against their uploaded ID card (and, in
+student mode, their face) and writes the outcome to verify.db.
+
+- OCR / face work runs in a process pool (one worker per core by default);
+  each worker builds its engines once and keeps them for the whole run
+- results are written by the parent in group-committed transactions
+- progress is checkpointed in verify.db (batch_checkpoint) in the SAME
+  transaction as the results, so a crashed run resumes where it stopped;
+  a run that gets through every candidate clears its checkpoint, so the
+  next run verifies everyone again
+- progress and throughput are printed every few seconds
+
+Modes:
+    id       IDVerifier only (ROI + OCR cascade), image uploads/ocr/ad<NN>.jpg
+    student  StudentVerifier: ID number + face (what run_batch_verify_2.py did)
+
+    python scripts/run_batch_verify.py
+    python scripts/run_batch_verify.py --workers 8 --commit-every 500
+    python scripts/run_batch_verify.py --mode student --ids 103 200 201
+    python scripts/run_batch_verify.py --restart          # ignore the checkpoint
+
+In student mode every worker would otherwise load its own InsightFace model;
+set FACE_SERVER_SOCKET to share one face_server.py process instead.
+"""
 from pathlib import Path
+from datetime import datetime, timezone
+import argparse
+import multiprocessing
+import os
 import sqlite3
-from datetime import datetime
 import sys
+import time
 sys.path.append(str(Path(__file__).parent.parent))
 
 BASE = Path(__file__).parent.parent
 OCR_DIR = BASE / "uploads" / "ocr"
+FACE_REF_DIR = BASE / "uploads" / "facever"
+USERS_DB = BASE / "users.db"
+VERIFY_DB = BASE / "verify.db"
+USERS_DB_URL = f"sqlite:///{USERS_DB}"
 
-from Untitled_1 import OCREngine, UserDatabase, IDVerifier
-
-USERS_DB_URL = f"sqlite:///{BASE / 'users.db'}"
+CHECKPOINT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batch_checkpoint (
+    run_name TEXT NOT NULL,
+    candidate_id INTEGER NOT NULL,
+    status TEXT,
+    error TEXT,
+    finished_at TEXT,
+    PRIMARY KEY (run_name, candidate_id)
+)
+"""
 
 
+# =========================
+# candidate selection
+# =========================
 def get_user_list(db_path):
-    users = []
+    """[(user_id, id_type)] in user_id order."""
     with sqlite3.connect(db_path) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.execute("SELECT user_id FROM users ORDER BY user_id")
-        for r in cur.fetchall():
-            users.append(int(r["user_id"]))
-    return users
+        rows = conn.execute("SELECT user_id, id_type FROM users ORDER BY user_id").fetchall()
+    return [(int(uid), (id_type or "").lower()) for uid, id_type in rows]
 
 
 def find_image_for(user_id, position):
@@ -44,52 +86,293 @@ def find_image_for(user_id, position):
 
     return None
 
-def main():
-    users_db = BASE / "users.db"
-    if not users_db.exists():
-        print(f"users.db not found at {users_db}")
+
+def find_student_images(user_id, id_type, live_paths):
+    """(ID card, live face) for student mode; the live face falls back to the reference photo."""
+    prefix = "ad" if id_type in ("aadhaar", "aadhar") else "pa"
+    id_path = OCR_DIR / f"{prefix}{user_id}.jpg"
+    live = live_paths.get(user_id) or FACE_REF_DIR / f"{user_id}.jpg"
+    if not id_path.exists() or not Path(live).exists():
+        return None
+    return id_path, Path(live)
+
+
+def load_live_paths(verify_db):
+    """Latest kiosk capture per candidate, from verify.db."""
+    if not Path(verify_db).exists():
+        return {}
+    with sqlite3.connect(verify_db) as conn:
+        try:
+            rows = conn.execute("""
+                SELECT candidate_id, face_attempt_path FROM verifications
+                WHERE face_attempt_path IS NOT NULL
+            """).fetchall()
+        except sqlite3.OperationalError:
+            return {}
+    return {int(cid): path for cid, path in rows}
+
+
+def build_tasks(args, users):
+    """[(user_id, image paths...)] for everything that has images, plus the skipped ids."""
+    wanted = set(args.ids) if args.ids else None
+    live_paths = load_live_paths(args.verify_db) if args.mode == "student" else {}
+
+    tasks, skipped = [], []
+    for idx, (uid, id_type) in enumerate(users, start=1):
+        if wanted is not None and uid not in wanted:
+            continue
+        if args.mode == "id":
+            img = find_image_for(uid, idx)
+            paths = None if img is None else (str(img),)
+        else:
+            found = find_student_images(uid, id_type, live_paths)
+            paths = None if found is None else tuple(str(p) for p in found)
+
+        if paths is None:
+            skipped.append(uid)
+        else:
+            tasks.append((uid,) + paths)
+    return tasks, skipped
+
+
+# =========================
+# worker side
+# =========================
+_verifier = None
+_mode = None
+
+
+def _init_worker(mode):
+    """Runs once per pool process: build the engines this worker keeps for the run."""
+    global _verifier, _mode
+    _mode = mode
+
+    if mode == "id":
+        from Untitled_1 import IDVerifier, OCREngine, UserDatabase
+        from result_cache import ResultCache
+
+        cache = ResultCache(os.environ.get("RESULT_CACHE_DB", BASE / "cache.db"))
+        ocr = OCREngine(backend=os.environ.get("OCR_BACKEND", "pytesseract"), cache=cache)
+        _verifier = IDVerifier(UserDatabase(USERS_DB_URL), ocr)
+    else:
+        from Untitled_2 import StudentVerifier, UserDatabase
+        from face_server import FaceEngineClient
+
+        sock = os.environ.get("FACE_SERVER_SOCKET")
+        _verifier = StudentVerifier(UserDatabase(USERS_DB_URL),
+                                    FaceEngineClient(sock) if sock else None)
+
+
+def _verify_one(task):
+    uid = task[0]
+    t0 = time.perf_counter()
+    try:
+        if _mode == "id":
+            res = _verifier.verify(task[1], uid)
+        else:
+            res = _verifier.verify(task[1], task[2], uid)
+    except Exception as e:
+        res = {"status": "ERROR", "error": f"{type(e).__name__}: {e}"}
+    res["seconds"] = time.perf_counter() - t0
+    return task, res
+
+
+# =========================
+# parent side: results + checkpoint
+# =========================
+class ResultWriter:
+    """Buffers results and writes them, with their checkpoint rows, in one transaction per group."""
+
+    def __init__(self, db_path, run_name, mode, commit_every=200, commit_interval_s=5.0):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(CHECKPOINT_SCHEMA)
+        self.conn.commit()
+        self.run_name = run_name
+        self.mode = mode
+        self.commit_every = commit_every
+        self.commit_interval_s = commit_interval_s
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def done_ids(self):
+        """Candidates this run already finished; errored ones are retried on resume."""
+        q = "SELECT candidate_id FROM batch_checkpoint WHERE run_name = ? AND status != 'ERROR'"
+        return {row[0] for row in self.conn.execute(q, (self.run_name,))}
+
+    def reset(self):
+        self.conn.execute("DELETE FROM batch_checkpoint WHERE run_name = ?", (self.run_name,))
+        self.conn.commit()
+
+    def finish(self):
+        """The run completed: commit what is buffered and drop its checkpoint."""
+        self.flush()
+        self.reset()
+
+    def add(self, task, res):
+        self._buffer.append((task, res))
+        if (len(self._buffer) >= self.commit_every
+                or time.monotonic() - self._last_flush >= self.commit_interval_s):
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+
+        results, checkpoints = [], []
+        for task, res in self._buffer:
+            uid = task[0]
+            status = res.get("status")
+            checkpoints.append((self.run_name, uid, status, res.get("error"), now))
+            if status == "ERROR":
+                continue
+            if self.mode == "id":
+                results.append((uid, status, res.get("ocr_value"), res.get("db_value"),
+                                task[1], now))
+            else:
+                similarity = res.get("face_similarity", res.get("similarity"))
+                results.append((uid, status, similarity, task[2], now))
+
+        with self.conn:
+            if self.mode == "id":
+                self.conn.executemany("""
+                    INSERT INTO verifications
+                        (candidate_id, status, ocr_value, db_value, ocr_path, last_update)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(candidate_id) DO UPDATE SET
+                        status = excluded.status,
+                        ocr_value = excluded.ocr_value,
+                        db_value = excluded.db_value,
+                        ocr_path = excluded.ocr_path,
+                        last_update = excluded.last_update
+                """, results)
+            else:
+                self.conn.executemany("""
+                    INSERT INTO verifications
+                        (candidate_id, status, face_score, face_attempt_path, last_update)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(candidate_id) DO UPDATE SET
+                        status = excluded.status,
+                        face_score = excluded.face_score,
+                        face_attempt_path = excluded.face_attempt_path,
+                        last_update = excluded.last_update
+                """, results)
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO batch_checkpoint
+                    (run_name, candidate_id, status, error, finished_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, checkpoints)
+        self._buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+class Progress:
+    def __init__(self, total, every_s=5.0):
+        self.total = total
+        self.every_s = every_s
+        self.done = 0
+        self.counts = {}
+        self.work_s = 0.0
+        self.started = time.monotonic()
+        self._last = self.started
+
+    def add(self, res):
+        self.done += 1
+        status = res.get("status") or "UNKNOWN"
+        self.counts[status] = self.counts.get(status, 0) + 1
+        self.work_s += res.get("seconds", 0.0)
+        if time.monotonic() - self._last >= self.every_s:
+            self.report()
+
+    def report(self, final=False):
+        self._last = time.monotonic()
+        elapsed = max(self._last - self.started, 1e-9)
+        rate = self.done / elapsed
+        eta = (self.total - self.done) / rate if rate else float("inf")
+        counts = ", ".join(f"{k}={v}" for k, v in sorted(self.counts.items()))
+        line = (f"[{self.done}/{self.total}] {rate:.1f}/s, "
+                f"avg {1000 * self.work_s / max(self.done, 1):.0f} ms/candidate, {counts}")
+        if final:
+            print(f"Finished in {elapsed:.1f}s. {line}")
+        else:
+            print(f"{line}, ETA {eta:.0f}s", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify every candidate in users.db in parallel")
+    parser.add_argument("--mode", choices=("id", "student"), default="id")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--commit-every", type=int, default=200,
+                        help="results per write transaction")
+    parser.add_argument("--ids", type=int, nargs="+", help="only these candidate ids")
+    parser.add_argument("--run-name", default=None,
+                        help="checkpoint name (default: the mode); different names resume independently")
+    parser.add_argument("--restart", action="store_true", help="discard this run's checkpoint first")
+    parser.add_argument("--users-db", default=str(USERS_DB))
+    parser.add_argument("--verify-db", default=str(VERIFY_DB))
+    parser.add_argument("--verbose", action="store_true", help="print every candidate")
+    args = parser.parse_args(argv)
+
+    if not Path(args.users_db).exists():
+        print(f"users.db not found at {args.users_db}")
         return
 
-    users = get_user_list(users_db)
+    users = get_user_list(args.users_db)
     if not users:
         print("No users found in users.db")
         return
 
-    db = UserDatabase(USERS_DB_URL)
-    ocr = OCREngine()
-    verifier = IDVerifier(db, ocr)
+    # StudentVerifier resolves uploads/... relative to the website folder
+    os.chdir(BASE)
+    # N processes x Tesseract's own OpenMP threads would oversubscribe the cores
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
 
-    for idx, uid in enumerate(users, start=1):
-        img = find_image_for(uid, idx)
-        if img is None:
-            print(f"Skipping candidate {uid}: no matching ad file (tried ad{uid}.jpg and ad{idx}.jpg)")
-            continue
+    writer = ResultWriter(args.verify_db, args.run_name or args.mode, args.mode,
+                          commit_every=args.commit_every)
+    if args.restart:
+        writer.reset()
 
-        try:
-            res = verifier.verify(str(img), uid)
-            status = res.get('status')
-            ocr_val = res.get('ocr_value')
-            db_val = res.get('db_value')
-            print(f"Candidate {uid}: file={img.name} -> status={status}, ocr_value={ocr_val}, db_value={db_val}")
-            # upsert into verify.db so candidate page reflects the result
-            now = datetime.utcnow().isoformat()
-            with sqlite3.connect(BASE / "verify.db") as conn:
-                conn.execute('''
-                    INSERT OR REPLACE INTO verifications
-                    (candidate_id, status, ocr_value, db_value, ocr_path, last_update)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    uid,
-                    res.get('status'),
-                    res.get('ocr_value'),
-                    res.get('db_value'),
-                    str(img),
-                    now
-                ))
-                conn.commit()
-        except Exception as e:
-            print(f"Candidate {uid}: file={img.name} -> ERROR: {e}")
+    tasks, skipped = build_tasks(args, users)
+    for uid in skipped:
+        if args.verbose:
+            print(f"Skipping candidate {uid}: no matching image")
+    done = writer.done_ids()
+    pending = [t for t in tasks if t[0] not in done]
+    if done and not pending:
+        # every candidate is checkpointed: that run finished (it was stopped
+        # before it could clear the checkpoint), so this is a fresh run
+        writer.reset()
+        done, pending = set(), tasks
+    tasks = pending
+
+    print(f"{len(tasks)} candidates to verify ({len(done)} already done, "
+          f"{len(skipped)} without images), {args.workers} workers, mode={args.mode}")
+    if not tasks:
+        writer.close()
+        return
+
+    progress = Progress(len(tasks))
+    chunksize = max(1, min(16, len(tasks) // (args.workers * 8)))
+    try:
+        with multiprocessing.Pool(args.workers, initializer=_init_worker,
+                                  initargs=(args.mode,)) as pool:
+            for task, res in pool.imap_unordered(_verify_one, tasks, chunksize=chunksize):
+                writer.add(task, res)
+                progress.add(res)
+                if args.verbose or res.get("status") == "ERROR":
+                    detail = res.get("error") or res.get("reason") or res.get("ocr_value")
+                    print(f"Candidate {task[0]}: {Path(task[1]).name} -> {res.get('status')} {detail or ''}")
+        writer.finish()
+    finally:
+        # whatever finished before a crash / Ctrl-C is committed and checkpointed
+        writer.close()
 
+    progress.report(final=True)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,70 @@
+import sqlite3
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from datastore import AttemptLog, VerificationStore
+
+
+def _add(log, cid, ts):
+    row = (cid, ts, "face", "PASS", "PASS", None, None, 0.9, None, None)
+    log.writer.submit(log.INSERT, row).result()
+
+
+def _archived(archive_dir, month):
+    conn = sqlite3.connect(Path(archive_dir) / f"attempts-{month}.db")
+    try:
+        return conn.execute("SELECT id, candidate_id, ts FROM attempts ORDER BY ts").fetchall()
+    finally:
+        conn.close()
+
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        self.store = VerificationStore(self.dir / "verify.db", pool_size=1)
+        self.log = AttemptLog(self.store)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def _rollup_total(self):
+        with self.log.pool.connection() as conn:
+            return conn.execute("SELECT COALESCE(SUM(attempts), 0) FROM attempt_rollup").fetchone()[0]
+
+    def test_second_archive_after_table_emptied_keeps_every_row(self):
+        _add(self.log, 1, "2026-10-01T09:00:00.000000+00:00")
+        _add(self.log, 2, "2026-10-02T09:00:00.000000+00:00")
+        self.assertEqual(self.log.archive("2026-10-05", self.dir), {"2026-10": 2})
+
+        _add(self.log, 3, "2026-10-13T09:00:00.000000+00:00")
+        _add(self.log, 4, "2026-10-14T09:00:00.000000+00:00")
+        self.assertEqual(self.log.archive("2026-10-20", self.dir), {"2026-10": 2})
+
+        rows = _archived(self.dir, "2026-10")
+        self.assertEqual([r[1] for r in rows], [1, 2, 3, 4])
+        self.assertEqual(len({r[0] for r in rows}), 4)
+        self.assertEqual(self._rollup_total(), 4)
+
+    def test_rerun_after_copy_does_not_duplicate(self):
+        _add(self.log, 1, "2026-10-01T09:00:00.000000+00:00")
+        # simulate a crash after the archive copy committed but before the delete did
+        conn = sqlite3.connect(self.dir / "verify.db")
+        conn.execute("ATTACH DATABASE ? AS arch", (str(self.dir / "attempts-2026-10.db"),))
+        conn.execute(AttemptLog.TABLE.format(schema="arch."))
+        conn.execute("INSERT INTO arch.attempts SELECT * FROM attempts")
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self.log.archive("2026-10-05", self.dir), {"2026-10": 1})
+        self.assertEqual(len(_archived(self.dir, "2026-10")), 1)
+        self.assertEqual(self.log.history(1), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+"""
+SIGNED HALL-TICKET QR
+---------------------
+Every hall ticket carries a QR code the gate can check without OCR:
+
+    EVS1:<cid>:<ID_TYPE>:<id hash>:<slot>:<signature>
+
+- id hash   : 80 bits of sha256 over the normalised ID number, base32; the
+              number itself is never printed in the code
+- slot      : exam slot the ticket is valid for (EXAM_SLOT, e.g. 20250215-0930)
+- signature : HMAC-SHA256 with the server key over everything before it,
+              first 80 bits, base32
+
+Upper-case base32 and ":" are all in the QR alphanumeric set, so the code
+stays small (version 4-5) and scans from a phone photo of a printed ticket.
+
+GateVerifier reads the QR with OpenCV, checks the signature locally and the
+candidate by primary key; Tesseract (IDVerifier) only runs when no ticket
+QR is found in the image. There is no default key: without one nothing is
+signed and no QR is accepted, so every ID check goes through OCR.
+"""
+
+import base64
+import hashlib
+import hmac
+import time
+
+import cv2
+
+from image_io import decode_image_max
+
+
+PREFIX = "EVS1"
+# QR finder patterns survive this downscale; bigger photos only slow the detector
+QR_MAX_SIDE = 1600
+
+
+class TicketQRError(ValueError):
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _b32(data: bytes) -> str:
+    return base64.b32encode(data).decode().rstrip("=")
+
+
+def normalize_id(id_value: str) -> str:
+    # same normalisation IDVerifier compares with (IndianIDFormats.normalize)
+    return (id_value or "").upper().replace(" ", "")
+
+
+def id_hash(id_type: str, id_value: str) -> str:
+    digest = hashlib.sha256(f"{id_type.lower()}:{normalize_id(id_value)}".encode()).digest()
+    return _b32(digest[:10])
+
+
+def _sign(key: str, body: str) -> str:
+    if not key:
+        raise TicketQRError("no_key", "No hall-ticket QR signing key configured")
+    return _b32(hmac.new(key.encode(), body.encode(), hashlib.sha256).digest()[:10])
+
+
+def key_fingerprint(key: str) -> str:
+    """Identifies the signing key in cache keys without exposing it."""
+    return hashlib.sha256(b"evs-qr-key:" + key.encode()).hexdigest()[:16]
+
+
+def make_payload(key: str, cid: int, id_type: str, id_value: str, slot: str) -> str:
+    body = ":".join([PREFIX, str(int(cid)), id_type.upper(), id_hash(id_type, id_value), slot.upper()])
+    return f"{body}:{_sign(key, body)}"
+
+
+def parse_payload(key: str, text: str) -> dict:
+    """Fields of a genuine ticket payload; raises TicketQRError."""
+    parts = (text or "").strip().split(":")
+    if len(parts) != 6 or parts[0] != PREFIX:
+        raise TicketQRError("not_ticket", "QR code is not an EVS hall ticket")
+    body, signature = ":".join(parts[:5]), parts[5]
+    if not hmac.compare_digest(_sign(key, body), signature):
+        raise TicketQRError("bad_signature", "Hall ticket QR signature is invalid")
+    try:
+        cid = int(parts[1])
+    except ValueError:
+        raise TicketQRError("not_ticket", "QR code is not an EVS hall ticket")
+    return {"cid": cid, "id_type": parts[2].lower(), "id_hash": parts[3], "slot": parts[4]}
+
+
+def qr_png(text: str, module_px=8) -> bytes:
+    """PNG of the QR code, scaled without smoothing so it prints crisp."""
+    qr = cv2.QRCodeEncoder.create().encode(text)
+    qr = cv2.resize(qr, None, fx=module_px, fy=module_px, interpolation=cv2.INTER_NEAREST)
+    # quiet zone: 4 modules of white around the code
+    pad = 4 * module_px
+    qr = cv2.copyMakeBorder(qr, pad, pad, pad, pad, cv2.BORDER_CONSTANT, value=255)
+    ok, buf = cv2.imencode(".png", qr)
+    if not ok:
+        raise ValueError("Could not encode QR code")
+    return buf.tobytes()
+
+
+def read_qr(img):
+    """Text of the first QR code found in a BGR / gray image, or None."""
+    detector = cv2.QRCodeDetector()
+    text, points, _ = detector.detectAndDecode(img)
+    if text:
+        return text
+    if points is not None:
+        # found but not decoded: a binarised copy often fixes glare / low contrast
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+        text, _, _ = detector.detectAndDecode(binary)
+    return text or None
+
+
+class GateVerifier:
+    def __init__(self, key: str, users, id_verifier=None, slot: str = None):
+        """
+        users: datastore.UserStore (anything with get_user_id_record)
+        id_verifier: Untitled_1.IDVerifier, the OCR fallback (None = QR only)
+        slot: only tickets for this exam slot are accepted (None = any slot)
+        key: None / "" disables QR checks (OCR only)
+        """
+        self.key = key
+        self.users = users
+        self.id_verifier = id_verifier
+        self.slot = slot.upper() if slot else None
+
+    def verify_bytes(self, data: bytes, user_id: int = None) -> dict:
+        """
+        Same result shape as IDVerifier.verify_bytes, plus "method" ("qr" or
+        "ocr") and "qr_ms". user_id=None identifies the candidate from the
+        ticket alone (no OCR fallback possible then).
+        """
+        t0 = time.perf_counter()
+        text = None
+        if self.key:
+            try:
+                text = read_qr(decode_image_max(data, QR_MAX_SIDE))
+            except ValueError:
+                pass
+        qr_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+        qr_reason = "no_qr" if self.key else "no_key"
+        if text:
+            try:
+                res = self._check(parse_payload(self.key, text), user_id)
+                res.update(method="qr", qr_ms=qr_ms)
+                return res
+            except TicketQRError as e:
+                if e.reason != "not_ticket":
+                    # a forged / altered ticket is a FAIL, not a reason to try OCR
+                    return {"status": "FAIL", "reason": str(e), "method": "qr", "qr_ms": qr_ms}
+                qr_reason = e.reason
+
+        if self.id_verifier is None or user_id is None:
+            return {"status": "FAIL", "reason": "No hall ticket QR code found",
+                    "method": "qr", "qr_ms": qr_ms}
+        res = self.id_verifier.verify_bytes(data, user_id)
+        res.update(method="ocr", qr_ms=qr_ms, qr=qr_reason)
+        return res
+
+    def _check(self, ticket: dict, user_id):
+        cid = ticket["cid"]
+        if user_id is not None and cid != user_id:
+            return {"status": "FAIL", "reason": f"Hall ticket belongs to candidate {cid}",
+                    "ticket_cid": cid}
+        if self.slot and ticket["slot"] != self.slot:
+            return {"status": "FAIL", "reason": f"Hall ticket is for exam slot {ticket['slot']}",
+                    "ticket_cid": cid}
+        try:
+            record = self.users.get_user_id_record(cid)
+        except ValueError:
+            return {"status": "FAIL", "reason": "Candidate not found", "ticket_cid": cid}
+
+        expected_type = record["id_type"].lower()
+        expected_value = normalize_id(record["id_value"])
+        match = (ticket["id_type"] == expected_type
+                 and hmac.compare_digest(ticket["id_hash"], id_hash(expected_type, expected_value)))
+        res = {
+            "status": "PASS" if match else "FAIL",
+            "ticket_cid": cid,
+            "expected_id_type": expected_type,
+            "db_value": expected_value,
+            # the ticket vouches for the ID number; recorded like an exact OCR read
+            "ocr_value": expected_value if match else None,
+            "match": match,
+        }
+        if not match:
+            res["reason"] = "Candidate's ID details changed since the ticket was issued"
+        return res
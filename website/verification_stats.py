@@ -0,0 +1,146 @@
+"""
+LIVE VERIFICATION STATISTICS
+----------------------------
+In-memory counters of candidates per (status, id_type, hour bucket), built once
+from the database at startup and then moved incrementally on every status
+change, so the control-room dashboard can poll them every second for free.
+
+- hour bucket : UTC hour of the candidate's last verification update
+                ("2026-10-18T09"); None for candidates never verified
+- every candidate is counted exactly once, under its CURRENT status
+  (no row in verify.db yet = PENDING)
+
+Writes made by other processes (other web workers, the batch CLI) are picked up
+by a full rebuild every resync_s seconds. Moves recorded while the rebuild query
+runs are replayed on top of its result, so none are lost in the swap.
+"""
+
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+
+def hour_bucket(ts):
+    """ISO timestamp (or datetime) -> "YYYY-MM-DDTHH" in UTC, None if missing / unparseable."""
+    if ts is None:
+        return None
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts)
+        except ValueError:
+            return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc)
+    return ts.strftime("%Y-%m-%dT%H")
+
+
+class VerificationStats:
+    SNAPSHOT_SQL = """
+        SELECT u.user_id, u.id_type,
+               COALESCE(v.status, 'PENDING') AS status,
+               v.last_update
+        FROM users u
+        LEFT JOIN v.verifications v ON v.candidate_id = u.user_id
+    """
+
+    def __init__(self, pool, resync_s=60.0, hours=24):
+        """pool: users.db ConnectionPool with verify.db attached as "v" (same as ReportStore)."""
+        self.pool = pool
+        self.resync_s = resync_s
+        self.hours = hours
+        self._lock = threading.Lock()
+        self._counts = Counter()        # (status, id_type, bucket) -> candidates
+        self._keys = {}                 # candidate_id -> its current key
+        self._replay = None             # cid -> (status, id_type, bucket) recorded during a rebuild
+        self._built_at = 0.0
+        self.rebuild()
+
+    # -------- maintenance --------
+    def rebuild(self):
+        with self._lock:
+            self._replay = {}
+        try:
+            counts, keys = Counter(), {}
+            with self.pool.connection() as conn:
+                for uid, id_type, status, last_update in conn.execute(self.SNAPSHOT_SQL):
+                    key = (status, (id_type or "").lower(), hour_bucket(last_update))
+                    counts[key] += 1
+                    keys[uid] = key
+            with self._lock:
+                # the query may predate these moves: the recorded state is the newer one
+                for cid, (status, id_type, bucket) in self._replay.items():
+                    self._move(counts, keys, cid, status, id_type, bucket)
+                self._counts, self._keys = counts, keys
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._replay = None
+
+    @staticmethod
+    def _move(counts, keys, cid, status, id_type, bucket):
+        old = keys.get(cid)
+        if id_type is None:
+            id_type = old[1] if old else ""
+        new = (status or "PENDING", id_type.lower(), bucket)
+        if old == new:
+            return
+        if old is not None:
+            counts[old] -= 1
+            if counts[old] <= 0:
+                del counts[old]
+        counts[new] += 1
+        keys[cid] = new
+
+    def knows(self, cid: int) -> bool:
+        return cid in self._keys
+
+    def add_candidate(self, cid: int, id_type: str):
+        """A newly registered candidate starts as PENDING."""
+        self.record(cid, "PENDING", id_type=id_type, when=None)
+
+    def record(self, cid: int, status: str, id_type=None, when="now"):
+        """
+        Move one candidate to its new status. id_type may be omitted for
+        candidates already counted; when=None leaves the hour bucket empty.
+        """
+        bucket = hour_bucket(datetime.now(timezone.utc) if when == "now" else when)
+        with self._lock:
+            self._move(self._counts, self._keys, cid, status, id_type, bucket)
+            if self._replay is not None:
+                self._replay[cid] = (status, id_type, bucket)
+
+    # -------- reading --------
+    def snapshot(self) -> dict:
+        with self._lock:
+            # claim the resync so concurrent pollers don't all rebuild at once
+            due = time.monotonic() - self._built_at > self.resync_s
+            if due:
+                self._built_at = time.monotonic()
+        if due:
+            self.rebuild()
+
+        with self._lock:
+            items = list(self._counts.items())
+
+        by_status, by_id_type, by_hour = Counter(), {}, {}
+        for (status, id_type, bucket), n in items:
+            by_status[status] += n
+            by_id_type.setdefault(id_type or "unknown", Counter())[status] += n
+            if bucket is not None:
+                by_hour.setdefault(bucket, Counter())[status] += n
+
+        total = sum(by_status.values())
+        # the last `hours` clock hours up to now, quiet hours included as zeros
+        now = datetime.now(timezone.utc)
+        recent = [hour_bucket(now - timedelta(hours=h)) for h in range(self.hours - 1, -1, -1)]
+        zeros = dict.fromkeys(sorted(by_status), 0)
+        return {
+            "total": total,
+            "by_status": dict(by_status),
+            "pass_pct": round(by_status["PASS"] / total * 100, 1) if total else 0,
+            "fail_pct": round(by_status["FAIL"] / total * 100, 1) if total else 0,
+            "by_id_type": {k: dict(v) for k, v in sorted(by_id_type.items())},
+            "by_hour": [{"hour": b, **zeros, **by_hour.get(b, {})} for b in recent],
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+        }